@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+'''
+@author : Mitchell Van Braeckel
+@id : 1002297
+@date : 10/29/2020
+@version : python 3.8-32 / python 3.8.5
+@course : CIS*4010 Cloud Computing
+@brief : A2 Part 1: AWS EC2 - One-Click Deployment of VMs and Containers ; artifacts.py
+
+@note :
+    Description: content-addressed script uploads (used by 'launch.py' for the Docker install script and start scripts)
+        - each script is stored on the instance as '~/.oneclick/artifacts/<sha256 of its content>',
+          then copied to its own name in the SSH user's home dir (where launch.py runs it from)
+        - one remote 'sha256sum' finds which of the hashes the instance already has (with matching content), those aren't sent again
+        - the missing scripts are sent together as one gzipped tar, streamed into 'tar -xz' over the SSH connection (ie. one transfer)
+
+        - local scripts are read and hashed once, and the archive for a given set of missing scripts is only built once,
+          however many instances need it
+'''
+
+############################################# IMPORTS #############################################
+
+# IMPORTS - 'pip install <import-package>'
+import hashlib
+import io
+import shlex
+import tarfile
+import threading
+
+############################################ CONSTANTS ############################################
+
+# Remote directory (relative to the SSH user's home dir) holding scripts by content hash
+ARTIFACT_DIR = ".oneclick/artifacts"
+
+############################## STATE VARIABLES, INITIALIZATION, MAIN ##############################
+
+# Local scripts by filename -> (sha256, content), and built archives by their sorted hashes -> gzipped tar bytes
+artifact_lock = threading.Lock()
+local_artifacts = {}
+bundle_cache = {}
+
+############################################# CLASSES #############################################
+
+# Raised when the scripts couldn't be put on the instance (ie. the remote unpack/copy command failed)
+class ArtifactSyncError(Exception):
+    pass
+
+############################################ FUNCTIONS ############################################
+
+# Makes sure each of the local scripts is on the instance under its own name in the SSH user's home dir,
+# only sending the ones whose content isn't already there (in one archive)
+# Returns the filenames that had to be sent
+def sync_scripts(ssh_client, filenames):
+    artifacts = {filename: load_local_artifact(filename) for filename in dict.fromkeys(filenames)}
+    contents = {content_hash: content for content_hash, content in artifacts.values()}
+    present_hashes = find_present_hashes(ssh_client, sorted(contents))
+    missing_hashes = sorted(content_hash for content_hash in contents if content_hash not in present_hashes)
+
+    # Unpack whatever is missing into the artifact dir, then copy every script to its name (all in one remote command)
+    commands = []
+    bundle = None
+    if missing_hashes:
+        bundle = build_bundle(missing_hashes, contents)
+        commands.append(f"mkdir -p {ARTIFACT_DIR} && tar -xzf - -C {ARTIFACT_DIR}")
+    commands.extend(f"cp -f {ARTIFACT_DIR}/{content_hash} {shlex.quote(filename)}" for filename, (content_hash, _) in artifacts.items())
+
+    stdin, stdout, stderr = ssh_client.exec_command(" && ".join(commands))
+    if bundle != None:
+        stdin.write(bundle)
+    stdin.channel.shutdown_write()
+    if stdout.channel.recv_exit_status() != 0:
+        raise ArtifactSyncError(f"Failed to put {', '.join(artifacts)} on the instance: {stderr.read().decode('UTF-8').strip()}")
+    return [filename for filename, (content_hash, _) in artifacts.items() if content_hash in missing_hashes]
+
+# Returns the subset of the hashes the instance already has in its artifact dir (with content that still matches the hash)
+def find_present_hashes(ssh_client, content_hashes):
+    if not content_hashes:
+        return set()
+    stdin, stdout, stderr = ssh_client.exec_command(f"cd {ARTIFACT_DIR} 2>/dev/null && sha256sum -- {' '.join(content_hashes)} 2>/dev/null")
+    stdin.channel.shutdown_write()
+    output = stdout.read().decode('UTF-8')
+    stdout.channel.recv_exit_status() #non-zero when some are missing, which is expected
+
+    present_hashes = set()
+    for line in output.splitlines():
+        digest, _, filename = line.partition("  ")
+        if digest == filename and digest in content_hashes:
+            present_hashes.add(digest)
+    return present_hashes
+
+############################################# HELPERS #############################################
+
+# Returns (sha256 hex digest, content bytes) of the local script, reading it only once
+def load_local_artifact(filename):
+    with artifact_lock:
+        if filename not in local_artifacts:
+            with open(filename, "rb") as script_file:
+                content = script_file.read()
+            local_artifacts[filename] = (hashlib.sha256(content).hexdigest(), content)
+        return local_artifacts[filename]
+
+# Returns the gzipped tar of the contents with each file named by its hash (built once per set of hashes)
+def build_bundle(content_hashes, contents):
+    bundle_key = tuple(content_hashes)
+    with artifact_lock:
+        if bundle_key not in bundle_cache:
+            bundle_buffer = io.BytesIO()
+            with tarfile.open(fileobj=bundle_buffer, mode="w:gz") as bundle_file:
+                for content_hash in content_hashes:
+                    member = tarfile.TarInfo(content_hash)
+                    member.size = len(contents[content_hash])
+                    member.mode = 0o644
+                    bundle_file.addfile(member, io.BytesIO(contents[content_hash]))
+            bundle_cache[bundle_key] = bundle_buffer.getvalue()
+        return bundle_cache[bundle_key]
@@ -0,0 +1,537 @@
+#!/usr/bin/env python
+
+'''
+@author : Mitchell Van Braeckel
+@id : 1002297
+@date : 10/29/2020
+@version : python 3.8-32 / python 3.8.5
+@course : CIS*4010 Cloud Computing
+@brief : A2 Part 1: AWS EC2 - One-Click Deployment of VMs and Containers ; benchmark.py
+
+@note :
+    Description: offline benchmark of how 'launch.py' and 'monitor.py' scale with fleet size (no AWS account or real VMs needed)
+        - for each fleet size, runs launch.py's create_instances_from_template() and wait_and_provision_fleet(),
+          then monitor.py's get_monitor_output_table(), and reports wall time, throughput and EC2 API call counts
+        - EC2 is a local stand-in (FakeEC2) answering each request from botocore's 'before-send' event with the XML response EC2
+          would send (so nothing goes out on the network, but parsing, the rate limiter and its retries all run as usual),
+          with simulated per-request latency, throttling ('RequestLimitExceeded' error responses), and instance boot time
+        - throttles and retries are the rate limiter's own counts (see ec2_api.get_api_metrics())
+        - SSH is a local paramiko server stub that every fake instance's public IP points at,
+          emulating how long Docker install / image pull / start script commands take
+
+        - optional arguments (any order):
+        --> '--sizes N,N,...': fleet sizes to benchmark (default 10,100,1000)
+        --> '--latency-ms MS': simulated latency of every EC2 API call (default 20)
+        --> '--throttle-rate P': chance (0-1) an EC2 API request is answered with 'RequestLimitExceeded' (default 0)
+        --> '--boot-seconds S': how long fake instances stay pending before running (default 2)
+        --> '--poll-seconds S': fleet waiter poll interval (default 1)
+        --> '--install-seconds S', '--pull-seconds S', '--run-seconds S': simulated remote command durations (defaults 2, 0.5, 0.2)
+        --> '--workers N', '--per-host N', '--batched': same as for launch.py (defaults 64, 1, off)
+        --> '--startup': benchmark cold start instead (see STARTUP_COMMANDS), ie. how long each script takes to start up and exit
+            on a usage error, and how long making an EC2 client + resource takes, in a fresh Python process each run
+        --> '--startup-runs N': runs per startup command (default 10)
+
+        - eg. 'py benchmark.py --sizes 10,100 --latency-ms 50 --throttle-rate 0.05' or 'py benchmark.py --startup'
+'''
+
+############################################# IMPORTS #############################################
+
+# IMPORTS - 'pip install <import-package>'
+from artifacts import ARTIFACT_DIR
+from botocore.awsrequest import AWSResponse
+import concurrent.futures
+import contextlib
+import ec2_api
+import launch
+import logging
+import monitor
+import os
+import paramiko
+import random
+import socket
+import statistics
+import subprocess
+import sys
+from tables import format_columns
+import tempfile
+import threading
+import time
+import xml.sax.saxutils
+from journal import DeploymentJournal
+from manifest import ContainerSpec, InstanceSpec, Manifest, Template
+
+############################################ CONSTANTS ############################################
+
+USAGE_STATEMENT = "Usage: py benchmark.py <--sizes N,N,...|optional> <--latency-ms MS|optional> <--throttle-rate P|optional> " \
+    "<--boot-seconds S|optional> <--poll-seconds S|optional> <--install-seconds S|optional> " \
+    "<--pull-seconds S|optional> <--run-seconds S|optional> <--workers N|optional,int> <--per-host N|optional,int> <--batched|optional> " \
+    "<--startup|optional> <--startup-runs N|optional,int>"
+
+# Optional benchmark arguments: option -> (benchmark_args key, kind, default)
+#   kind 'int' takes a positive integer, 'float' a non-negative number, 'sizes' a comma-separated list of positive integers, 'flag' no value
+BENCHMARK_OPTIONS = {
+    "--sizes": ("sizes", "sizes", [10, 100, 1000]),
+    "--latency-ms": ("latency_ms", "float", 20.0),
+    "--throttle-rate": ("throttle_rate", "float", 0.0),
+    "--boot-seconds": ("boot_seconds", "float", 2.0),
+    "--poll-seconds": ("poll_seconds", "float", 1.0),
+    "--install-seconds": ("install_seconds", "float", 2.0),
+    "--pull-seconds": ("pull_seconds", "float", 0.5),
+    "--run-seconds": ("run_seconds", "float", 0.2),
+    "--workers": ("workers", "int", 64),
+    "--per-host": ("per_host", "int", 1),
+    "--batched": ("batched", "flag", False),
+    "--startup": ("startup", "flag", False),
+    "--startup-runs": ("startup_runs", "int", 10)
+}
+
+BENCHMARK_REGION = "us-east-1"
+BENCHMARK_TEMPLATE_NAME = "amazonlinux2-benchmark"
+BENCHMARK_KEY_NAME = "benchmark-key"
+BENCHMARK_SECURITY_GROUP = "benchmark-sg"
+
+# Cold start benchmark: (description, Python arguments), each run in a fresh process from this script's directory
+#   the scripts exit right after parsing an invalid argument, and the last two compare making a client + resource
+#   through ec2_api (shared session, rate limiter hooks) with plain boto3
+STARTUP_COMMANDS = [
+    ("python (empty)", ["-c", "pass"]),
+    ("launch.py (usage error)", ["launch.py", "--startup-benchmark"]),
+    ("monitor.py (usage error)", ["monitor.py", "--startup-benchmark"]),
+    ("golden_ami.py (usage error)", ["golden_ami.py"]),
+    ("EC2 client + resource (ec2_api)", ["-c", f"import ec2_api; ec2_api.create_client('{BENCHMARK_REGION}'); ec2_api.create_resource('{BENCHMARK_REGION}')"]),
+    ("EC2 client + resource (plain boto3)", ["-c", f"import boto3; boto3.client('ec2', region_name='{BENCHMARK_REGION}'); boto3.resource('ec2', region_name='{BENCHMARK_REGION}')"])
+]
+
+############################## STATE VARIABLES, INITIALIZATION, MAIN ##############################
+
+def main():
+    # ========== ARGUMENTS ==========
+    benchmark_args = parse_benchmark_args(sys.argv)
+    if benchmark_args["startup"]:
+        print(f"--Benchmarking cold start ({benchmark_args['startup_runs']} runs each)...")
+        print(get_startup_table(run_startup_benchmark(benchmark_args["startup_runs"])))
+        return
+
+    # paramiko logs every probe connection that closes before the SSH handshake, which is expected here
+    logging.getLogger("paramiko").setLevel(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Client key pair the fake instances accept (and one host key for the SSH server stub)
+        pem_file = os.path.join(temp_dir, f"{BENCHMARK_KEY_NAME}.pem")
+        paramiko.RSAKey.generate(2048).write_private_key_file(pem_file)
+        ssh_server = StubSSHServer(paramiko.RSAKey.generate(2048), benchmark_args)
+        launch.SSH_PORT = ssh_server.port
+
+        print(f"--Benchmarking fleet sizes {benchmark_args['sizes']} (EC2 latency {benchmark_args['latency_ms']}ms, "
+            f"throttle rate {benchmark_args['throttle_rate']}, boot {benchmark_args['boot_seconds']}s, SSH stub on port {ssh_server.port})...")
+        results = []
+        for size in benchmark_args["sizes"]:
+            print(f"-running {size} instance(s)...")
+            results.append(run_benchmark(size, benchmark_args, pem_file, os.path.join(temp_dir, f"journal-{size}.jsonl")))
+        ssh_server.close()
+    print("...Benchmark complete--\n")
+
+    print(get_results_table(results))
+    for result in results:
+        print(f"-{result['size']} instance(s) API calls: {result['api_calls']}")
+
+############################################ FUNCTIONS ############################################
+
+# Runs launch.py's instance creation and provisioning pipeline, then monitor.py's table, for a fleet of the given size
+# Returns the result dict: size, create/provision/monitor seconds, provisioned count, api_calls (requests by operation, retries included),
+#   and the rate limiter's throttles, retries and rate_wait_seconds (time API calls spent waiting on it, see 'ec2_api.py')
+def run_benchmark(size, benchmark_args, pem_file, journal_filename):
+    fake_ec2 = FakeEC2(benchmark_args)
+    # Clients go through the same rate limiter as launch.py/monitor.py (fresh buckets and metrics per fleet size)
+    ec2_api.rate_limiter = ec2_api.ApiRateLimiter()
+    ec2_client = ec2_api.create_client(BENCHMARK_REGION, aws_access_key_id="benchmark", aws_secret_access_key="benchmark")
+    ec2_resource = ec2_api.create_resource(BENCHMARK_REGION, aws_access_key_id="benchmark", aws_secret_access_key="benchmark")
+    fake_ec2.attach(ec2_client)
+    fake_ec2.attach(ec2_resource.meta.client)
+
+    # launch.py state that its main() would normally set up
+    launch.ec2_client = ec2_client
+    launch.ec2_resource = ec2_resource
+    launch.root_device_names = {}
+    launch.golden_amis = {}
+    launch.golden_ami_claims = set()
+    launch.launch_args = launch.parse_launch_args(["launch.py", "--workers", str(benchmark_args["workers"]), "--per-host", str(benchmark_args["per_host"])])
+    launch.launch_args["batched"] = benchmark_args["batched"]
+    launch.journal = DeploymentJournal(journal_filename)
+
+    # monitor.py state that its main() would normally set up
+    monitor.ec2_region_clients = {BENCHMARK_REGION: ec2_client}
+    monitor.instance_filters = []
+
+    manifest = build_manifest(size, pem_file)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        # InstanceName tags are applied in the background while the fleet is waited on, as in launch.py's main()
+        start_time = time.time()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=launch.TAG_WORKERS) as tag_executor:
+            launched = launch.create_instances_from_template(manifest, tag_executor=tag_executor)
+            created_time = time.time()
+
+            stage_timings = {inst.id: {"start": start_time, "created": created_time} for inst, _ in launched}
+            launch.wait_and_provision_fleet(launched, stage_timings, benchmark_args["poll_seconds"])
+        provisioned_time = time.time()
+
+        monitor.get_monitor_output_table()
+        monitored_time = time.time()
+    launch.journal.close()
+
+    api_metrics = ec2_api.get_api_metrics().values()
+    return {
+        'size': size,
+        'create_seconds': created_time - start_time,
+        'provision_seconds': provisioned_time - created_time,
+        'monitor_seconds': monitored_time - provisioned_time,
+        'provisioned': sum(launch.journal.is_done(inst.id, 'provisioned') for inst, _ in launched),
+        'api_calls': dict(fake_ec2.call_counts),
+        'throttles': sum(metrics['throttles'] for metrics in api_metrics),
+        'retries': sum(metrics['retries'] for metrics in api_metrics),
+        'rate_wait_seconds': sum(metrics['wait_seconds'] for metrics in api_metrics)
+    }
+
+# Runs each of the STARTUP_COMMANDS the given number of times, returns description -> [seconds, ...] (sorted)
+def run_startup_benchmark(runs):
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    startup_seconds = {}
+    for descr, python_args in STARTUP_COMMANDS:
+        seconds = []
+        for _ in range(runs):
+            start_time = time.perf_counter()
+            subprocess.run([sys.executable] + python_args, cwd=script_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            seconds.append(time.perf_counter() - start_time)
+        startup_seconds[descr] = sorted(seconds)
+    return startup_seconds
+
+# Returns the cold start results table: min/median/max milliseconds per startup command
+def get_startup_table(startup_seconds):
+    rows = [["COMMAND", "MIN (ms)", "MEDIAN (ms)", "MAX (ms)"]]
+    for descr, seconds in startup_seconds.items():
+        rows.append([descr, f"{seconds[0] * 1000:.0f}", f"{statistics.median(seconds) * 1000:.0f}", f"{seconds[-1] * 1000:.0f}"])
+    return "--Startup results:\n" + format_columns(rows)
+
+# Returns a manifest of 'size' instances of one Amazon Linux 2 template, each with a 2 container package (no start scripts)
+def build_manifest(size, pem_file):
+    template = Template(BENCHMARK_TEMPLATE_NAME, "ami-0123456789abcdef0", "t2.micro", None, BENCHMARK_SECURITY_GROUP, f"{BENCHMARK_REGION}a", "amazonlinux2", "ec2-user")
+    containers = (
+        ContainerSpec("benchmark-package", "hello-world", "Docker hub", "hello-world", None),
+        ContainerSpec("benchmark-package", "nginx", "Docker hub", "nginx", None)
+    )
+    instances = tuple(InstanceSpec(f"benchmark-{i+1}", template, BENCHMARK_KEY_NAME, pem_file, "benchmark-package", containers) for i in range(size))
+    return Manifest({template.name: template}, {"benchmark-package": containers}, instances)
+
+# Returns the results table: per fleet size, seconds per phase, launch throughput (instances provisioned per second), API calls
+def get_results_table(results):
+    rows = [["INSTANCES", "CREATE", "PROVISION", "MONITOR", "LAUNCH TOTAL", "INST/S", "PROVISIONED", "API CALLS", "THROTTLED", "RETRIES", "RATE WAIT"]]
+    for result in results:
+        launch_seconds = result['create_seconds'] + result['provision_seconds']
+        rows.append([
+            str(result['size']),
+            f"{result['create_seconds']:.2f}",
+            f"{result['provision_seconds']:.2f}",
+            f"{result['monitor_seconds']:.2f}",
+            f"{launch_seconds:.2f}",
+            f"{result['provisioned'] / launch_seconds:.2f}",
+            f"{result['provisioned']}/{result['size']}",
+            str(sum(result['api_calls'].values())),
+            str(result['throttles']),
+            str(result['retries']),
+            f"{result['rate_wait_seconds']:.2f}"
+        ])
+    return "--Benchmark results (seconds):\n" + format_columns(rows)
+
+############################################# CLASSES #############################################
+
+# Local stand-in for EC2: answers the requests of the clients it's attached to from in-memory instances
+#   Each request sleeps the simulated latency, and is counted by operation name (so retries count too)
+#   Instances are pending for the boot time after RunInstances, then running, with the SSH server stub's address as public IP
+class FakeEC2:
+    def __init__(self, benchmark_args):
+        self.latency_seconds = benchmark_args["latency_ms"] / 1000
+        self.throttle_rate = benchmark_args["throttle_rate"]
+        self.boot_seconds = benchmark_args["boot_seconds"]
+        self.lock = threading.Lock()
+        self.random = random.Random(4010)
+        self.instances = {} #instance ID -> description
+        self.launch_times = {} #instance ID -> time it was launched
+        self.call_counts = {}
+        self.call_local = threading.local()
+
+    # Answers every EC2 request the client sends (once it's been serialized and signed)
+    def attach(self, client):
+        client.meta.events.register("before-parameter-build.ec2", self.keep_api_call)
+        client.meta.events.register("before-send.ec2", self.handle_request)
+
+    # botocore 'before-parameter-build' handler: keeps the call's operation model and API params for its thread
+    # ('before-send' only sees the serialized request, and a call is sent and retried on the thread that made it)
+    def keep_api_call(self, model, params, **kwargs):
+        self.call_local.model = model
+        self.call_local.params = dict(params)
+
+    # botocore 'before-send' handler: returning an HTTP response stands in for sending the request
+    #   a throttled request gets EC2's 'RequestLimitExceeded' error response, for the rate limiter to back off and retry
+    def handle_request(self, request, **kwargs):
+        model = self.call_local.model
+        with self.lock:
+            self.call_counts[model.name] = self.call_counts.get(model.name, 0) + 1
+            throttled_flag = self.random.random() < self.throttle_rate
+        time.sleep(self.latency_seconds)
+        if throttled_flag:
+            return build_http_response(request.url, 503, "<Response><Errors><Error><Code>RequestLimitExceeded</Code>"
+                "<Message>Request limit exceeded.</Message></Error></Errors><RequestID>benchmark</RequestID></Response>")
+
+        handler = getattr(self, f"handle_{model.name}", None)
+        with self.lock:
+            parsed = handler(self.call_local.params) if handler else {}
+        content = serialize_xml_content(model.output_shape, parsed) if model.output_shape else ""
+        return build_http_response(request.url, 200, f"<{model.name}Response><requestId>benchmark</requestId>{content}</{model.name}Response>")
+
+    def handle_RunInstances(self, params):
+        descriptions = []
+        tags = [tag for spec in params.get('TagSpecifications', []) if spec['ResourceType'] == 'instance' for tag in spec['Tags']]
+        for launch_index in range(params['MaxCount']):
+            instance_id = f"i-{len(self.instances) + 1:017x}"
+            self.instances[instance_id] = {
+                'InstanceId': instance_id,
+                'AmiLaunchIndex': launch_index,
+                'ImageId': params['ImageId'],
+                'InstanceType': params['InstanceType'],
+                'KeyName': params.get('KeyName'),
+                'Placement': params.get('Placement', {'AvailabilityZone': f"{BENCHMARK_REGION}a"}),
+                'PublicIpAddress': "127.0.0.1",
+                'PublicDnsName': "localhost",
+                'SecurityGroups': [{'GroupName': group_name, 'GroupId': "sg-benchmark"} for group_name in params.get('SecurityGroups', [])],
+                'Tags': [dict(tag) for tag in tags],
+                'State': {'Code': 0, 'Name': "pending"}
+            }
+            self.launch_times[instance_id] = time.time()
+            descriptions.append(dict(self.instances[instance_id]))
+        return {'ReservationId': f"r-{len(self.instances):017x}", 'OwnerId': "000000000000", 'Instances': descriptions}
+
+    def handle_CreateTags(self, params):
+        for instance_id in params['Resources']:
+            if instance_id not in self.instances:
+                continue
+            tags = {tag['Key']: tag for tag in self.instances[instance_id]['Tags']}
+            tags.update({tag['Key']: dict(tag) for tag in params['Tags']})
+            self.instances[instance_id]['Tags'] = list(tags.values())
+        return {}
+
+    # Supports InstanceIds, 'instance-id' / 'tag:<key>' / 'instance-state-name' filters, and MaxResults/NextToken pagination
+    def handle_DescribeInstances(self, params):
+        descriptions = []
+        instance_ids = params.get('InstanceIds') or list(self.instances)
+        for instance_id in instance_ids:
+            if instance_id not in self.instances:
+                continue
+            description = self.instances[instance_id]
+            if time.time() - self.launch_times[instance_id] >= self.boot_seconds:
+                description['State'] = {'Code': 16, 'Name': "running"}
+            if all(self.matches_filter(description, instance_filter) for instance_filter in params.get('Filters', [])):
+                descriptions.append(dict(description))
+
+        start = int(params.get('NextToken', 0))
+        end = start + params['MaxResults'] if 'MaxResults' in params else len(descriptions)
+        response = {'Reservations': [{'ReservationId': "r-benchmark", 'Instances': descriptions[start:end]}]}
+        if end < len(descriptions):
+            response['NextToken'] = str(end)
+        return response
+
+    def handle_DescribeImages(self, params):
+        image_ids = params.get('ImageIds') or [value for image_filter in params.get('Filters', []) for value in image_filter['Values']]
+        return {'Images': [{'ImageId': image_id, 'RootDeviceName': "/dev/xvda", 'State': "available"} for image_id in image_ids]}
+
+    # Returns true if the instance description matches the filter (unsupported filter names match everything)
+    def matches_filter(self, description, instance_filter):
+        if instance_filter['Name'] == 'instance-id':
+            return description['InstanceId'] in instance_filter['Values']
+        if instance_filter['Name'] == 'instance-state-name':
+            return description['State']['Name'] in instance_filter['Values']
+        if instance_filter['Name'].startswith("tag:"):
+            tag_key = instance_filter['Name'][4:]
+            return any(tag['Key'] == tag_key and tag['Value'] in instance_filter['Values'] for tag in description['Tags'])
+        return True
+
+# Local paramiko SSH server stub that accepts the benchmark key, emulating remote command durations:
+#   'docker --version' fails (ie. Docker isn't installed yet), the Docker install script, 'docker pull' and 'docker run' / start scripts
+#   take the configured seconds, script syncs find nothing already there and accept the archive sent (see 'artifacts.py'),
+#   and 'bash -s' runs a batched provisioning script's steps (see launch.build_provision_script())
+class StubSSHServer:
+    def __init__(self, host_key, benchmark_args):
+        self.host_key = host_key
+        self.command_seconds = [
+            ("dockerInstall-", benchmark_args["install_seconds"]),
+            ("docker pull", benchmark_args["pull_seconds"]),
+            ("docker run", benchmark_args["run_seconds"]),
+            ("sh ./", benchmark_args["run_seconds"])
+        ]
+        self.listen_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listen_socket.bind(("127.0.0.1", 0))
+        self.listen_socket.listen(1024)
+        self.port = self.listen_socket.getsockname()[1]
+        self.closed_flag = False
+        threading.Thread(target=self.accept_connections, name="ssh-stub-accept", daemon=True).start()
+
+    def close(self):
+        self.closed_flag = True
+        self.listen_socket.close()
+
+    # Hands each connection to its own thread, so slow handshakes don't hold up accepting the next ones
+    def accept_connections(self):
+        while not self.closed_flag:
+            try:
+                connection, _ = self.listen_socket.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.serve_connection, args=(connection,), daemon=True).start()
+
+    # One paramiko transport per connection (port probes just close right away, which the transport shrugs off)
+    def serve_connection(self, connection):
+        try:
+            transport = paramiko.Transport(connection)
+            transport.add_server_key(self.host_key)
+            transport.start_server(server=StubSSHServerInterface(self))
+        except Exception:
+            connection.close()
+
+    # Returns the simulated seconds a remote command takes
+    def get_command_seconds(self, command):
+        for command_part, seconds in self.command_seconds:
+            if command_part in command:
+                return seconds
+        return 0
+
+    # Emulates a remote command on the channel, then sends its exit status and EOF
+    # NOTE: the client closes the channel, since closing it here could beat the server's reply to the exec request itself
+    def run_command(self, channel, command):
+        if command.endswith("bash -s"):
+            self.run_batched_script(channel)
+            exit_status = 0
+        elif ARTIFACT_DIR in command:
+            self.receive_stdin(channel)
+            exit_status = 1 if "sha256sum" in command else 0
+        elif "docker --version" in command:
+            exit_status = 1
+        else:
+            time.sleep(self.get_command_seconds(command))
+            channel.sendall(f"{command} done\n".encode('UTF-8'))
+            exit_status = 0
+        channel.send_exit_status(exit_status)
+        channel.shutdown_write()
+
+    # Returns everything the client sends to the command's stdin (until it shuts down writing)
+    def receive_stdin(self, channel):
+        received = b""
+        while True:
+            data = channel.recv(65536)
+            if not data:
+                return received
+            received += data
+
+    # Reads the provisioning script from stdin, then emulates each 'step <name> <command...>' line, printing its marker line
+    def run_batched_script(self, channel):
+        for line in self.receive_stdin(channel).decode('UTF-8').splitlines():
+            if not line.startswith("step "):
+                continue
+            _, step_name, command = line.split(" ", 2)
+            start = time.time()
+            time.sleep(self.get_command_seconds(command))
+            channel.sendall(f"{command} done\n\n{launch.BATCH_STEP_MARKER} {step_name} 0 {start} {time.time()}\n".encode('UTF-8'))
+
+# Body of a fake HTTP response, in the form botocore reads it from (see build_http_response())
+class FakeRawResponse:
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+# paramiko server side of a stub SSH connection: publickey auth, session channels, exec requests (each run on its own thread)
+class StubSSHServerInterface(paramiko.ServerInterface):
+    def __init__(self, ssh_server):
+        self.ssh_server = ssh_server
+
+    def get_allowed_auths(self, username):
+        return "publickey"
+
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=self.ssh_server.run_command, args=(channel, command.decode('UTF-8')), daemon=True).start()
+        return True
+
+############################################# HELPERS #############################################
+
+# Returns a botocore HTTP response with the status code and XML body, as if EC2 sent it
+def build_http_response(url, status_code, body):
+    return AWSResponse(url, status_code, {'Content-Type': "text/xml;charset=UTF-8"}, FakeRawResponse(body.encode('UTF-8')))
+
+# Returns the EC2 XML content of the value of the shape (what botocore's EC2 parser reads back): structure members as elements
+# named by their location name, list items as '<item>' elements (their location name), booleans as 'true'/'false'
+# NOTE: members that aren't part of the shape are left out, like EC2 would
+def serialize_xml_content(shape, value):
+    if shape.type_name == 'structure':
+        members = [(member_shape.serialization.get('name', member_name), member_shape, value[member_name]) for member_name, member_shape in shape.members.items() if member_name in value]
+    elif shape.type_name == 'list':
+        members = [(shape.member.serialization.get('name', "member"), shape.member, item) for item in value]
+    elif shape.type_name == 'boolean':
+        return "true" if value else "false"
+    else:
+        return xml.sax.saxutils.escape(str(value))
+    return "".join(f"<{name}>{serialize_xml_content(member_shape, member_value)}</{name}>" for name, member_shape, member_value in members)
+
+# Returns the optional benchmark arguments (see BENCHMARK_OPTIONS) parsed from the command line, terminating with usage statement if any are bad
+def parse_benchmark_args(argv):
+    benchmark_args = {key: default for key, _, default in BENCHMARK_OPTIONS.values()}
+    bad_usage_flag = False
+
+    # Check args
+    i = 1
+    while i < len(argv):
+        if argv[i] not in BENCHMARK_OPTIONS:
+            bad_usage_flag = True
+            print(f"Error: Given argument '{argv[i]}' is invalid.")
+            i += 1
+            continue
+        key, kind, _ = BENCHMARK_OPTIONS[argv[i]]
+        if kind == "flag":
+            benchmark_args[key] = True
+            i += 1
+            continue
+
+        value = argv[i+1] if i+1 < len(argv) else ""
+        if kind == "int" and value.isdigit() and int(value) >= 1:
+            benchmark_args[key] = int(value)
+        elif kind == "sizes" and value and all(size.isdigit() and int(size) >= 1 for size in value.split(",")):
+            benchmark_args[key] = [int(size) for size in value.split(",")]
+        elif kind == "float" and value.replace(".", "", 1).isdigit():
+            benchmark_args[key] = float(value)
+        else:
+            bad_usage_flag = True
+            print(f"Error: Given '{argv[i]}' value '{value}' is invalid.")
+        i += 2
+
+    # Exit with usage statement if flag has been triggered for any reason
+    if bad_usage_flag:
+        sys.exit(USAGE_STATEMENT)
+    return benchmark_args
+
+###################################################################################################
+
+# main()
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print("Error: error occurred, terminating program immediately as precaution.")
+        sys.exit(f"[ERROR] {e}")
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+'''
+@author : Mitchell Van Braeckel
+@id : 1002297
+@date : 10/29/2020
+@version : python 3.8-32 / python 3.8.5
+@course : CIS*4010 Cloud Computing
+@brief : A2 Part 1: AWS EC2 - One-Click Deployment of VMs and Containers ; console_waiter.py
+
+@note :
+    Description: reads whether an instance's user data provisioning finished from its console output, through the EC2 API
+    (used by 'launch.py --user-data' to wait on its fleet, and by 'monitor.py' for its 'user_data' column)
+        - the user data script (see build_user_data() in 'launch.py') writes one marker line to the console once every step ran:
+          'ONECLICK-USER-DATA-DONE <step name>=<exit code> ...'
+        - so no SSH session is needed, only a 'get_console_output()' call per instance
+          (the latest output on Nitro instances, otherwise the buffered output, which EC2 can take a few minutes to refresh)
+        - one waiter thread polls every waiting instance in turn, so a fleet's console reads are sequential (never a burst of them),
+          and once an instance is done, its callback is called from the waiter's thread (so it should only hand the instance over)
+'''
+
+############################################# IMPORTS #############################################
+
+# IMPORTS - 'pip install <import-package>'
+import threading
+import time
+
+############################################ CONSTANTS ############################################
+
+# Console marker line written by the user data script once every step ran (followed by each step's '<name>=<exit code>')
+USER_DATA_CONSOLE_MARKER = "ONECLICK-USER-DATA-DONE"
+
+# Instance tag of its user data provisioning status: PENDING when launched, then OK/FAILED once 'launch.py' read its console marker
+USER_DATA_STATUS_TAG = "UserDataStatus"
+
+# How often the waiter checks for new instances, timeouts and a close (seconds)
+CONSOLE_WAITER_TICK_SECONDS = 0.5
+
+############################## STATE VARIABLES, INITIALIZATION, MAIN ##############################
+
+# Instance IDs whose console can't give its latest output (ie. not Nitro), so it's only asked for the buffered output
+latest_unsupported_ids = set()
+
+############################################# CLASSES #############################################
+
+# An instance being waited on
+class WaitingInstance:
+    __slots__ = ("instance_id", "deadline", "on_done", "next_poll_time")
+
+    def __init__(self, instance_id, deadline, on_done):
+        self.instance_id = instance_id
+        self.deadline = deadline
+        self.on_done = on_done
+        self.next_poll_time = 0.0
+
+# Waits for instances' user data console markers from one thread (see file header)
+#   add(instance_id, on_done) starts waiting on an instance, on_done(step_results) is called with its step results
+#   (see parse_user_data_results()) once its marker shows up, or None once the timeout passes
+#   close() lets every instance already added finish first (on leaving a 'with' block too)
+class ConsoleWaiter:
+    def __init__(self, client, timeout=1800, poll_interval=10):
+        self.client = client
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.added_instances = [] #instances added since the waiter thread last picked them up
+        self.close_flag = False
+        self.thread = threading.Thread(target=self.work, name="console-waiter", daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    # Starts waiting on the instance's console marker
+    def add(self, instance_id, on_done):
+        with self.lock:
+            self.added_instances.append(WaitingInstance(instance_id, time.monotonic() + self.timeout, on_done))
+
+    # Waits until every instance added so far is done, then stops the waiter thread
+    def close(self):
+        with self.lock:
+            self.close_flag = True
+        self.thread.join()
+
+    # Waiter loop: reads the console of every waiting instance that's due (one at a time), then drops the done and timed out ones
+    # NOTE: a failed console read (eg. throttled past the client's retries) is just tried again on the next poll interval
+    def work(self):
+        waiting_instances = []
+        while True:
+            with self.lock:
+                waiting_instances.extend(self.added_instances)
+                self.added_instances = []
+                if not waiting_instances and self.close_flag:
+                    return
+
+            for waiting in waiting_instances:
+                if waiting.next_poll_time > time.monotonic():
+                    continue
+                try:
+                    step_results = parse_user_data_results(get_console_text(self.client, waiting.instance_id))
+                except Exception:
+                    step_results = None
+                if step_results != None:
+                    self.finish(waiting, step_results)
+                elif time.monotonic() >= waiting.deadline:
+                    self.finish(waiting, None)
+                else:
+                    waiting.next_poll_time = time.monotonic() + self.poll_interval
+            waiting_instances = [waiting for waiting in waiting_instances if waiting.on_done != None]
+            time.sleep(CONSOLE_WAITER_TICK_SECONDS)
+
+    # Hands the instance over to its callback (once), and drops it from the waiting instances
+    def finish(self, waiting, step_results):
+        on_done = waiting.on_done
+        waiting.on_done = None
+        on_done(step_results)
+
+############################################ FUNCTIONS ############################################
+
+# Returns the instance's console output as text ("" if there's none yet)
+#   Asks for the latest output first, then only for the buffered output if the instance doesn't support that (remembered per instance)
+def get_console_text(client, instance_id):
+    from botocore.exceptions import ClientError #deferred (boto3/botocore are only loaded once a client exists)
+    if instance_id not in latest_unsupported_ids:
+        try:
+            return client.get_console_output(InstanceId=instance_id, Latest=True).get('Output') or ""
+        except ClientError as e:
+            if e.response['Error']['Code'] != "UnsupportedOperation":
+                raise
+            latest_unsupported_ids.add(instance_id)
+    return client.get_console_output(InstanceId=instance_id).get('Output') or ""
+
+# Returns the step results of the last user data console marker line as a dict of step name -> exit code (strings),
+# or None if the console output has no marker (yet)
+#   Console lines can carry a prefix (eg. a kernel timestamp) and a trailing '\r', so only what follows the marker is read
+def parse_user_data_results(console_text):
+    marker_index = console_text.rfind(USER_DATA_CONSOLE_MARKER)
+    if marker_index < 0:
+        return None
+    marker_lines = console_text[marker_index + len(USER_DATA_CONSOLE_MARKER):].splitlines()
+    return dict(result.rsplit("=", 1) for result in (marker_lines[0] if marker_lines else "").split() if "=" in result)
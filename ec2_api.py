@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+
+'''
+@author : Mitchell Van Braeckel
+@id : 1002297
+@date : 10/29/2020
+@version : python 3.8-32 / python 3.8.5
+@course : CIS*4010 Cloud Computing
+@brief : A2 Part 1: AWS EC2 - One-Click Deployment of VMs and Containers ; ec2_api.py
+
+@note :
+    Description: throttle-aware EC2 clients shared by 'launch.py', 'monitor.py' and 'golden_ami.py'
+        - create_client()/create_resource() return boto3 EC2 clients/resources whose every API call (including the ones made by
+          resources, waiters and paginators) goes through the shared rate limiter first
+        - the rate limiter keeps a token bucket per (region, API action), eg. RunInstances, DescribeInstances, CreateTags,
+          sized like EC2's own request limits (see ACTION_RATE_LIMITS), so many threads calling at once queue up client-side
+          instead of tripping 'RequestLimitExceeded'
+        - rate control is adaptive: a throttled call halves its action's refill rate, and each successful call wins a bit of it back
+        - throttled calls (and server errors / dropped connections) are retried with full-jitter exponential backoff,
+          instead of botocore's own retries (up to MAX_ATTEMPTS attempts in total)
+
+        - get_api_metrics() / get_api_metrics_table() show calls, throttles hit, retries and time spent waiting per action
+
+        - every client and resource comes from one shared boto3 Session (so the EC2 service model is only loaded once),
+          and boto3/botocore are only imported once the first one is made, so scripts start (and parse their arguments) fast
+        - check_credentials() validates credentials with a 'describe_instances()' dry run (authorized, but nothing is described),
+          and remembers a pass on disk for a while (by a hash of the access key and the region), so scripts run in tight loops skip it
+'''
+
+############################################# IMPORTS #############################################
+
+# IMPORTS - 'pip install <import-package>'
+import functools
+import hashlib
+import json
+import os
+import random
+from tables import format_columns
+import threading
+import time
+
+############################################ CONSTANTS ############################################
+
+# Token bucket per API action: action -> (bucket size, refill rate per second)
+#   actions not listed get DEFAULT_DESCRIBE_RATE_LIMIT (Describe*) or DEFAULT_MUTATING_RATE_LIMIT (everything else)
+ACTION_RATE_LIMITS = {
+    'RunInstances': (50, 5.0),
+    'CreateTags': (200, 20.0),
+    'DescribeInstances': (100, 20.0)
+}
+DEFAULT_DESCRIBE_RATE_LIMIT = (100, 20.0)
+DEFAULT_MUTATING_RATE_LIMIT = (50, 5.0)
+
+# Adaptive rate control: a throttle multiplies the refill rate by the factor (down to the minimum),
+# and each success adds back the fraction of the configured rate
+THROTTLE_RATE_FACTOR = 0.5
+MIN_REFILL_RATE = 0.5
+RECOVERY_RATE_FRACTION = 0.05
+
+# Retries of throttled calls, server errors and dropped connections (full-jitter exponential backoff, seconds)
+MAX_ATTEMPTS = 8
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 20
+
+# Credentials check cache: a passed check (by hash of access key and region) is trusted for the TTL
+CREDENTIALS_CACHE_FILENAME = ".credentials_check_cache.json"
+CREDENTIALS_CACHE_TTL_SECONDS = 900
+
+THROTTLE_ERROR_CODES = {"RequestLimitExceeded", "Throttling", "ThrottlingException", "RequestThrottled", "RequestThrottledException", "TooManyRequestsException"}
+
+############################################# CLASSES #############################################
+
+# Token bucket whose refill rate adapts to throttling (see THROTTLE_RATE_FACTOR)
+class TokenBucket:
+    def __init__(self, capacity, refill_rate):
+        self.lock = threading.Lock()
+        self.capacity = capacity
+        self.max_refill_rate = refill_rate
+        self.refill_rate = refill_rate
+        self.tokens = float(capacity)
+        self.updated_time = time.monotonic()
+
+    # Takes a token, waiting for one if the bucket is empty, returns the seconds waited
+    def acquire(self):
+        waited_seconds = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.tokens + (now - self.updated_time) * self.refill_rate, self.capacity)
+                self.updated_time = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited_seconds
+                wait_seconds = (1 - self.tokens) / self.refill_rate
+            time.sleep(wait_seconds)
+            waited_seconds += wait_seconds
+
+    # Cuts the refill rate and empties the bucket (AWS just said we're over its limit)
+    def throttled(self):
+        with self.lock:
+            self.refill_rate = max(self.refill_rate * THROTTLE_RATE_FACTOR, MIN_REFILL_RATE)
+            self.tokens = min(self.tokens, 0.0)
+
+    # Wins back some of the refill rate after a successful call
+    def succeeded(self):
+        if self.refill_rate < self.max_refill_rate:
+            with self.lock:
+                self.refill_rate = min(self.refill_rate + self.max_refill_rate * RECOVERY_RATE_FRACTION, self.max_refill_rate)
+
+# Rate limiter shared by every client made with create_client()/create_resource(): buckets and metrics per (region, action)
+class ApiRateLimiter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.metrics = {} #(region, action) -> {'calls', 'throttles', 'retries', 'wait_seconds'}
+
+    # Hooks the limiter into every EC2 call the client makes (replacing botocore's own retries)
+    def attach(self, client):
+        region = client.meta.region_name
+        events = client.meta.events
+        events.unregister("needs-retry.ec2", unique_id="retry-config-ec2")
+        events.register("before-call.ec2", functools.partial(self.before_call, region))
+        events.register("after-call.ec2", functools.partial(self.after_call, region))
+        events.register("needs-retry.ec2", functools.partial(self.needs_retry, region))
+
+    # botocore 'before-call' event: waits for a token of the action's bucket
+    def before_call(self, region, model, **kwargs):
+        bucket, metrics = self.get_bucket(region, model.name)
+        waited_seconds = bucket.acquire()
+        with self.lock:
+            metrics['calls'] += 1
+            metrics['wait_seconds'] += waited_seconds
+
+    # botocore 'after-call' event: a successful call lets the action's rate recover
+    def after_call(self, region, model, http_response, **kwargs):
+        if http_response is not None and http_response.status_code < 300:
+            self.get_bucket(region, model.name)[0].succeeded()
+
+    # botocore 'needs-retry' event: retries throttled calls, server errors and dropped connections after a jittered backoff
+    # (and a fresh token), returns None when the call shouldn't be retried
+    def needs_retry(self, region, operation, attempts, response=None, caught_exception=None, **kwargs):
+        throttled_flag = False
+        if caught_exception is None:
+            http_response, parsed = response
+            throttled_flag = parsed.get('Error', {}).get('Code') in THROTTLE_ERROR_CODES
+            if not throttled_flag and http_response.status_code < 500:
+                return None
+
+        bucket, metrics = self.get_bucket(region, operation.name)
+        if throttled_flag:
+            bucket.throttled()
+            with self.lock:
+                metrics['throttles'] += 1
+        if attempts >= MAX_ATTEMPTS:
+            return None
+
+        backoff_seconds = random.uniform(0, min(BACKOFF_BASE_SECONDS * 2 ** attempts, BACKOFF_MAX_SECONDS))
+        time.sleep(backoff_seconds)
+        waited_seconds = backoff_seconds + bucket.acquire()
+        with self.lock:
+            metrics['retries'] += 1
+            metrics['wait_seconds'] += waited_seconds
+        return 0 #already waited
+
+    # Returns the (bucket, metrics) of the region's API action, creating them on first use
+    def get_bucket(self, region, action):
+        key = (region, action)
+        with self.lock:
+            if key not in self.buckets:
+                self.buckets[key] = TokenBucket(*get_action_rate_limit(action))
+                self.metrics[key] = {'calls': 0, 'throttles': 0, 'retries': 0, 'wait_seconds': 0.0}
+            return self.buckets[key], self.metrics[key]
+
+# The rate limiter every client shares (EC2 request limits are per account and region, not per client)
+rate_limiter = ApiRateLimiter()
+
+# The boto3 Session every client and resource is made from (see get_session())
+session_lock = threading.Lock()
+session_state = {'session': None}
+
+############################################ FUNCTIONS ############################################
+
+# Returns the shared boto3 Session, importing boto3 and creating it on first use
+def get_session():
+    with session_lock:
+        if session_state['session'] is None:
+            import boto3 #deferred, see file header
+            session_state['session'] = boto3.session.Session()
+        return session_state['session']
+
+# Returns an EC2 client (of the session, or the shared one) that goes through the shared rate limiter
+def create_client(region_name=None, session=None, **kwargs):
+    from botocore.config import Config #deferred, see file header
+    client = (session or get_session()).client("ec2", region_name=region_name, config=Config(retries={'mode': 'standard'}), **kwargs)
+    rate_limiter.attach(client)
+    return client
+
+# Returns an EC2 resource (of the session, or the shared one) whose client goes through the shared rate limiter
+def create_resource(region_name=None, session=None, **kwargs):
+    from botocore.config import Config #deferred, see file header
+    resource = (session or get_session()).resource("ec2", region_name=region_name, config=Config(retries={'mode': 'standard'}), **kwargs)
+    rate_limiter.attach(resource.meta.client)
+    return resource
+
+# Validates the shared session's credentials (for the client's region) by a 'describe_instances()' dry run, unless one passed within the TTL (see CREDENTIALS_CACHE_*)
+# Raises an exception if there are no credentials or the dry run isn't authorized, returns true if the check came from the cache
+def check_credentials(client, cache_filename=CREDENTIALS_CACHE_FILENAME):
+    from botocore.exceptions import ClientError #deferred, see file header
+    credentials = get_session().get_credentials()
+    if credentials is None:
+        raise Exception("No AWS credentials found")
+    cache_key = hashlib.sha256(f"{credentials.access_key}:{client.meta.region_name}".encode('UTF-8')).hexdigest()
+    cache = load_credentials_cache(cache_filename)
+    if time.time() - cache.get(cache_key, 0) < CREDENTIALS_CACHE_TTL_SECONDS:
+        return True
+
+    # A dry run answers 'DryRunOperation' if the call would have been allowed (without describing anything)
+    try:
+        client.describe_instances(DryRun=True, MaxResults=5)
+    except ClientError as e:
+        if e.response['Error']['Code'] != "DryRunOperation":
+            raise
+
+    cache[cache_key] = time.time()
+    save_credentials_cache(cache, cache_filename)
+    return False
+
+# Returns the API metrics so far as (region, action) -> {'calls', 'throttles', 'retries', 'wait_seconds'}
+def get_api_metrics():
+    with rate_limiter.lock:
+        return {key: dict(metrics) for key, metrics in rate_limiter.metrics.items()}
+
+# Returns the API metrics so far as a table for display (busiest action first)
+def get_api_metrics_table():
+    rows = [["REGION", "ACTION", "CALLS", "THROTTLED", "RETRIES", "WAITED (s)"]]
+    for (region, action), metrics in sorted(get_api_metrics().items(), key=lambda item: item[1]['calls'], reverse=True):
+        rows.append([str(region), action, str(metrics['calls']), str(metrics['throttles']), str(metrics['retries']), f"{metrics['wait_seconds']:.2f}"])
+    return "--EC2 API calls:\n" + format_columns(rows)
+
+############################################# HELPERS #############################################
+
+# Returns the credentials check cache (access key + region hash -> time of the last passed check), empty if missing or unreadable
+def load_credentials_cache(cache_filename=CREDENTIALS_CACHE_FILENAME):
+    try:
+        with open(cache_filename, "r") as cache_file:
+            cache = json.load(cache_file)
+        return cache if isinstance(cache, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+# Saves the credentials check cache (written to a temp file then renamed, so concurrent runs never read half a file)
+def save_credentials_cache(cache, cache_filename=CREDENTIALS_CACHE_FILENAME):
+    try:
+        temp_filename = f"{cache_filename}.{os.getpid()}.tmp"
+        with open(temp_filename, "w") as cache_file:
+            json.dump(cache, cache_file)
+        os.replace(temp_filename, cache_filename)
+    except OSError:
+        pass #the cache is only an optimization
+
+# Returns the (bucket size, refill rate per second) of the API action
+def get_action_rate_limit(action):
+    if action in ACTION_RATE_LIMITS:
+        return ACTION_RATE_LIMITS[action]
+    if action.startswith("Describe"):
+        return DEFAULT_DESCRIBE_RATE_LIMIT
+    return DEFAULT_MUTATING_RATE_LIMIT
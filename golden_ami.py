@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+
+'''
+@author : Mitchell Van Braeckel
+@id : 1002297
+@date : 10/29/2020
+@version : python 3.8-32 / python 3.8.5
+@course : CIS*4010 Cloud Computing
+@brief : A2 Part 1: AWS EC2 - One-Click Deployment of VMs and Containers ; golden_ami.py
+
+@note :
+    Description: golden AMI cache, so Docker only has to be installed from scratch once per (base AMI, install script)
+        - used by 'launch.py --golden-ami', or run directly to list and evict cache entries
+        - a cache entry is an AMI owned by this account, tagged with:
+          OneClickGoldenAmi=True, OneClickBaseAmi=<base AMI image ID>, OneClickInstallHash=<sha256 of the Docker install script>
+        - launch.py snapshots the first instance of a (base AMI, install script hash) pair right after Docker is installed,
+          then later launches from that template use the cached AMI instead and skip the Docker install
+        - before the snapshot, the instance's disk is synced, its authorized SSH keys are emptied and its cloud-init state is cleaned
+          (so instances launched from the image only accept their own key pair, and cloud-init sets them up as new instances),
+          and its keys are only put back once the image's snapshots have started (see wait_for_image_snapshots())
+
+        - optional 'evict' arguments:
+        --> '--older-than DAYS': also evict entries created more than DAYS days ago
+        --> '--all': evict every entry
+        --> by default, evicts entries that are stale, ie. no template in 'template.csv' uses their (base AMI, install script hash)
+            anymore, or that are older duplicates of a newer entry for the same pair
+        --> if 'template.csv' is missing or has rows that can't be read, nothing can be judged unused, so a bare 'evict' refuses to run
+            (with '--older-than' only the age and duplicate rules apply)
+
+        - evicting deregisters the AMI and deletes its EBS snapshots (the entries about to be evicted are printed first)
+'''
+
+############################################# IMPORTS #############################################
+
+# IMPORTS - 'pip install <import-package>'
+import datetime
+from ec2_api import create_client
+import hashlib
+import os
+import sys
+from tables import format_columns
+import time
+from manifest import CSV_TEMPLATE_FILENAME, DOCKER_INSTALL_SCRIPT_DICT, ManifestError, load_csv_file, parse_template
+
+############################################ CONSTANTS ############################################
+
+USAGE_STATEMENT = "Usage: py golden_ami.py <list|evict> <--older-than DAYS|optional,int> <--all|optional>"
+
+TAG_GOLDEN = "OneClickGoldenAmi"
+TAG_BASE_AMI = "OneClickBaseAmi"
+TAG_INSTALL_HASH = "OneClickInstallHash"
+TAG_INSTALL_SCRIPT = "OneClickInstallScript"
+
+############################## STATE VARIABLES, INITIALIZATION, MAIN ##############################
+
+def main():
+    # ========== ARGUMENTS ==========
+    argc = len(sys.argv)
+    bad_usage_flag = False
+    older_than_days = None
+    evict_all_flag = False
+
+    # Check args
+    if argc < 2 or sys.argv[1] not in ("list", "evict"):
+        bad_usage_flag = True
+        print("Error: Command must be 'list' or 'evict'.")
+    i = 2
+    while i < argc:
+        if sys.argv[i] == "--all":
+            evict_all_flag = True
+            i += 1
+        elif sys.argv[i] == "--older-than" and i+1 < argc and sys.argv[i+1].isdigit():
+            older_than_days = int(sys.argv[i+1])
+            i += 2
+        else:
+            bad_usage_flag = True
+            print(f"Error: Given argument '{sys.argv[i]}' is invalid.")
+            i += 1
+    if argc >= 3 and sys.argv[1] == "list":
+        bad_usage_flag = True
+        print("Error: 'list' takes no arguments.")
+
+    # Exit with usage statement if flag has been triggered for any reason
+    if bad_usage_flag:
+        sys.exit(USAGE_STATEMENT)
+
+    # ========== AWS EC2 ==========
+    ec2_client = create_client()
+
+    try:
+        entries = list_golden_amis(ec2_client)
+    except Exception as e:
+        sys.exit(f"[ERROR] While listing golden AMI cache entries: {e}")
+
+    if sys.argv[1] == "list":
+        print(get_entries_table(entries))
+        return
+
+    # Determine which entries to evict (an unreadable template CSV can't tell what's unused, so never treat everything as stale),
+    # then show them and deregister them (and delete their snapshots)
+    if evict_all_flag:
+        evict_entries = entries
+    else:
+        current_cache_keys = get_current_cache_keys()
+        if current_cache_keys == None:
+            print(f"Error: '{CSV_TEMPLATE_FILENAME}' is missing or has unreadable rows, so can't tell which entries are still in use.")
+            if older_than_days == None:
+                sys.exit("Error: Refusing to evict - run from the deployment's directory, or give '--older-than DAYS' or '--all'.")
+            print(f"-only evicting entries older than {older_than_days} days and older duplicates")
+        evict_entries = find_stale_entries(entries, current_cache_keys, older_than_days)
+    if not evict_entries:
+        print(f"--Nothing to evict ({len(entries)} golden AMI cache entries)--")
+        return
+    print(f"--Evicting {len(evict_entries)} of {len(entries)} golden AMI cache entries (and their {sum(len(entry['snapshot_ids']) for entry in evict_entries)} snapshots):")
+    print(get_entries_table(evict_entries))
+    for entry in evict_entries:
+        try:
+            evict_golden_ami(ec2_client, entry)
+            print(f"-evicted {entry['image_id']} ({entry['base_ami']}, {entry['install_script']})")
+        except Exception as e:
+            print(f"Error: Failed to evict {entry['image_id']}: {e}")
+    print("...Eviction complete--")
+
+############################################ FUNCTIONS ############################################
+
+# Returns the sha256 hex digest of the install script's content (the cache key along with the base AMI)
+def install_script_hash(install_script):
+    with open(install_script, "rb") as script_file:
+        return hashlib.sha256(script_file.read()).hexdigest()
+
+# Returns the image ID of the newest available golden AMI for the (base AMI, install script hash) pair, or None if not cached
+def find_golden_ami(ec2_client, base_ami, install_hash):
+    images = ec2_client.describe_images(
+        Owners=['self'],
+        Filters=[
+            {'Name': f"tag:{TAG_GOLDEN}", 'Values': ['True']},
+            {'Name': f"tag:{TAG_BASE_AMI}", 'Values': [base_ami]},
+            {'Name': f"tag:{TAG_INSTALL_HASH}", 'Values': [install_hash]},
+            {'Name': 'state', 'Values': ['available']}
+        ]
+    )['Images']
+    if not images:
+        return None
+    return max(images, key=lambda image: image['CreationDate'])['ImageId']
+
+# Snapshots the instance (without rebooting it) into a golden AMI tagged as the cache entry for the pair, returns the new image ID
+#   The instance should already be cleaned up for imaging (see launch.snapshot_golden_ami_once())
+# NOTE: the image only becomes usable once it is 'available', until then find_golden_ami() won't return it
+def create_golden_ami(ec2_client, instance_id, base_ami, install_script, install_hash):
+    return ec2_client.create_image(
+        InstanceId=instance_id,
+        Name=f"oneclick-golden-{base_ami}-{install_hash[:12]}-{int(time.time())}",
+        Description=f"One-click deployment golden AMI: {base_ami} + {install_script}",
+        NoReboot=True,
+        TagSpecifications=[
+            {
+                'ResourceType': 'image',
+                'Tags': [
+                    {'Key': TAG_GOLDEN, 'Value': 'True'},
+                    {'Key': TAG_BASE_AMI, 'Value': base_ami},
+                    {'Key': TAG_INSTALL_HASH, 'Value': install_hash},
+                    {'Key': TAG_INSTALL_SCRIPT, 'Value': install_script}
+                ]
+            }
+        ]
+    )['ImageId']
+
+# Waits until every EBS snapshot of the image has started (ie. the point in time the image captures is fixed),
+# returns true if they did within the timeout, false if they didn't or the image failed
+# NOTE: filtering by 'image-id' (instead of ImageIds) doesn't fail while the new image isn't visible yet
+def wait_for_image_snapshots(ec2_client, image_id, timeout=600, poll_interval=5):
+    deadline = time.time() + timeout
+    while True:
+        images = ec2_client.describe_images(
+            Owners=['self'],
+            Filters=[{'Name': 'image-id', 'Values': [image_id]}]
+        )['Images']
+        if images:
+            if images[0].get('State') in ('invalid', 'deregistered', 'failed', 'error'):
+                return False
+            ebs_mappings = [mapping['Ebs'] for mapping in images[0].get('BlockDeviceMappings', []) if 'Ebs' in mapping]
+            if images[0].get('State') == 'available' or (ebs_mappings and all('SnapshotId' in ebs for ebs in ebs_mappings)):
+                return True
+        if time.time() >= deadline:
+            return False
+        time.sleep(poll_interval)
+
+# Returns every golden AMI cache entry as a list of dicts: image_id, state, created, base_ami, install_hash, install_script, snapshot_ids
+def list_golden_amis(ec2_client):
+    images = ec2_client.describe_images(
+        Owners=['self'],
+        Filters=[{'Name': f"tag:{TAG_GOLDEN}", 'Values': ['True']}]
+    )['Images']
+
+    entries = []
+    for image in images:
+        tags = {tag['Key']: tag['Value'] for tag in image.get('Tags', [])}
+        entries.append({
+            'image_id': image['ImageId'],
+            'state': image.get('State'),
+            'created': image.get('CreationDate', ""),
+            'base_ami': tags.get(TAG_BASE_AMI, ""),
+            'install_hash': tags.get(TAG_INSTALL_HASH, ""),
+            'install_script': tags.get(TAG_INSTALL_SCRIPT, ""),
+            'snapshot_ids': [mapping['Ebs']['SnapshotId'] for mapping in image.get('BlockDeviceMappings', []) if 'SnapshotId' in mapping.get('Ebs', {})]
+        })
+    return sorted(entries, key=lambda entry: entry['created'])
+
+# Returns the (base AMI, install script hash) pairs the current template CSV would use,
+# or None if the template CSV is missing or any of its rows can't be read (ie. there's no telling which pairs are in use)
+def get_current_cache_keys():
+    cache_keys = set()
+    try:
+        rows = load_csv_file(CSV_TEMPLATE_FILENAME)
+    except (OSError, UnicodeDecodeError):
+        return None
+    for row in rows:
+        if not row:
+            continue
+        try:
+            template = parse_template(row)
+        except (IndexError, ValueError, ManifestError):
+            return None
+        install_script = DOCKER_INSTALL_SCRIPT_DICT.get(template.user_keyword)
+        if install_script:
+            if not os.path.isfile(install_script):
+                return None
+            cache_keys.add((template.image_id, install_script_hash(install_script)))
+    return cache_keys
+
+# Returns the entries to evict: not used by any current (base AMI, install script hash) pair (unless current_cache_keys is None,
+# ie. unknown), an older duplicate of a newer entry for the same pair, or (if given) created more than 'older_than_days' days ago
+def find_stale_entries(entries, current_cache_keys, older_than_days=None):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    newest_per_key = {}
+    for entry in entries: #sorted oldest first, so the last one per key is the newest
+        newest_per_key[(entry['base_ami'], entry['install_hash'])] = entry['image_id']
+
+    stale_entries = []
+    for entry in entries:
+        cache_key = (entry['base_ami'], entry['install_hash'])
+        if (current_cache_keys != None and cache_key not in current_cache_keys) or newest_per_key[cache_key] != entry['image_id']:
+            stale_entries.append(entry)
+        elif older_than_days is not None and entry['created']:
+            created = datetime.datetime.fromisoformat(entry['created'].replace("Z", "+00:00"))
+            if (now - created).days > older_than_days:
+                stale_entries.append(entry)
+    return stale_entries
+
+# Deregisters the golden AMI and deletes its EBS snapshots
+def evict_golden_ami(ec2_client, entry):
+    ec2_client.deregister_image(ImageId=entry['image_id'])
+    for snapshot_id in entry['snapshot_ids']:
+        ec2_client.delete_snapshot(SnapshotId=snapshot_id)
+
+############################################# HELPERS #############################################
+
+# Returns the cache entries as a table for display
+def get_entries_table(entries):
+    rows = [["IMAGE ID", "STATE", "CREATED", "BASE AMI", "INSTALL SCRIPT", "INSTALL HASH"]]
+    for entry in entries:
+        rows.append([entry['image_id'], str(entry['state']), entry['created'], entry['base_ami'], entry['install_script'], entry['install_hash'][:12]])
+    return format_columns(rows)
+
+###################################################################################################
+
+# main()
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print("Error: error occurred, terminating program immediately as precaution.")
+        sys.exit(f"[ERROR] {e}")
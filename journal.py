@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+'''
+@author : Mitchell Van Braeckel
+@id : 1002297
+@date : 10/29/2020
+@version : python 3.8-32 / python 3.8.5
+@course : CIS*4010 Cloud Computing
+@brief : A2 Part 1: AWS EC2 - One-Click Deployment of VMs and Containers ; journal.py
+
+@note :
+    Description: append-only deployment journal, so an interrupted 'launch.py' can be resumed (used by 'launch.py --resume')
+        - each completed step is appended as one JSON line and flushed right away, so a crash loses at most the step in progress
+        - a line is: {"time": ..., "instance": <instance name>, "instance_id": ..., "container": <container name or null>, "step": <step name>}
+        - steps recorded by launch.py: 'created', 'docker-installed', 'container-provisioned' (per container), 'provisioned'
+        - 'created' is journaled as soon as an instance's launch request returns (before it's tagged), so resuming can adopt it by ID
+        - steps are tracked per instance ID, so an instance that had to be recreated (eg. terminated) starts over from scratch
+
+        - a new deployment starts a new journal, resuming loads the existing one and keeps appending to it
+        - a partially written last line (ie. the process died mid-write) is ignored when loading
+'''
+
+############################################# IMPORTS #############################################
+
+# IMPORTS - 'pip install <import-package>'
+import json
+import threading
+import time
+
+############################################ CONSTANTS ############################################
+
+JOURNAL_FILENAME = "deployment_journal.jsonl"
+
+############################################# CLASSES #############################################
+
+# The deployment journal: completed steps by (instance ID, container name or None, step), safe to record from many workers
+class DeploymentJournal:
+    def __init__(self, filename=JOURNAL_FILENAME, resume_flag=False):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.completed = set()
+        self.created_instance_ids = {} #instance name -> ID of the latest instance created for it
+
+        # Resuming keeps the completed steps, otherwise start over with an empty journal
+        if resume_flag:
+            for entry in load_journal_entries(filename):
+                self.add_completed(entry)
+            self.journal_file = open(filename, "a")
+        else:
+            self.journal_file = open(filename, "w")
+
+    # Appends the completed step and flushes it to disk
+    def record(self, instance_name, instance_id, step, container_name=None):
+        entry = {'time': time.time(), 'instance': instance_name, 'instance_id': instance_id, 'container': container_name, 'step': step}
+        with self.lock:
+            self.journal_file.write(json.dumps(entry) + "\n")
+            self.journal_file.flush()
+            self.add_completed(entry)
+
+    # Returns true if the step was already completed for the instance (in this deployment or the one being resumed)
+    def is_done(self, instance_id, step, container_name=None):
+        with self.lock:
+            return (instance_id, container_name, step) in self.completed
+
+    # Returns the ID of the latest instance created for the instance name (or None if there never was one)
+    def get_instance_id(self, instance_name):
+        with self.lock:
+            return self.created_instance_ids.get(instance_name)
+
+    # Returns {instance name: ID of the latest instance created for it} (a copy, for adopting them when resuming)
+    def get_created_instance_ids(self):
+        with self.lock:
+            return dict(self.created_instance_ids)
+
+    # Closes the journal file (once the deployment is done)
+    def close(self):
+        with self.lock:
+            self.journal_file.close()
+
+    # Adds a journal entry to the completed steps (caller holds the lock, or it's still being constructed)
+    def add_completed(self, entry):
+        self.completed.add((entry.get('instance_id'), entry.get('container'), entry.get('step')))
+        if entry.get('step') == 'created':
+            self.created_instance_ids[entry.get('instance')] = entry.get('instance_id')
+
+############################################# HELPERS #############################################
+
+# Returns the journal's entries in order (empty if there's no journal), skipping any line that isn't valid JSON
+def load_journal_entries(filename=JOURNAL_FILENAME):
+    entries = []
+    try:
+        with open(filename, "r") as journal_file:
+            for line in journal_file:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return entries
@@ -36,133 +36,240 @@
     - better error checking for CSV contents instead of assuming lots of things are good (general checking and validation checking with AWS)
     - eg. availability zone/region validation existence and accessibility, finding legal zone based off region, etc.
     - optimize order of things so long processes happen concurrently and we check success later, or with 'monitor.py' instead
-    - within the template>instance>container triple for loop, set a flag for ssh/sftp and docker install only happens first time
+
+    Startup: boto3/botocore and paramiko are only imported inside the functions that use them (marked 'deferred'),
+    so arguments are parsed (and '--plan' or a usage error answered) without loading them
 '''
 
 ############################################# IMPORTS #############################################
 
 # IMPORTS - 'pip install <import-package>'
-import boto3
-import csv
+from artifacts import sync_scripts
+import collections
+import concurrent.futures
+from console_waiter import USER_DATA_CONSOLE_MARKER, USER_DATA_STATUS_TAG, ConsoleWaiter
+import dataclasses
+from ec2_api import check_credentials, create_client, create_resource, get_api_metrics_table
+import errno
+import functools
+import json
+from golden_ami import create_golden_ami, find_golden_ami, install_script_hash, wait_for_image_snapshots
+from journal import JOURNAL_FILENAME, DeploymentJournal
+from manifest import DOCKER_INSTALL_SCRIPT_DICT, ManifestError, load_manifest, validate_bash_script
 import os
-import paramiko
+from planner import PriorityExecutor, build_deployment_plan, get_critical_path, get_plan_table, get_remaining_path_seconds, load_step_history, run_step_graph
+from port_waiter import PortWaiter
+import random
+import selectors
+import socket
 import sys
+from tables import format_columns
+import threading
 import time
+from tracing import TRACE_FILENAME, enable_tracing, export_chrome_trace, get_summary_table, record_span, span
 
 ############################################ CONSTANTS ############################################
 
-USAGE_STATEMENT = "Usage: py launch.py"
-CSV_TEMPLATE_FILENAME = "template.csv"
-CSV_INSTANCES_FILENAME = "instances.csv"
-CSV_CONTAINER_FILENAME = "container.csv"
-
-USER_DICT = {
-    "amazonlinux2": "ec2-user",
-    "amazonlinux": "ec2-user",
-    "centos": "centos",
-    "debian": "admin",
-    "fedora": "ec2-user",
-    "rhel": "ec2-user",
-    "suse": "ec2-user",
-    "ubuntu": "ubuntu",
-    "redhat": "ec2-user"
+USAGE_STATEMENT = "Usage: py launch.py <--workers N|optional,int> <--per-host N|optional,int> <--user-data|optional> <--golden-ami|optional> <--batched|optional> <--verify|optional> <--resume|optional> <--trace|optional> <--plan|optional>"
+
+# Optional launch arguments: option -> (launch_args key, kind, default)
+#   kind 'int' takes a positive integer value after the option, 'flag' takes no value
+LAUNCH_OPTIONS = {
+    "--workers": ("workers", "int", 10), #global limit of (instance, container) provisioning tasks running at once
+    "--per-host": ("per_host", "int", 1), #limit of provisioning tasks running at once on the same instance
+    "--user-data": ("user_data", "flag", False), #install Docker and start containers during boot (cloud-init user data) instead of over SSH
+    "--golden-ami": ("golden_ami", "flag", False), #launch from cached AMIs with Docker already installed (see 'golden_ami.py')
+    "--batched": ("batched", "flag", False), #run all of an instance's container steps as one remote script over a single channel
+    "--verify": ("verify", "flag", False), #also list 'docker images' and 'docker container ls -a' after each step, to show it worked
+    "--resume": ("resume", "flag", False), #adopt the instances of an interrupted deployment and skip steps its journal has as done
+    "--trace": ("trace", "flag", False), #time each phase, instance and remote command, then export them as a Chrome trace (see 'tracing.py')
+    "--plan": ("plan", "flag", False) #dry run: print the deployment plan and its estimated critical path, then stop (see 'planner.py')
 }
 
-DOCKER_INSTALL_SCRIPT_DICT = {
-    "amazonlinux2": "dockerInstall-amazonlinux2.sh",
-    "amazonlinux": "dockerInstall-amazonlinux.sh",
-    "ubuntu": "dockerInstall-ubuntu.sh",
-    "redhat": "dockerInstall-redhat.sh",
-    "suse": "dockerInstall-suse.sh"
-}
+# Instance states that a launched instance never gets to running from (without someone starting it again)
+FAILED_INSTANCE_STATES = ("shutting-down", "terminated", "stopping", "stopped")
+
+# Port that instances accept SSH connections on
+SSH_PORT = 22
+
+# Batched provisioning: each step of the remote script prints a marker line '<marker> <step name> <exit code> <start> <end>'
+BATCH_STEP_MARKER = "ONECLICK_STEP"
+
+# Remote command output is printed line by line as it arrives (prefixed by instance name), only its last lines are kept for error reports
+REMOTE_OUTPUT_TAIL_LINES = 50
+REMOTE_OUTPUT_READ_BYTES = 32768
+REMOTE_OUTPUT_MAX_LINE_BYTES = REMOTE_OUTPUT_READ_BYTES #a partial line is flushed past this, so memory stays bounded without newlines
+REMOTE_OUTPUT_POLL_SECONDS = 0.05
+
+# User data provisioning: step exit codes are appended to the steps file, which is renamed to the marker file once every step ran,
+# then written to the console as the user data console marker line (see 'console_waiter.py')
+USER_DATA_DIR = "/var/lib/oneclick"
+USER_DATA_STEPS_FILE = f"{USER_DATA_DIR}/steps"
+USER_DATA_MARKER_FILE = f"{USER_DATA_DIR}/provisioned"
+USER_DATA_MAX_BYTES = 16384 #AWS EC2 limit (before base64 encoding)
+
+# Pre-flight verification cache: successful verifications (by region and resource IDs) are trusted for the TTL
+VERIFICATION_CACHE_FILENAME = ".verification_cache.json"
+VERIFICATION_CACHE_TTL_SECONDS = 3600
+
+# Instances are looked up (when resuming) with at most this many values per filter (EC2 caps the values of a filter)
+FILTER_VALUES_LIMIT = 200
+
+# InstanceName tags go out concurrently (paced by the CreateTags rate limit, see 'ec2_api.py'), with at most this many calls at once
+TAG_WORKERS = 20
+
+# Golden AMIs are snapshotted from a running instance, so make sure the Docker daemon also comes up when they boot
+GOLDEN_AMI_ENABLE_DOCKER_COMMAND = "sudo systemctl enable docker || sudo chkconfig docker on"
+# ...and that they're not tied to this instance: its authorized SSH keys (the user's and root's, copied to tmpfs so they stay out of
+# the image) are emptied, cloud-init's instance state is cleaned (so it sets up instances launched from the image as new ones),
+# and the disk is synced, then the keys are put back once the image's snapshots have started
+GOLDEN_AMI_KEYS_BACKUP = "/dev/shm/oneclick_authorized_keys"
+GOLDEN_AMI_CLEAN_COMMAND = f"cp ~/.ssh/authorized_keys {GOLDEN_AMI_KEYS_BACKUP} && : > ~/.ssh/authorized_keys" \
+    f" && sudo sh -c 'if [ -s /root/.ssh/authorized_keys ]; then cp /root/.ssh/authorized_keys {GOLDEN_AMI_KEYS_BACKUP}.root && : > /root/.ssh/authorized_keys; fi'" \
+    " && sudo cloud-init clean && sync"
+GOLDEN_AMI_RESTORE_KEYS_COMMAND = f"if [ -f {GOLDEN_AMI_KEYS_BACKUP} ]; then cat {GOLDEN_AMI_KEYS_BACKUP} > ~/.ssh/authorized_keys && rm -f {GOLDEN_AMI_KEYS_BACKUP}; fi" \
+    f" && sudo sh -c 'if [ -f {GOLDEN_AMI_KEYS_BACKUP}.root ]; then cat {GOLDEN_AMI_KEYS_BACKUP}.root > /root/.ssh/authorized_keys && rm -f {GOLDEN_AMI_KEYS_BACKUP}.root; fi'"
 
 ############################## STATE VARIABLES, INITIALIZATION, MAIN ##############################
 
+# Output of concurrent provisioning workers (see log())
+print_lock = threading.Lock()
+output_local = threading.local()
+
+# Private SSH keys parsed once per PEM file (see load_private_key())
+private_key_cache = {}
+private_key_lock = threading.Lock()
+
+# Guards golden_ami_claims, so only one instance per (base AMI, install script hash) gets snapshotted
+golden_ami_lock = threading.Lock()
+
+
 def main():
     #globals
-    global template_csv_content
-    global instances_csv_content
-    global container_csv_content
     global ec2_client
     global ec2_resource
-    global template_user_keyword
-    global instance_user_keyword
-    global template_user_list
-    global instance_user_list
+    global root_device_names
+    global launch_args
+    global golden_amis
+    global golden_ami_claims
+    global journal
 
-    template_csv_content = []
-    instances_csv_content = []
-    container_csv_content = []
-    template_user_keyword = []
-    instance_user_keyword = []
-    template_user_list = []
-    instance_user_list = []
+    root_device_names = {}
+    golden_amis = {}
+    golden_ami_claims = set()
 
-    # NOTE: no args
+    # ========== ARGUMENTS ==========
+    launch_args = parse_launch_args(sys.argv)
+    if launch_args["trace"]:
+        enable_tracing()
 
     # ---------- Validating local files ----------
     try:
-        validate_and_load_local_files()
+        with span("validate-local-files"):
+            manifest = validate_and_load_local_files()
         print("")
     except Exception as e:
         sys.exit(f"[ERROR] While validating and loading local files: {e}")
 
+    # Step timings of the last '--trace' run (if any) estimate the deployment plan, which decides what goes first
+    step_history = load_step_history(TRACE_FILENAME)
+    if launch_args["plan"]:
+        print_deployment_plan(manifest, step_history)
+        return
+
     # ========== AWS EC2 ==========
-    ec2_client = boto3.client("ec2")
-    ec2_resource = boto3.resource("ec2")
+    # Every API call goes through the shared rate limiter (with retries of throttled calls, see 'ec2_api.py')
+    ec2_client = create_client()
+    ec2_resource = create_resource()
 
-    # Validate AWS EC2 credentials (by testing if 'describe_instances()' works)
+    # Validate AWS EC2 credentials (by a 'describe_instances()' dry run, or a recent one that passed, see 'ec2_api.py')
     try:
-        ec2_client.describe_instances()
+        with span("credentials-probe"):
+            check_credentials(ec2_client)
     except Exception as e:
         print("Error: Invalid or expired credentials (or insufficient permissions to call 'describe_instances()')")
         sys.exit(f"[ERROR] {e}")
 
     # ---------- Verifying CSV content in AWS ----------
     try:
-        verify_csv_content_in_aws()
+        with span("preflight-verification"):
+            verify_csv_content_in_aws(manifest)
         print("")
     except Exception as e:
         sys.exit(f"[ERROR] While validating content from CSV files in AWS EC2: {e}")
 
+    # ---------- Looking up golden AMIs ----------
+    if launch_args["golden_ami"]:
+        try:
+            with span("golden-ami-lookup"):
+                golden_amis = resolve_golden_amis(manifest)
+            print("")
+        except Exception as e:
+            sys.exit(f"[ERROR] While looking up golden AMIs: {e}")
+
+    # ---------- Deployment journal ----------
+    # Every completed step is journaled, so an interrupted deployment can be picked up again with '--resume'
+    journal = DeploymentJournal(JOURNAL_FILENAME, launch_args["resume"])
+    deploy_start_time = time.time()
+    adopted = []
+    #   (InstanceName tags are applied in the background, so waiting on the instances doesn't have to wait for every tag first)
+    tag_executor = concurrent.futures.ThreadPoolExecutor(max_workers=TAG_WORKERS, thread_name_prefix="tag-worker")
+    if launch_args["resume"]:
+        print(f"--Resuming from '{JOURNAL_FILENAME}', adopting existing instances...")
+        try:
+            with span("adopt-instances"):
+                adopted = adopt_existing_instances(manifest)
+        except Exception as e:
+            sys.exit(f"[ERROR] While adopting existing instances: {e}")
+        for inst, instance_spec in adopted:
+            if journal.get_instance_id(instance_spec.name) != inst.id:
+                journal.record(instance_spec.name, inst.id, 'created')
+            # Instances journaled as created may have been interrupted before they got their InstanceName tag
+            if get_tag_value(inst, 'InstanceName') != instance_spec.name:
+                print(f"-adopted {instance_spec.name} = {inst.id} (re-tagging InstanceName)")
+                tag_executor.submit(tag_instance_name, inst, instance_spec.name)
+            else:
+                print(f"-adopted {instance_spec.name} = {inst.id}")
+        print(f"...Adopted {len(adopted)} of {len(manifest.instances)} instance(s)--\n")
+
     # ---------- Creating Instances ----------
     print("--Creating instances...")
 
     # Create each instance from 'instances.csv'(using the related info about the template name from 'template.csv')
-    # where, each instance you make you need to wait until its running (and reload after its running before using it)
+    # where, each instance is handed to provisioning as soon as it is running and accepting SSH (see pipeline below)
+    #   (when resuming, only the ones that weren't adopted)
     
-    # Track all created instances
-    new_instances = []
+    # Track all created instances (and when the deployment started, for the stage timings summary)
+    adopted_names = {instance_spec.name for _, instance_spec in adopted}
+    #   (templates with the longest estimated path to a provisioned instance are created first, see 'planner.py')
+    plan_priorities = get_remaining_path_seconds(build_deployment_plan(manifest.instances, step_history))
+    remaining_specs = [instance_spec for instance_spec in manifest.instances if instance_spec.name not in adopted_names]
+    remaining_specs.sort(key=lambda instance_spec: -plan_priorities[f"create:{instance_spec.template.name}"])
+    remaining_manifest = dataclasses.replace(manifest, instances=tuple(remaining_specs))
+    launched = list(adopted)
     try:
-        new_instances = create_instances_from_template()
+        if remaining_manifest.instances:
+            launched.extend(create_instances_from_template(remaining_manifest, launch_args["user_data"], golden_amis, tag_executor))
     except Exception as e:
         sys.exit(f"[ERROR] While creating instances: {e}")
-    print("...Instance creation complete--\n")
+    created_time = time.time()
+    record_span("create-instances", deploy_start_time, created_time, count=len(launched) - len(adopted))
+    new_instances = [inst for inst, _ in launched]
+    print("...Instance creation complete (InstanceName tags are being applied meanwhile)--\n")
 
-    print(f"-respective users for each instance item: {instance_user_list}\n")
-
-    # Wait for all new instances to be running, then reload before printing logs
-    print("--Waiting for all new instance(s) to be running... please wait...")
-    print("-Template&InstanceName - StatusCode=StatusState : InstanceID ImageID, Public IP - DNS | InstanceType, SecurityGroup, KeyName")
-    try:
-        for inst in new_instances:
-            inst.wait_until_running()
-            inst.reload()
-            print(f"-{inst.tags[0]['Value']} {inst.tags[1]['Value']} - {inst.state['Code']}={inst.state['Name'].upper()} :", \
-                f"{inst.id} {inst.image_id}, {inst.public_ip_address} - {inst.public_dns_name} | {inst.instance_type}, {inst.security_groups[0]['GroupName']}, {inst.key_name}")
-    except Exception as e:
-        sys.exit(f"[ERROR] While waiting for instances: {e}")
-    print("...All new instance(s) are running--\n")
+    print(f"-respective users for each instance item: {[instance_spec.template.user for instance_spec in manifest.instances]}\n")
 
+    # ---------- Pipelined waiting + Containers + Docker images/container start scripts ----------
 
-    # ---------- Containers + Docker images/container start scripts ----------
+    # Each instance moves on to SSH/Docker provisioning on its own as soon as it is running and port 22 accepts connections,
+    # so fast-booting instances don't sit idle while slow ones boot (wall-clock is the slowest single instance path)
 
     # For each instance that was created because of a template, pull images and create containers based on start script
     #   location=Docker hub -> docker pull containerName
     #   location=Docker hub/repo -> docker pull repo/containerName
     # if start script present, ssh and run it (to start a container)
     #   --NOTE: ssh may fail even if instance is running, so try a few times with a timer in between before moving on
-    #           eg. don't spend more than 1min, try again after every 5 seconds
+    #           eg. probe port 22 first, then retry the handshake with jittered exponential backoff until a deadline
     # -- otherwise just pull the image only, then do docker run
 
     # Pull each image for all instances (using the container package name in 'instances.csv' and 'container.csv')
@@ -175,238 +282,45 @@ def main():
     #       Dockerfile/filenameLocation=build -t containerName -f ./filenameLocation)
     #   and ssh into the instance to run a startup script if present (otherwise just do docker run)
 
-    print("--Pulling images and starting containers on each instance... please wait...")
+    # Per-instance stage timings (see get_stage_timings_table())
+    stage_timings = {inst.id: {"start": deploy_start_time, "created": created_time} for inst in new_instances}
+
+    print("--Waiting for instance(s) to run, provisioning each one as soon as it is reachable... please wait...")
+    print("-Template&InstanceName - StatusCode=StatusState : InstanceID ImageID, Public IP - DNS | InstanceType, SecurityGroup, KeyName")
     try:
-        # Instances Format: template name, instance name, ssh key pair name (w/o .pem), container pack name
-        # Container Format: container pack name, container, location, start script
-        inst_list_index = 0 #track instances (template name matches instance template name)
-        for template_row in template_csv_content:
-            for instance_row in instances_csv_content:
-                # Skip if  the template names of template and instance don't match
-                if template_row[0] != instance_row[0]:
-                    continue
-                for container_row in container_csv_content:
-                    # Check for matching container package names
-                    if instance_row[3] == container_row[0]:
-                        # Log container pack name matches with instance name and other container info
-                        print(f"\n--match = {instance_row[1]}: '{container_row[0]}' - {container_row[1]}, {container_row[2]}, {container_row[3]}")
-                        new_instances[inst_list_index].reload() #reload instance just in case
-
-                        # Attempt retry SSH connection until it connects (or 10 failures occur so we skip)
-                        ssh_client = paramiko.SSHClient()
-                        ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-                        ssh_connection = ssh_connect_with_retry(
-                            ssh_client,
-                            instance_user_list[inst_list_index],
-                            new_instances[inst_list_index].public_ip_address,
-                            f"{instance_row[2]}.pem"
-                        )
-
-                        # Run commands on the instance if SSH succeeds, otherwise do nothing (already gave err msg w/ retries)
-                        if ssh_connection:
-                            sftp_client_open_flag = False
-                            # Determine Docker image location
-                            location_command = determine_location_command(container_row)
-                            repo_container_name = determine_location_command(container_row, False)
-                            print(f"-->command=sudo {location_command}")
-                        
-                            try:
-                                # Determine related Docker install script using user template keyword (and validate file, but manually check string exists)
-                                docker_install_script = DOCKER_INSTALL_SCRIPT_DICT[instance_user_keyword[inst_list_index]]
-                                print(f"~opening SFTP and uploading '{docker_install_script}'...")
-                                if not is_valid_bash_script(docker_install_script) or docker_install_script == None or docker_install_script == "":
-                                    print(f"Error: Skipping due to invalid docker install script detection - {docker_install_script}")
-                                    continue #skip if invalid bash script
-
-                                # Open SFTP for SSH, put update+Docker install script onto instance, then run it (and tag instance with successful key-value pair: DockerInstalled, True),
-                                sftp_client = ssh_client.open_sftp()
-                                sftp_client_open_flag = True
-                                sftp_client.sshclient = ssh_client #keep copy here for safety measure
-
-                                sftp_client.put(docker_install_script, docker_install_script)
-
-                                print(f"~executing 'sudo sh ./{docker_install_script}'... please wait...")
-                                stdin, stdout, stderr = ssh_client.exec_command(f"sudo sh ./{docker_install_script}")
-                                stdout.channel.recv_exit_status()
-
-                                new_instances[inst_list_index].create_tags(
-                                    Tags = [
-                                        {
-                                            'Key': 'DockerInstalled',
-                                            'Value': 'True'
-                                        }
-                                    ]
-                                )
-
-                                # Then check 'docker images' to show it worked
-                                print(f"~verifying Docker installation success via 'sudo docker images'")
-                                stdin, stdout, stderr = ssh_client.exec_command("sudo docker images")
-                                stdout.channel.recv_exit_status()
-                                ssh_cmd_stdout_stderr_print("docker images", stdout.read().decode('UTF-8'), stderr.read().decode('UTF-8'))
-
-                                # Create Docker image,
-                                print(f"~executing 'sudo {location_command}'... please wait...")
-                                stdin, stdout, stderr = ssh_client.exec_command(f"sudo {location_command}")
-                                stdout.channel.recv_exit_status()
-
-                                # Then check 'docker images' to show it worked
-                                print(f"~verifying image success via 'sudo docker images'")
-                                stdin, stdout, stderr = ssh_client.exec_command("sudo docker images")
-                                stdout.channel.recv_exit_status()
-                                ssh_cmd_stdout_stderr_print("docker images", stdout.read().decode('UTF-8'), stderr.read().decode('UTF-8'))
-                                
-                                # Run start script (if present), otherwise do 'docker run',
-                                if container_row[3] != None and container_row[3] != "":
-                                    # NOTE: already validated start scripts as locally existing bash scripts during CSV load
-                                    print(f"~start script present, uploading '{container_row[3]}' using open SFTP...")
-                                    sftp_client.put(container_row[3], container_row[3])
-
-                                    print(f"~start script present, executing 'sudo sh ./{container_row[3]}'... please wait...")
-                                    stdin, stdout, stderr = ssh_client.exec_command(f"sudo sh ./{container_row[3]}")
-                                    stdout.channel.recv_exit_status()
-                                    ssh_cmd_stdout_stderr_print("start script", stdout.read().decode('UTF-8'), stderr.read().decode('UTF-8'))
-
-                                else:
-                                    print(f"~executing 'sudo docker run {repo_container_name}'")
-                                    stdin, stdout, stderr = ssh_client.exec_command(f"sudo docker run {repo_container_name}")
-                                    stdout.channel.recv_exit_status()
-                                    ssh_cmd_stdout_stderr_print("docker run", stdout.read().decode('UTF-8'), stderr.read().decode('UTF-8'))
-
-                                # Then check 'docker images' and 'docker containers' to show it worked
-                                # NOTE: maybe don't show these and leave it to 'monitor.py' to prove ?
-                                print(f"~verifying container creation success via 'sudo docker images' and 'sudo docker container ls -a'")
-                                stdin, stdout, stderr = ssh_client.exec_command("sudo docker images")
-                                stdout.channel.recv_exit_status()
-                                ssh_cmd_stdout_stderr_print("docker images", stdout.read().decode('UTF-8'), stderr.read().decode('UTF-8'))
-                                
-                                stdin, stdout, stderr = ssh_client.exec_command("sudo docker container ls -a")
-                                stdout.channel.recv_exit_status()
-                                ssh_cmd_stdout_stderr_print("docker containers", stdout.read().decode('UTF-8'), stderr.read().decode('UTF-8'))
-
-                            except Exception as e:
-                                print(f"Error: Failure to SSH, SFTP, and/or run commands on {new_instances[inst_list_index].public_ip_address}: {e}")
-                            finally:
-                                if sftp_client_open_flag:
-                                    sftp_client.close()
-                                ssh_client.close()
-                # Accumulate instance tracker
-                inst_list_index += 1
+        failed_instance_ids = wait_and_provision_fleet(launched, stage_timings, step_history=step_history)
     except Exception as e:
-        sys.exit(f"[ERROR] While pulling images and creating containers: {e}")
-    print("...All container(s) are most likely running ...please run 'py monitor.py' for more details--")
+        sys.exit(f"[ERROR] While waiting for instances, pulling images and creating containers: {e}")
+    finally:
+        journal.close()
+        tag_executor.shutdown(wait=True)
+    if failed_instance_ids:
+        print(f"\n-{len(failed_instance_ids)} instance(s) failed to run: {sorted(failed_instance_ids)}")
+    print("...All container(s) are most likely running ...please run 'py monitor.py' for more details--\n")
+
+    # Per-instance stage timings, then overall wall-clock
+    print(get_stage_timings_table(launched, stage_timings))
+    print(f"-Total deployment wall-clock time: {time.time() - deploy_start_time:.1f}s")
+
+    # API calls per action, with the throttles hit and time spent waiting on the rate limiter
+    print(f"\n{get_api_metrics_table()}")
+
+    # Trace of every phase, instance and remote command (waiting to run is measured by the fleet waiter, so added from the stage timings)
+    if launch_args["trace"]:
+        record_span("wait-and-provision", created_time, time.time())
+        for inst, instance_spec in launched:
+            if "running" in stage_timings[inst.id]:
+                record_span("wait-running", stage_timings[inst.id]["created"], stage_timings[inst.id]["running"], instance=instance_spec.name)
+        export_chrome_trace(TRACE_FILENAME)
+        print(f"\n{get_summary_table()}")
+        print(f"-Chrome trace written to '{TRACE_FILENAME}' (open in chrome://tracing or https://ui.perfetto.dev)")
 
 ############################################ FUNCTIONS ############################################
 
-# Returns true if all CSV filenames exist locally and are valid, false otherwise
-def validate_csv_files():
-    valid_flag = True
-    invalid_csv_list = []
-    # Check if each CSV file exists locally, if it meets filename requirements
-    # Each CSV filename must be at least 5 chars long and have a '.csv' extension
-    if len(CSV_TEMPLATE_FILENAME) > 4 and CSV_TEMPLATE_FILENAME.endswith(".csv"):
-        if not os.path.isfile(CSV_TEMPLATE_FILENAME):
-            valid_flag = False
-            invalid_csv_list.append(CSV_TEMPLATE_FILENAME)
-            print(f"Error: Invalid CSV file name '{CSV_TEMPLATE_FILENAME}' - file does not exist.")
-    else:
-        valid_flag = False
-        invalid_csv_list.append(CSV_TEMPLATE_FILENAME)
-        print(f"Error: Invalid CSV file name '{CSV_TEMPLATE_FILENAME}' - filename must end with '.csv'.")
-    
-    if len(CSV_INSTANCES_FILENAME) > 4 and CSV_INSTANCES_FILENAME.endswith(".csv"):
-        if not os.path.isfile(CSV_INSTANCES_FILENAME):
-            valid_flag = False
-            invalid_csv_list.append(CSV_INSTANCES_FILENAME)
-            print(f"Error: Invalid CSV file name '{CSV_INSTANCES_FILENAME}' - file does not exist.")
-    else:
-        valid_flag = False
-        invalid_csv_list.append(CSV_INSTANCES_FILENAME)
-        print(f"Error: Invalid CSV file name '{CSV_INSTANCES_FILENAME}' - filename must end with '.csv'.")
-
-    if len(CSV_CONTAINER_FILENAME) > 4 and CSV_CONTAINER_FILENAME.endswith(".csv"):
-        if not os.path.isfile(CSV_CONTAINER_FILENAME):
-            valid_flag = False
-            invalid_csv_list.append(CSV_CONTAINER_FILENAME)
-            print(f"Error: Invalid CSV file name '{CSV_CONTAINER_FILENAME}' - file does not exist.")
-    else:
-        valid_flag = False
-        invalid_csv_list.append(CSV_CONTAINER_FILENAME)
-        print(f"Error: Invalid CSV file name '{CSV_CONTAINER_FILENAME}' - filename must end with '.csv'.")
-    
-    # Output all invalid CSV filenames before leaving
-    if not valid_flag:
-        print(f"ERROR: Invalid CSV file names were detected - {invalid_csv_list}")
-    
-    return valid_flag
-
-# Loads CSV and returns the 2D array of its contents
-def load_csv_file(csv_filename):
-    # Open the CSV file and read its contents, skipping header column row
-    with open(csv_filename, "r", newline='') as csv_file:
-        csv_content = list(csv.reader(csv_file, delimiter=','))
-        csv_content.pop(0)
-    csv_file.close()
-
-    return csv_content
-
-# Checks that all ssh key pair name exists locally, and is valid after trimming ".pem" extension (must not contain '.')
-# Returns true if all pem key names exist locally and are valid, false otherwise
-# NOTE: fixes permissions of PEM files to 'chmod 600'
-def validate_and_trim_ssh_pem_local():
-    # Bring in globals to modify
-    global instances_csv_content
-
-    valid_flag = True
-    invalid_keys = []
-    for row in instances_csv_content:
-        # Must be at least 5 chars long and have a '.pem' extension
-        if len(row[2]) > 4 and row[2].endswith(".pem"):
-            # Check if it exists locally, then remove '.pem' extension
-            if not os.path.isfile(row[2]):
-                valid_flag = False
-                invalid_keys.append(row[2])
-                print(f"Error: Invalid ssh key pair name '{row[2]}' - file does not exist locally.")
-            os.system(f"chmod 600 {row[2]}") #perms for PEM file
-            row[2] = row[2][0:len(row[2])-4] #modifies global here
-        else:
-            valid_flag = False
-            invalid_keys.append(row[2])
-            print(f"Error: Invalid ssh key pair name '{row[2]}' - filename must end with '.pem'.")
-    
-    # Output all invalid ssh key pem filenames before leaving
-    if not valid_flag:
-        print(f"ERROR: Invalid ssh key pair names were detected - {invalid_keys}")
-
-    return valid_flag
-
-# Returns true if all start scripts exist locally, false otherwise
-# Note: the start script is optional and can be empty in the CSV row
-# NOTE: fixes permissions of SH files to 'chmod +x'
-def validate_start_scripts():
-    valid_flag = True
-    invalid_scripts = []
-    # Check that each start script is a valid bash script, track invalid ones
-    for row in container_csv_content:
-        if not is_valid_bash_script(row[3]):
-            valid_flag = False
-            invalid_scripts.append(row[3])
-    
-    # Output all invalid start scripts before leaving
-    if not valid_flag:
-        print(f"ERROR: Invalid start script names were detected - {invalid_scripts}")
-    return valid_flag
-        
-
-# Returns true if all AMI image IDs in the template CSV exist
-def verify_amis_exist():
-    # Get list of AMIs from template
-    template_ami_list = []
-    unique_image_ids = 0
-    for row in template_csv_content:
-        # Track #of unique image IDs in the template AMI list
-        if row[1] not in template_ami_list:
-            unique_image_ids += 1
-            template_ami_list.append(row[1])
+# Returns true if all the (unique) AMI image IDs exist
+# NOTE: also fills the root device name cache from the same response (see determine_block_device_mappings())
+def verify_amis_exist(template_ami_list):
+    unique_image_ids = len(template_ami_list)
 
     # Get all public AMIs, filtering by the unique image IDs being verified
     images = ec2_client.describe_images(
@@ -419,20 +333,16 @@ def verify_amis_exist():
         ]
     )['Images']
 
+    for image in images:
+        root_device_names[image['ImageId']] = image.get('RootDeviceName')
+
     # Check if an AMI image exists for every unique image ID given
     print(f"-{len(images)} AMI image IDs were found for {unique_image_ids} unique")
     return len(images) == unique_image_ids
 
-# Returns true if all security group names in the template CSV exist
-def verify_sec_groups_exist():
-    # Get list of sec group names from template
-    template_sec_group_names = []
-    unique_names = 0
-    for row in template_csv_content:
-        # Track #of unique names of the template security groups
-        if row[4] not in template_sec_group_names:
-            unique_names += 1
-            template_sec_group_names.append(row[4])
+# Returns true if all the (unique) security group names exist
+def verify_sec_groups_exist(template_sec_group_names):
+    unique_names = len(template_sec_group_names)
 
     # Get security groups, filtering by the unique security group names being verified
     sec_groups = ec2_client.describe_security_groups(
@@ -448,17 +358,9 @@ def verify_sec_groups_exist():
     print(f"-{len(sec_groups)} security group names were found for {unique_names} unique")
     return len(sec_groups) == unique_names
 
-# Returns true if all ssh key pair name (w/o '.pem') exists on AWS EC2
-# NOTE: used after validate_and_trim_ssh_pem_local()
-def verify_public_ssh_pem():
-    # Get list of ssh key '.pem' files w/o extension
-    ssh_pem_list = []
-    unique_keys = 0
-    for row in instances_csv_content:
-        # Track #of unique names of the template security groups
-        if row[2] not in ssh_pem_list:
-            unique_keys += 1
-            ssh_pem_list.append(row[2])
+# Returns true if all the (unique) ssh key pair names (w/o '.pem') exist on AWS EC2
+def verify_public_ssh_pem(ssh_pem_list):
+    unique_keys = len(ssh_pem_list)
 
     # Get key pairs from AWS EC2, filtering by the unique ssh key '.pem' names being verified
     key_pairs = ec2_client.describe_key_pairs(
@@ -475,174 +377,841 @@ def verify_public_ssh_pem():
     return len(key_pairs) == unique_keys
 
 
-# Returns the BlockDeviceMappings structure of a create_instances() request based on the given 'default' or numerical root size of the template
-def determine_block_device_mappings(template_row):
+# Returns the BlockDeviceMappings structure of a create_instances() request based on the template's 'default' (None) or numerical root size
+#   image_id is the AMI actually being launched (defaults to the template's, but may be a golden AMI)
+# NOTE: root device names are cached per AMI image ID, so each image is only looked up once
+def determine_block_device_mappings(template, image_id=None):
+    image_id = image_id or template.image_id
     block_device_mappings = []
-    if template_row[3].lower() != "default":
+    if template.root_volume_size is not None:
+        if image_id not in root_device_names:
+            root_device_names[image_id] = ec2_resource.Image(image_id).root_device_name
         block_device_mappings = [
             {
-                'DeviceName': f"{ec2_resource.Image(template_row[1]).root_device_name}",
+                'DeviceName': f"{root_device_names[image_id]}",
                 'Ebs': {
                     'DeleteOnTermination': True,
-                    'VolumeSize': int(template_row[3]),
+                    'VolumeSize': template.root_volume_size,
                 }
             },
         ]
     return block_device_mappings
 
-# Returns an availability zone if what's given is an availability region
-def determine_availability_zone(availability):
-    # Check the last letter of the availability: letter=zone, digit=region so get a zone (via adding 'a' on the end)
-    if availability[-1].isalpha():
-        return availability
-    elif availability[-1].isdigit():
-        return f"{availability}a"
-    else:
-        sys.exit(f"ERROR: Terminating program - invalid availability zone/region detected: '{availability}'")
-
-# Returns the command used to get the image from docker specified location or file
-# where you pull based on the location or build an image from a docker file
-#   (we can assume the filenameLocation is provided explicitly with relative path from the local dir of the python script,
-#   or it is implicit because it uses name 'Dockerfile' and they only provide directory location of it)
-#   (Docker hub=pull containerName
-#   Docker hub/repo=pull repo/containerName
-#   Dockerfile=build -t containerName . -f .
-#   Dockerfile/filenameLocation=build -t containerName . -f ./filenameLocation)
-# NOTE: Dockerfile version not supported right now, would also need to check if said file exists
-# NOTE: if command set to False, returns the repo/containerName only instead of full docker pull repo/containerName
-def determine_location_command(container_row, command=True):
-    first_slash_index = 10
-    # Get everything after '/', as long as '/' and something else exists after (default to nothing), terminate if nothing
-    split_location = container_row[2].split('/')
-    if container_row[2] == None or container_row[2] == "" or len(split_location) < 1:
-        sys.exit(f"ERROR: Terminating program - invalid docker image location detected for '{container_row[1]}': '{container_row[2]}'")
-    else:
-        extra_command = ""
-        if len(split_location) > 1 and split_location[1] != None and split_location[1] != "":
-            first_slash_index = container_row[2].find('/')
-            extra_command = container_row[2][first_slash_index+1:] + '/'
-
-    # Check for pull image vs build image from dockerfile
-    if "docker hub" == container_row[2][:first_slash_index].lower():
-        if command:
-            return f"docker pull {extra_command}{container_row[1]}"
+# SSH readiness: probes port 22 without blocking first, then attempts the full SSH handshake, retrying with exponential
+# backoff (full jitter, capped at max_backoff) until it connects or the overall deadline passes
+#   Needs paramiko ssh client, user & public IP address, PEM (parsed once per file, see load_private_key())
+# NOTE: sometimes fails to SSH into a running instance right after creation (sshd not up or keys not installed yet), so retry
+#       - a loop (not recursion), so any number of concurrent workers can retry without growing their stacks
+def ssh_connect_when_ready(ssh_client, user, ip_address, pem_file, deadline_seconds=120, initial_backoff=0.5, max_backoff=8):
+    private_key = load_private_key(pem_file)
+    deadline = time.time() + deadline_seconds
+    backoff = initial_backoff
+    attempts = 0
+    while True:
+        # Only do the (much slower) handshake once something is listening on the SSH port
+        if probe_tcp_port(ip_address, SSH_PORT, timeout=min(1, max(deadline - time.time(), 0.1))):
+            attempts += 1
+            try:
+                log(f"-Attempting to SSH into the instance: {ip_address}")
+                with span("ssh-handshake", host=ip_address, attempt=attempts):
+                    ssh_client.connect(hostname=ip_address, port=SSH_PORT, username=user, pkey=private_key, timeout=10, banner_timeout=10, allow_agent=False, look_for_keys=False)
+                return True
+            except Exception as e:
+                log(f"-SSH exception: {e}")
+
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            log(f"-SSH connection to {ip_address} not ready after {deadline_seconds}s ({attempts} handshake attempts), skipping failure")
+            return False
+        time.sleep(min(random.uniform(0, backoff), remaining))
+        backoff = min(backoff * 2, max_backoff)
+
+# Provisions a single running instance once port 22 is open (or its wait timed out, see wait_and_provision_fleet()): hands its SSH connect,
+# script sync + Docker install (at most once) and each container's pull and start script / run to the provisioning engine as steps
+# of the deployment plan sharing one SSH session, with at most 'per_host' container steps running on it at once
+#   provision_executor runs the steps (see 'planner.PriorityExecutor'), highest step_priorities first (step ID -> priority),
+#   so every SSH handshake, install and container step counts against the global worker limit ('--workers')
+#   Records the 'provisioned' time into the given stage timings dict
+# NOTE: the instance's logs (and its tasks' captured output) are printed together once it finishes (so hosts don't interleave)
+def provision_instance(inst, instance_spec, timings, port_open_flag, provision_executor, step_priorities):
+    # Without a public IP there's nothing to connect to, so it's reported as not provisioned (no 'provisioned' time)
+    if not inst.public_ip_address:
+        log(f"Error: {instance_spec.name} ({inst.id}) has no public IP address, so it can't be provisioned over SSH, skipping it")
+        return
+    host_lines = [f"\n--Provisioning log for {instance_spec.name} ({inst.id}, {inst.public_ip_address}):"]
+    output_local.buffer = host_lines
+    provision_start_time = time.time()
+    try:
+        if not port_open_flag:
+            log(f"-Port 22 on {inst.public_ip_address} still closed, trying SSH anyway")
+        log(f"--match = {instance_spec.name}: '{instance_spec.container_package}' - {[container.name for container in instance_spec.containers]}")
+        provision_over_ssh(inst, instance_spec, provision_executor, step_priorities, host_lines)
+    finally:
+        timings["provisioned"] = time.time()
+        record_span("provision-instance", provision_start_time, timings["provisioned"], instance=instance_spec.name)
+        output_local.buffer = None
+        with print_lock:
+            print("\n".join(host_lines))
+
+# Connects to the instance and runs its provisioning steps on the engine over that one SSH session (see provision_instance())
+def provision_over_ssh(inst, instance_spec, provision_executor, step_priorities, host_lines):
+    # Attempt SSH connection until it connects (or the readiness deadline passes so we skip), once for the whole instance
+    import paramiko #deferred (see file header)
+    ssh_client = paramiko.SSHClient()
+    ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    connected_flag = run_on_engine(provision_executor, step_priorities.get(f"connect:{instance_spec.name}", 0.0),
+        connect_instance, ssh_client, inst, instance_spec)
+    if not connected_flag:
+        return
+
+    try:
+        # Containers already provisioned on this instance (according to the journal) are skipped when resuming
+        containers = [container for container in instance_spec.containers if not journal.is_done(inst.id, 'container-provisioned', container.name)]
+        if len(containers) < len(instance_spec.containers):
+            log(f"~skipping {len(instance_spec.containers) - len(containers)} container(s) already provisioned (journal)")
+
+        # Sync the scripts and install Docker (if needed)
+        docker_installed_flag = run_on_engine(provision_executor, step_priorities.get(f"install-docker:{instance_spec.name}", 0.0),
+            prepare_instance, inst, instance_spec, ssh_client, containers)
+        if not docker_installed_flag:
+            return
+
+        # Batched: every container step goes out as one remote script over a single channel (per-host limit doesn't apply)
+        #   Containers with the longest estimated path go first (see 'planner.py'), and the script runs at the priority of the first
+        if launch_args["batched"] and containers:
+            containers.sort(key=lambda container: -step_priorities.get(f"pull:{instance_spec.name}/{container.name}", 0.0))
+            run_on_engine(provision_executor, step_priorities.get(f"pull:{instance_spec.name}/{containers[0].name}", 0.0),
+                run_batched_containers, inst, instance_spec, ssh_client, containers)
+
+        elif containers:
+            # Each container's pull and start script / run are plan steps (a run only waits on its own pull), submitted critical path
+            # first with at most 'per_host' of them running on this instance at once (see 'planner.py')
+            containers_by_name = {container.name: container for container in containers}
+            host_steps = [step for step in build_deployment_plan([instance_spec]).values() if step.container in containers_by_name]
+            finished_steps = run_step_graph(
+                host_steps,
+                lambda step: run_with_captured_output(run_container_step, step, inst, instance_spec, containers_by_name[step.container], ssh_client),
+                provision_executor.submit,
+                launch_args["per_host"],
+                step_priorities,
+                is_success=lambda result: result[0]
+            )
+            for step, result in finished_steps:
+                if result == None:
+                    log(f"-skipping {step.step_id}, its pull failed")
+                else:
+                    host_lines.extend(result[1])
+
+        # The instance is done once every container of its package is (a failed one gets retried on resume)
+        if all(journal.is_done(inst.id, 'container-provisioned', container.name) for container in instance_spec.containers):
+            journal.record(instance_spec.name, inst.id, 'provisioned')
+
+    except Exception as e:
+        log(f"Error: Failure to SSH, sync scripts, and/or run commands on {inst.public_ip_address}: {e}")
+    finally:
+        ssh_client.close()
+
+# Provisioning engine task for an instance's connect step: connects the SSH client to the instance once it's ready
+# Returns true if it connected
+def connect_instance(ssh_client, inst, instance_spec):
+    with span("ssh-connect", instance=instance_spec.name):
+        return ssh_connect_when_ready(ssh_client, instance_spec.template.user, inst.public_ip_address, instance_spec.pem_file)
+
+# Provisioning engine task for an instance's install-docker step: checks for Docker first, then puts every script the instance
+# needs on it in one go (only sending content it doesn't already have, see 'artifacts.py'), installs Docker at most once,
+# and snapshots the instance into a golden AMI if it's the first of its pair (with '--golden-ami')
+# Returns true if Docker is installed (or already was)
+# NOTE: errors are reported and the step failed, so the instance's container steps are skipped (and it's retried on resume)
+def prepare_instance(inst, instance_spec, ssh_client, containers):
+    try:
+        # The Docker install script (only if Docker isn't there yet, so it's never sent for nothing) and each distinct start script
+        # NOTE: already validated start scripts as locally existing bash scripts during CSV load
+        docker_install_script = None
+        if not find_installed_docker(inst, ssh_client):
+            # Determine related Docker install script using user template keyword (and validate file, but manually check string exists)
+            docker_install_script = DOCKER_INSTALL_SCRIPT_DICT.get(instance_spec.template.user_keyword)
+            if docker_install_script == None or docker_install_script == "" or not is_valid_bash_script(docker_install_script):
+                log(f"Error: Skipping due to invalid docker install script detection - {docker_install_script}")
+                return False #skip if invalid bash script
+        scripts = ([docker_install_script] if docker_install_script else []) + [container.start_script for container in containers if container.start_script]
+        if scripts:
+            scripts = list(dict.fromkeys(scripts))
+            log(f"~syncing scripts {scripts} by content hash...")
+            with span("sync-scripts", instance=instance_spec.name):
+                sent_scripts = sync_scripts(ssh_client, scripts)
+            log(f"-sent {len(sent_scripts)} script(s) in one archive, {len(scripts) - len(sent_scripts)} already on the instance")
+
+        # Install Docker (if needed)
+        with span("docker-install", instance=instance_spec.name):
+            docker_installed_flag = install_docker_once(inst, ssh_client, docker_install_script, instance_spec.name)
+        if not docker_installed_flag:
+            return False
+        if not journal.is_done(inst.id, 'docker-installed'):
+            journal.record(instance_spec.name, inst.id, 'docker-installed')
+        if launch_args["golden_ami"]:
+            snapshot_golden_ami_once(inst, ssh_client, instance_spec.template)
+        return True
+
+    except Exception as e:
+        log(f"Error: Failure to sync scripts and/or install Docker on {inst.public_ip_address}: {e}")
+        return False
+
+# Provisioning engine task for batched provisioning: runs every container step of the instance as one remote script (in the given order),
+# reporting each step, and journals each container whose pull and start script / run both succeeded
+# NOTE: errors are reported, and the containers that weren't journaled get retried on resume
+def run_batched_containers(inst, instance_spec, ssh_client, containers):
+    try:
+        log(f"~executing the provisioning script for '{instance_spec.container_package}' in one go... please wait...")
+        script_start_time = time.time()
+        with span("provision-script", instance=instance_spec.name):
+            steps = run_provision_script(ssh_client, build_provision_script(containers, launch_args["verify"]), instance_spec.name)
+        log_provision_steps(steps)
+
+        # Each step as its own span by step type (eg. 'pull-nginx' -> 'pull'), placed by its remote start relative to the first step
+        for step in steps:
+            step_type, _, container_name = step['name'].partition("-")
+            step_start_time = script_start_time + step['started'] - steps[0]['started']
+            record_span(step_type, step_start_time, step_start_time + step['seconds'], instance=instance_spec.name, container=container_name)
+
+        # A container is provisioned once both its pull and its start script / run step succeeded
+        step_exit_codes = {step['name']: step['exit_code'] for step in steps}
+        for container in containers:
+            run_step = f"start-{container.name}" if container.start_script != None else f"run-{container.name}"
+            if step_exit_codes.get(f"pull-{container.name}") == 0 and step_exit_codes.get(run_step) == 0:
+                journal.record(instance_spec.name, inst.id, 'container-provisioned', container.name)
+
+    except Exception as e:
+        log(f"Error: Failure to run the provisioning script on {inst.public_ip_address}: {e}")
+
+# Returns true if Docker is already on the instance (ie. it's tagged 'DockerInstalled=True' or 'docker --version' succeeds)
+def find_installed_docker(inst, ssh_client):
+    if get_tag_value(inst, 'DockerInstalled') == 'True':
+        log(f"~Docker already installed (tagged 'DockerInstalled=True'), skipping install")
+        return True
+
+    stdin, stdout, stderr = ssh_client.exec_command("docker --version")
+    if stdout.channel.recv_exit_status() == 0:
+        log(f"~Docker already installed ({stdout.read().decode('UTF-8').strip()}), skipping install")
+        return True
+    return False
+
+# Installs Docker on the instance over the open SSH session with the (already synced) install script, or with None
+# when Docker is already there (see find_installed_docker()), then tags it with 'DockerInstalled=True' if it isn't yet
+# Returns true if Docker is installed (or already was), false if the install script failed
+def install_docker_once(inst, ssh_client, docker_install_script, instance_name):
+    if docker_install_script != None:
+        # Run update+Docker install script
+        log(f"~executing 'sudo sh ./{docker_install_script}'... please wait...")
+        install_exit_status, output_tail = run_remote_command(ssh_client, f"sudo sh ./{docker_install_script}", instance_name)
+        if install_exit_status != 0:
+            log(f"Error: Docker install script failed (exit code {install_exit_status})")
+            log_remote_output_tail(docker_install_script, output_tail)
+            return False
+    elif get_tag_value(inst, 'DockerInstalled') == 'True':
+        return True
+
+    # Tag instance with successful key-value pair: DockerInstalled, True
+    inst.create_tags(
+        Tags = [
+            {
+                'Key': 'DockerInstalled',
+                'Value': 'True'
+            }
+        ]
+    )
+
+    # Then check 'docker images' to show it worked
+    if docker_install_script != None and launch_args["verify"]:
+        log(f"~verifying Docker installation success via 'sudo docker images'")
+        run_remote_command(ssh_client, "sudo docker images", instance_name)
+    return True
+
+# Looks up the golden AMI cache entry of each template (that has a Docker install script) by its (base AMI, install script hash),
+# returns template name -> {'base_ami', 'install_script', 'install_hash', 'image_id'} where image_id is None on a cache miss
+def resolve_golden_amis(manifest):
+    print("--Looking up golden AMIs (base AMI + Docker install script)...")
+    resolved_golden_amis = {}
+    cached_image_ids = {} #(base AMI, install script hash) -> golden image ID or None, so each pair is only looked up once
+    for template in manifest.templates.values():
+        docker_install_script = DOCKER_INSTALL_SCRIPT_DICT.get(template.user_keyword)
+        if docker_install_script == None or not is_valid_bash_script(docker_install_script):
+            print(f"-'{template.name}': no Docker install script, not cached")
+            continue
+        install_hash = install_script_hash(docker_install_script)
+        cache_key = (template.image_id, install_hash)
+        if cache_key not in cached_image_ids:
+            cached_image_ids[cache_key] = find_golden_ami(ec2_client, template.image_id, install_hash)
+        resolved_golden_amis[template.name] = {
+            'base_ami': template.image_id,
+            'install_script': docker_install_script,
+            'install_hash': install_hash,
+            'image_id': cached_image_ids[cache_key]
+        }
+        if cached_image_ids[cache_key] != None:
+            print(f"-'{template.name}': cache hit, launching from {cached_image_ids[cache_key]} (skips Docker install)")
         else:
-            return f"{extra_command}{container_row[1]}"
-    elif "dockerfile" == container_row[2][:first_slash_index].lower():
-        sys.exit(f"ERROR: Terminating program - feature for dockerfile location not supported - invalid docker image location detected for '{container_row[1]}': '{container_row[2]}'")
-        return f"docker build -t {container_row[1]} -f ./{extra_command}"
-    else:
-        sys.exit(f"ERROR: Terminating program - invalid docker image location detected for '{container_row[1]}': '{container_row[2]}'")
-
-# Recursive SSH retry logic that gives up after designated number of retries
-#   Needs paramiko ssh client, user & public IP address, PEM, #of current retries (interval and limit default to 5,10 respectively)
-# NOTE: sometimes fails to SSH into a running instance right after creation, so retry a few times
-def ssh_connect_with_retry(ssh_client, user, ip_address, pem_file, retries=0, retry_interval=5, retry_limit=10):
-    # Base case to stop when limit is exceeded
-    if retries > retry_limit:
-        print(f"-SSH connection failed to {ip_address} {retry_limit} times, skipping failure")
+            print(f"-'{template.name}': cache miss, first instance will be snapshotted after Docker is installed")
+    print("...Golden AMI lookup complete--")
+    return resolved_golden_amis
+
+# Snapshots the instance into a golden AMI right after Docker was installed on it (before any containers),
+# unless its template launched from a golden AMI already or another instance already claimed its (base AMI, install script hash)
+#   The instance is cleaned up for imaging first (see GOLDEN_AMI_CLEAN_COMMAND), and its SSH keys are put back once the image's
+#   snapshots have started (the open SSH session keeps working meanwhile), an image whose snapshots don't start is deregistered
+# NOTE: a failed snapshot is only reported, since the deployment itself doesn't depend on it
+#       (if this instance ever reboots, cloud-init sets it up again as a new instance, with the same key pair)
+def snapshot_golden_ami_once(inst, ssh_client, template):
+    golden_ami = golden_amis.get(template.name)
+    if golden_ami == None or golden_ami['image_id'] != None:
+        return
+    cache_key = (golden_ami['base_ami'], golden_ami['install_hash'])
+    with golden_ami_lock:
+        if cache_key in golden_ami_claims:
+            return
+        golden_ami_claims.add(cache_key)
+
+    try:
+        log(f"~enabling Docker at boot and cleaning up SSH keys + cloud-init state, then snapshotting {inst.id} into a golden AMI for {golden_ami['base_ami']} + '{golden_ami['install_script']}'")
+        if not run_golden_ami_command(ssh_client, GOLDEN_AMI_ENABLE_DOCKER_COMMAND, "enable Docker at boot"):
+            return
+        try:
+            if not run_golden_ami_command(ssh_client, GOLDEN_AMI_CLEAN_COMMAND, "clean up SSH keys and cloud-init state"):
+                return
+            image_id = create_golden_ami(ec2_client, inst.id, golden_ami['base_ami'], golden_ami['install_script'], golden_ami['install_hash'])
+            if not wait_for_image_snapshots(ec2_client, image_id):
+                ec2_client.deregister_image(ImageId=image_id)
+                log(f"Error: Snapshots of golden AMI {image_id} didn't start in time, deregistered it")
+                return
+            log(f"-golden AMI {image_id} is being created (usable by later launches once available)")
+        finally:
+            run_golden_ami_command(ssh_client, GOLDEN_AMI_RESTORE_KEYS_COMMAND, "restore SSH keys")
+    except Exception as e:
+        log(f"Error: Failed to create golden AMI from {inst.id}: {e}")
+
+# Runs one of the golden AMI commands over SSH, returns true if it succeeded (otherwise reports it could not 'descr')
+def run_golden_ami_command(ssh_client, command, descr):
+    stdin, stdout, stderr = ssh_client.exec_command(command)
+    if stdout.channel.recv_exit_status() != 0:
+        log(f"Error: Could not {descr} for the golden AMI: {stderr.read().decode('UTF-8').strip()}")
         return False
-    
-    # Get the private SSH key PEM, then try to connect using SSH client
-    private_key = paramiko.RSAKey.from_private_key_file(pem_file)
+    return True
+
+# Provisioning engine task for one plan step (see 'planner.py') of an (instance, container) pair over the instance's shared SSH session
+# Returns true if the step succeeded
+def run_container_step(step, inst, instance_spec, container, ssh_client):
+    if step.step_type == 'pull':
+        return pull_container_image(instance_spec, container, ssh_client)
+    return run_container(inst, instance_spec, container, ssh_client)
+
+# Pulls the container's image, returns true if it succeeded
+# NOTE: errors are reported and the step failed so the rest can still be provisioned (and it's retried on resume)
+def pull_container_image(instance_spec, container, ssh_client):
+    # Log container pack name matches with instance name and other container info
+    log(f"\n--match = {instance_spec.name}: '{container.package}' - {container.name}, {container.location}, {str_return_empty_for_none(container.start_script)}")
+
+    # Docker image location was already resolved when loading the manifest
+    location_command = container.pull_command
+    log(f"-->command=sudo {location_command}")
+
     try:
-        # Accumulate #of connection attempts
-        retries += 1
-        print(f"-Attempting to SSH into the instance: {ip_address}")
-        ssh_client.connect(hostname=ip_address, username=user, pkey=private_key)
+        # Create Docker image,
+        log(f"~executing 'sudo {location_command}'... please wait...")
+        with span("pull", instance=instance_spec.name, container=container.name):
+            pull_exit_status, output_tail = run_remote_command(ssh_client, f"sudo {location_command}", instance_spec.name)
+        if pull_exit_status != 0:
+            log(f"Error: {container.name} image not pulled (exit code {pull_exit_status})")
+            log_remote_output_tail("docker pull", output_tail)
+            return False
+
+        # Then check 'docker images' to show it worked
+        if launch_args["verify"]:
+            log(f"~verifying image success via 'sudo docker images'")
+            run_remote_command(ssh_client, "sudo docker images", instance_spec.name)
         return True
+
     except Exception as e:
-        # Output exception, sleep for a bit, then retry 
-        print(f"-SSH exception: {e}")
-        time.sleep(retry_interval)
-        print(f"-Retrying SSH connection {retries} to {ip_address}")
-        return ssh_connect_with_retry(ssh_client, user, ip_address, pem_file, retries, retry_interval, retry_limit)
+        log(f"Error: Failure to run commands on {instance_spec.name}: {e}")
+        return False
+
+# Runs the (already uploaded) start script, or 'docker run' if there isn't one, once the container's image is pulled
+# Returns true (and journals the container as provisioned) if it succeeded
+# NOTE: errors are reported and the step failed so the rest can still be provisioned (and it's retried on resume)
+def run_container(inst, instance_spec, container, ssh_client):
+    try:
+        # Run start script (if present), otherwise do 'docker run',
+        if container.start_script != None:
+            log(f"\n~{container.name}: start script present, executing 'sudo sh ./{container.start_script}'... please wait...")
+            with span("start", instance=instance_spec.name, container=container.name):
+                run_exit_status, output_tail = run_remote_command(ssh_client, f"sudo sh ./{container.start_script}", instance_spec.name)
+            if run_exit_status != 0:
+                log_remote_output_tail("start script", output_tail)
+
+        else:
+            log(f"\n~{container.name}: executing 'sudo docker run {container.image}'")
+            with span("run", instance=instance_spec.name, container=container.name):
+                run_exit_status, output_tail = run_remote_command(ssh_client, f"sudo docker run {container.image}", instance_spec.name)
+            if run_exit_status != 0:
+                log_remote_output_tail("docker run", output_tail)
+
+        # Then check 'docker images' and 'docker containers' to show it worked (only with '--verify', otherwise left to 'monitor.py')
+        if launch_args["verify"]:
+            log(f"~verifying container creation success via 'sudo docker images' and 'sudo docker container ls -a'")
+            run_remote_command(ssh_client, "sudo docker images", instance_spec.name)
+            run_remote_command(ssh_client, "sudo docker container ls -a", instance_spec.name)
+
+        # Journal the container as provisioned only if the start script / run succeeded (the pull did, or this wouldn't run)
+        if run_exit_status != 0:
+            log(f"Error: {container.name} not provisioned (start/run exit code {run_exit_status})")
+            return False
+        journal.record(instance_spec.name, inst.id, 'container-provisioned', container.name)
+        return True
+
+    except Exception as e:
+        log(f"Error: Failure to run commands on {inst.public_ip_address}: {e}")
+        return False
+
+# Returns the remote script (run as root via 'sudo bash -s') that pulls and starts each of the given containers in order,
+# with each step wrapped so it prints a BATCH_STEP_MARKER line with its exit code and start/end times afterwards
+#   verify_flag adds the 'docker images' / 'docker container ls -a' listings as steps too
+# NOTE: start scripts must already be uploaded to the SSH user's home dir (the script's working dir)
+def build_provision_script(containers, verify_flag=False):
+    lines = [
+        "#!/bin/bash",
+        f"step() {{ name=\"$1\"; shift; start=$(date +%s.%N); \"$@\" 2>&1; code=$?; echo; echo \"{BATCH_STEP_MARKER} $name $code $start $(date +%s.%N)\"; }}"
+    ]
+    for container in containers:
+        lines.append(f"step pull-{container.name} {container.pull_command}")
+        if verify_flag:
+            lines.append(f"step images-{container.name} docker images")
+        if container.start_script != None:
+            lines.append(f"step start-{container.name} sh ./{container.start_script}")
+        else:
+            lines.append(f"step run-{container.name} docker run {container.image}")
+        if verify_flag:
+            lines.append(f"step containers-{container.name} docker container ls -a")
+    return "\n".join(lines) + "\n"
+
+# Runs the provisioning script over one SSH channel (stdout and stderr combined, so there's only one stream to drain),
+# streaming its output as it arrives (see stream_channel_output())
+# Returns the steps that ran, in order, as dicts: name, exit_code (int), started (float, remote clock), seconds (float),
+# output (str, the step's last REMOTE_OUTPUT_TAIL_LINES lines)
+def run_provision_script(ssh_client, script, instance_name):
+    stdin, stdout, stderr = ssh_client.exec_command("sudo bash -s")
+    stdout.channel.set_combine_stderr(True)
+    stdin.write(script)
+    stdin.channel.shutdown_write()
+
+    # Output lines belong to the step whose marker comes after them
+    steps = []
+    step_lines = collections.deque(maxlen=REMOTE_OUTPUT_TAIL_LINES)
+    def handle_marker_line(line):
+        if not line:
+            return True #blank lines are mostly the separators printed before each marker
+        before_marker, marker, step_record = line.partition(BATCH_STEP_MARKER)
+        if not marker:
+            step_lines.append(line)
+            return False
+        if before_marker:
+            step_lines.append(before_marker)
+        name, exit_code, start, end = step_record.split()
+        steps.append({
+            'name': name,
+            'exit_code': int(exit_code),
+            'started': float(start),
+            'seconds': float(end) - float(start),
+            'output': "\n".join(step_lines).strip()
+        })
+        step_lines.clear()
+        return True
+
+    stream_channel_output(stdout.channel, instance_name, handle_marker_line)
+    return steps
+
+# Logs each step's result and timing, with the tail of its output if it failed (all output was already streamed as it ran)
+def log_provision_steps(steps):
+    for step in steps:
+        if step['exit_code'] == 0:
+            log(f"-{step['name']}: OK ({step['seconds']:.1f}s)")
+        else:
+            log(f"-{step['name']}: FAILED (exit code {step['exit_code']}, {step['seconds']:.1f}s)")
+            if step['output']:
+                ssh_cmd_stdout_stderr_print(step['name'], step['output'], None)
+
+# Console waiter callback (see wait_and_provision_fleet()): reports the user data steps' exit codes read from the instance's console marker
+# (or its timeout if step_results is None), and tags the instance with 'UserDataStatus=OK/FAILED', plus 'DockerInstalled=True'
+# if the Docker install step succeeded (in one CreateTags call)
+#   There's no port to wait for, so the 'ssh_ready' time is when it was handed to the console waiter
+#   Records the 'provisioned' time into the given stage timings dict
+def report_user_data_provisioning(inst, instance_spec, timings, wait_start_time, step_results):
+    timings["ssh_ready"] = wait_start_time
+    host_lines = [f"\n--User data provisioning log for {instance_spec.name} ({inst.id}, {inst.public_ip_address}):"]
+    output_local.buffer = host_lines
+    try:
+        if step_results == None:
+            log(f"Error: User data provisioning of {inst.id} did not finish (no console output marker) before the console waiter timed out")
+            return
+        for step_name, exit_code in step_results.items():
+            log(f"-{step_name}: {'OK' if exit_code == '0' else f'FAILED (exit code {exit_code})'}")
+        provisioned_flag = all(exit_code == "0" for exit_code in step_results.values())
+        if provisioned_flag:
+            journal.record(instance_spec.name, inst.id, 'provisioned')
+
+        tags = [
+            {
+                'Key': USER_DATA_STATUS_TAG,
+                'Value': "OK" if provisioned_flag else "FAILED"
+            }
+        ]
+        if step_results.get("install-docker") == "0":
+            tags.append({'Key': 'DockerInstalled', 'Value': 'True'})
+        try:
+            inst.create_tags(Tags=tags)
+        except Exception as e:
+            log(f"Error: Failure to tag {inst.id} with its user data provisioning status: {e}")
+    finally:
+        timings["provisioned"] = time.time()
+        record_span("await-user-data", wait_start_time, timings["provisioned"], instance=instance_spec.name)
+        output_local.buffer = None
+        with print_lock:
+            print("\n".join(host_lines))
+
+# Pipelined waiting + provisioning of the launched (instance, instance spec) pairs: each instance goes to the port waiter as soon as
+# the fleet waiter sees it running, then to provisioning as soon as port 22 accepts connections
+#   With user data, each running instance goes to the console waiter instead, then to reporting its boot-time provisioning
+#   as soon as its console output has the user data marker (read through the EC2 API, so no SSH session is opened)
+#   Records each instance's 'running' time (and the provisioning stages) into its stage timings, returns the IDs that failed to run
+def wait_and_provision_fleet(launched, stage_timings, poll_interval=5, step_history=None):
+    # Look up each instance's spec (with its template and containers) by its ID
+    instance_specs = {inst.id: instance_spec for inst, instance_spec in launched}
+    new_instances = [inst for inst, _ in launched]
+    failed_instance_ids = set()
+    provision_futures = []
+
+    # Every step's priority is its estimated time to the end of the deployment (see 'planner.py')
+    step_priorities = get_remaining_path_seconds(build_deployment_plan([instance_spec for _, instance_spec in launched], step_history))
+
+    # One port waiter thread for every instance's port 22 (see 'port_waiter.py'), then '--workers' pipeline threads that each
+    # keep one instance's SSH session open (so at most that many are open at once), with all of the SSH work (connect, script sync,
+    # Docker install, container steps) bounded by the provisioning engine's global worker limit (highest priority step first)
+    # and the per-host limit inside provision_instance
+    #   (critical path first would connect every instance before installing on any if sessions weren't limited, leaving most idle)
+    # With user data, one console waiter thread polls every instance's console output instead (see 'console_waiter.py')
+    provision_executor = PriorityExecutor(launch_args["workers"])
+    provision_func = functools.partial(provision_instance, provision_executor=provision_executor, step_priorities=step_priorities)
+    with provision_executor, concurrent.futures.ThreadPoolExecutor(max_workers=launch_args["workers"], thread_name_prefix="pipeline") as executor:
+        with (ConsoleWaiter(ec2_client) if launch_args["user_data"] else PortWaiter()) as waiter:
+            for inst, running_flag in wait_until_fleet_running(new_instances, poll_interval):
+                stage_timings[inst.id]["running"] = time.time()
+                if not running_flag:
+                    failed_instance_ids.add(inst.id)
+                    log(f"Error: {instance_specs[inst.id].name} ({inst.id}) entered '{inst.state['Name']}' instead of running, skipping it")
+                    continue
+                log(f"-{instance_specs[inst.id].template.name} {instance_specs[inst.id].name} - {inst.state['Code']}={inst.state['Name'].upper()} : " \
+                    f"{inst.id} {inst.image_id}, {inst.public_ip_address} - {inst.public_dns_name} | {inst.instance_type}, {inst.security_groups[0]['GroupName']}, {inst.key_name}")
+                if journal.is_done(inst.id, 'provisioned'):
+                    stage_timings[inst.id]["ssh_ready"] = stage_timings[inst.id]["provisioned"] = time.time()
+                    log(f"~{instance_specs[inst.id].name} already provisioned (journal), skipping")
+                    continue
+
+                # With user data, hand the instance to the console waiter, which hands its step results to reporting once they're in
+                if launch_args["user_data"]:
+                    report = functools.partial(report_user_data_provisioning, inst, instance_specs[inst.id], stage_timings[inst.id], time.time())
+                    waiter.add(inst.id, functools.partial(submit_to_pipeline, executor, provision_futures, report))
+                    continue
+
+                # Hand the instance to the port waiter, which hands it to provisioning once port 22 is open
+                # (without a public IP there's nothing to wait for, so provisioning reports it right away)
+                hand_over = functools.partial(hand_over_to_pipeline, executor, provision_futures, provision_func, inst, instance_specs[inst.id], stage_timings[inst.id], time.time())
+                if inst.public_ip_address:
+                    waiter.add(inst.public_ip_address, SSH_PORT, hand_over)
+                else:
+                    hand_over(False)
+
+        # Surface any unexpected provisioning failure (per-container errors are already reported and skipped)
+        for future in concurrent.futures.as_completed(provision_futures):
+            future.result()
+    return failed_instance_ids
+
+# Port waiter callback (see wait_and_provision_fleet()): records the instance's 'ssh_ready' time and port wait, then submits it to its pipeline
+def hand_over_to_pipeline(executor, provision_futures, provision_func, inst, instance_spec, timings, wait_start_time, port_open_flag):
+    timings["ssh_ready"] = time.time()
+    record_span("wait-ssh-port", wait_start_time, timings["ssh_ready"], instance=instance_spec.name)
+    provision_futures.append(executor.submit(provision_func, inst, instance_spec, timings, port_open_flag))
+
+# Console waiter callback (see wait_and_provision_fleet()): submits the instance's report with its step results to the pipeline
+def submit_to_pipeline(executor, provision_futures, report, step_results):
+    provision_futures.append(executor.submit(report, step_results))
+
+# Returns true if a TCP connection to the port can be opened within the timeout (non-blocking connect, then wait for writable)
+#   A missing or malformed address is reported as not open (false)
+# NOTE: waits with a selector (poll/epoll where available) rather than select(), which can't take file descriptors past 1023
+#       and a large fleet's open SSH sessions easily go past that
+def probe_tcp_port(ip_address, port, timeout=1):
+    probe_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        probe_socket.setblocking(False)
+        result = probe_socket.connect_ex((ip_address, port))
+        if result == 0:
+            return True
+        if result not in (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN):
+            return False
+        with selectors.DefaultSelector() as selector:
+            selector.register(probe_socket, selectors.EVENT_WRITE)
+            writable = selector.select(timeout)
+        return bool(writable) and probe_socket.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0
+    except (OSError, TypeError, ValueError):
+        return False
+    finally:
+        probe_socket.close()
+
+# Returns the private SSH key of the PEM file, parsing each file only once (shared by all workers)
+def load_private_key(pem_file):
+    with private_key_lock:
+        if pem_file not in private_key_cache:
+            import paramiko #deferred (see file header)
+            private_key_cache[pem_file] = paramiko.RSAKey.from_private_key_file(pem_file)
+        return private_key_cache[pem_file]
+
+# Prints the deployment plan of the manifest (see 'planner.py'): every step with its estimate, and the estimated critical path
+def print_deployment_plan(manifest, step_history):
+    steps = build_deployment_plan(manifest.instances, step_history)
+    remaining_seconds = get_remaining_path_seconds(steps)
+    critical_path, critical_seconds = get_critical_path(steps, remaining_seconds)
+    if step_history:
+        print(f"--Deployment plan ({len(steps)} steps), estimated from the step timings in '{TRACE_FILENAME}':")
+    else:
+        print(f"--Deployment plan ({len(steps)} steps), estimated from default step timings (no '{TRACE_FILENAME}' yet, run once with '--trace'):")
+    print(get_plan_table(steps, remaining_seconds, critical_path))
+    print(f"\n--Estimated critical path: {critical_seconds:.1f}s (with enough workers)")
+    print(" -> ".join(critical_path))
+    print(f"-steps run longest estimated path first, with at most {launch_args['workers']} at once and {launch_args['per_host']} per instance")
+    print("...Dry run complete, nothing was launched--")
+
+# Returns the per-instance stage timings table of the (instance, instance spec) pairs (seconds spent in each stage, plus total)
+def get_stage_timings_table(launched, stage_timings):
+    # Stages (column header, start mark, end mark)
+    stages = [
+        ("CREATE", "start", "created"),
+        ("WAIT RUNNING", "created", "running"),
+        ("WAIT SSH", "running", "ssh_ready"),
+        ("PROVISION", "ssh_ready", "provisioned"),
+        ("TOTAL", "start", "provisioned")
+    ]
+    rows = [["INSTANCE NAME", "INSTANCE ID"] + [header for header, _, _ in stages]]
+    for inst, instance_spec in launched:
+        timings = stage_timings[inst.id]
+        row = [instance_spec.name, inst.id]
+        for _, start_mark, end_mark in stages:
+            if start_mark in timings and end_mark in timings:
+                row.append(f"{timings[end_mark] - timings[start_mark]:.1f}")
+            else:
+                row.append("-")
+        rows.append(row)
+
+    return "--Stage timings (seconds):\n" + format_columns(rows)
+
+# Fleet waiter that polls every pending instance in one 'describe_instances()' call per tick
+#   Yields (instance, True) as each one reaches running, or (instance, False) as soon as one lands in a failed state
+#   (shutting-down/terminated/stopping/stopped, see FAILED_INSTANCE_STATES),
+#   dropping it from the pending set either way; raises once the timeout passes with instances still pending
+# NOTE: fills each instance's attributes from the same response (so no per-instance reload is needed)
+def wait_until_fleet_running(instances, poll_interval=5, timeout=600):
+    from botocore.exceptions import ClientError #deferred (see file header)
+    pending = {inst.id: inst for inst in instances}
+    deadline = time.time() + timeout
+    while pending:
+        try:
+            with span("describe-instances", pending=len(pending)):
+                reservations = ec2_client.describe_instances(InstanceIds=list(pending))['Reservations']
+        except ClientError as e:
+            # Freshly launched IDs may not be visible to DescribeInstances yet, so just poll again next tick
+            if e.response['Error']['Code'] != "InvalidInstanceID.NotFound":
+                raise
+            reservations = []
+
+        for reservation in reservations:
+            for description in reservation['Instances']:
+                inst = pending.get(description['InstanceId'])
+                if inst is None:
+                    continue
+                state = description['State']['Name']
+                if state == "running" or state in FAILED_INSTANCE_STATES:
+                    # Same data a reload() would load, taken from this tick's response
+                    inst.meta.data = description
+                    del pending[inst.id]
+                    yield inst, state == "running"
+
+        if pending:
+            if time.time() >= deadline:
+                raise Exception(f"Timed out after {timeout}s waiting for instance(s) to run: {sorted(pending)}")
+            time.sleep(poll_interval)
 
 ############################################# HELPERS #############################################
 
 # Returns true if the filename is a bash script (or empty string), otherwise false
 # NOTE: fixes permissions of SH files to 'chmod +x'
 def is_valid_bash_script(filename):
-    valid_flag = True
-    # Must be at least 4 chars long and have a '.sh' extension
-    if filename != None and filename != "":
-        if len(filename) > 3 and filename.endswith(".sh"):
-            # Check that the file exists locally
-            if not os.path.isfile(filename):
-                valid_flag = False
-                print(f"Error: Invalid bash script '{filename}' - file does not exist locally.")
-            os.system(f"chmod +x {filename}") #perms for bash script file
-        else:
-            valid_flag = False
-            print(f"Error: Invalid bash script '{filename}' - filename must end with '.sh'.")
-    return valid_flag
+    problem = validate_bash_script(filename)
+    if problem:
+        log(problem)
+    return problem is None
+
+# Returns the optional launch arguments (see LAUNCH_OPTIONS) parsed from the command line, terminating with usage statement if any are bad
+def parse_launch_args(argv):
+    launch_args = {key: default for key, _, default in LAUNCH_OPTIONS.values()}
+    bad_usage_flag = False
+
+    # Check args
+    i = 1
+    while i < len(argv):
+        if argv[i] not in LAUNCH_OPTIONS:
+            bad_usage_flag = True
+            print(f"Error: Given argument '{argv[i]}' is invalid.")
+            i += 1
+            continue
+        key, kind, _ = LAUNCH_OPTIONS[argv[i]]
+        if kind == "flag":
+            launch_args[key] = True
+            i += 1
+        elif kind == "int":
+            if i+1 >= len(argv) or not argv[i+1].isdigit() or int(argv[i+1]) < 1:
+                bad_usage_flag = True
+                print(f"Error: Given '{argv[i]}' value must be a positive integer.")
+            else:
+                launch_args[key] = int(argv[i+1])
+            i += 2
+
+    # Exit with usage statement if flag has been triggered for any reason
+    if bad_usage_flag:
+        sys.exit(USAGE_STATEMENT)
+    return launch_args
+
+# Prints the message, unless the current thread is capturing its output (then it's kept for printing later as one block)
+def log(msg=""):
+    output_buffer = getattr(output_local, "buffer", None)
+    if output_buffer is None:
+        with print_lock:
+            print(msg)
+    else:
+        output_buffer.append(str(msg))
+
+# Runs func(*args) as a provisioning engine task at the given priority and waits for it (so it counts against the global worker limit),
+# then log()s its captured output on this thread, returns its result
+def run_on_engine(provision_executor, priority, func, *args):
+    result, captured_lines = provision_executor.submit(priority, run_with_captured_output, func, *args).result()
+    for line in captured_lines:
+        log(line)
+    return result
+
+# Runs the function with all of its log() output captured, returns (its result, the captured lines)
+def run_with_captured_output(func, *args):
+    output_local.buffer = []
+    try:
+        result = func(*args)
+    finally:
+        captured_lines = output_local.buffer
+        output_local.buffer = None
+    return result, captured_lines
+
+# Returns an empty string if string given is None
+def str_return_empty_for_none(str_check):
+    if str_check == None:
+        return ""
+    else:
+        return str(str_check)
+
+# Returns the value of the given tag key on an instance (or None if the tag isn't present)
+def get_tag_value(inst, key):
+    for tag in inst.tags or []:
+        if tag['Key'] == key:
+            return tag['Value']
+    return None
 
 # Prints the output (and errors if present) of a command on the SSH
 def ssh_cmd_stdout_stderr_print(descr, stdout, stderr):
-    print(f"->{descr} output=\n{stdout}")
+    log(f"->{descr} output=\n{stdout}")
     if stderr != None and stderr != "":
-        print(f"\n->{descr} errors=\n{stderr}")
-
-
-# Helper function that validates local files: CSV, PEM, SH; and loads CSV content if valid
+        log(f"\n->{descr} errors=\n{stderr}")
+
+# Runs the command over SSH and streams its output as it arrives (see stream_channel_output())
+# Returns (exit status, last REMOTE_OUTPUT_TAIL_LINES lines of output as (stderr flag, line) pairs)
+def run_remote_command(ssh_client, command, instance_name):
+    stdin, stdout, stderr = ssh_client.exec_command(command)
+    stdin.channel.shutdown_write()
+    return stream_channel_output(stdout.channel, instance_name)
+
+# Drains the channel's stdout and stderr together as data arrives (so neither pipe can fill up and stall the remote command
+# while the other one is being read), printing each complete line right away prefixed by the instance name
+#   (a line longer than REMOTE_OUTPUT_MAX_LINE_BYTES is printed in pieces, so buffered output stays bounded)
+#   line_handler(line), if given, sees each line first and returns true to consume it (ie. not printed nor kept)
+# Returns (exit status, last REMOTE_OUTPUT_TAIL_LINES lines of output as (stderr flag, line) pairs)
+def stream_channel_output(channel, instance_name, line_handler=None):
+    output_tail = collections.deque(maxlen=REMOTE_OUTPUT_TAIL_LINES)
+    partial_lines = {False: b"", True: b""} #stderr flag -> bytes received after the last newline
+    streams = ((False, channel.recv_ready, channel.recv), (True, channel.recv_stderr_ready, channel.recv_stderr))
+    while True:
+        received_flag = False
+        for stderr_flag, is_ready, receive in streams:
+            if not is_ready():
+                continue
+            received_flag = True
+            *lines, partial_lines[stderr_flag] = (partial_lines[stderr_flag] + receive(REMOTE_OUTPUT_READ_BYTES)).split(b"\n")
+            # Output without newlines (eg. '\r' progress bars, binary output) is flushed as a line once it's past the limit
+            if len(partial_lines[stderr_flag]) > REMOTE_OUTPUT_MAX_LINE_BYTES:
+                lines.append(partial_lines[stderr_flag])
+                partial_lines[stderr_flag] = b""
+            for line in lines:
+                handle_remote_line(line, stderr_flag, instance_name, output_tail, line_handler)
+
+        # The exit status arrives after all of the output, so once it's in and nothing is buffered the command is done
+        if not received_flag:
+            if channel.exit_status_ready() and not channel.recv_ready() and not channel.recv_stderr_ready():
+                break
+            time.sleep(REMOTE_OUTPUT_POLL_SECONDS)
+
+    for stderr_flag, line in partial_lines.items():
+        if line:
+            handle_remote_line(line, stderr_flag, instance_name, output_tail, line_handler)
+    return channel.recv_exit_status(), list(output_tail)
+
+# Decodes one line of remote output, then prints and keeps it (unless the line handler consumes it)
+def handle_remote_line(raw_line, stderr_flag, instance_name, output_tail, line_handler=None):
+    line = raw_line.decode('UTF-8', errors='replace').rstrip("\r")
+    if line_handler != None and line_handler(line):
+        return
+    output_tail.append((stderr_flag, line))
+    with print_lock:
+        print(f"[{instance_name}{' stderr' if stderr_flag else ''}] {line}")
+
+# Logs the kept output of a failed remote command (stdout and stderr separately, as ssh_cmd_stdout_stderr_print())
+def log_remote_output_tail(descr, output_tail):
+    if len(output_tail) == REMOTE_OUTPUT_TAIL_LINES:
+        descr = f"{descr} (last {REMOTE_OUTPUT_TAIL_LINES} lines)"
+    ssh_cmd_stdout_stderr_print(descr, "\n".join(line for stderr_flag, line in output_tail if not stderr_flag), "\n".join(line for stderr_flag, line in output_tail if stderr_flag))
+
+
+# Helper function that validates local files: CSV, PEM, SH; and returns the loaded deployment manifest if valid
+#   (CSV rows are parsed once into typed Template/InstanceSpec/ContainerSpec, see 'manifest.py')
 def validate_and_load_local_files():
-    # Bring in globals to modify
-    global template_csv_content
-    global instances_csv_content
-    global container_csv_content
-    global template_user_keyword
-    global template_user_list
-
-    # Loads and parses the 3 CSV files
-    print("--Validating and loading local CSV files...")
+    # Loads, parses and validates the 3 CSV files (and the PEM/SH files they reference)
+    print("--Validating and loading local CSV files (and local files referenced in CSVs)...")
     try:
-        # Check if each file exists before loading CSV contents, display err msg as appropriate
-        if validate_csv_files():
-            # Modifies globals for CSV content load from file
-            template_csv_content = load_csv_file(CSV_TEMPLATE_FILENAME)
-            instances_csv_content = load_csv_file(CSV_INSTANCES_FILENAME)
-            container_csv_content = load_csv_file(CSV_CONTAINER_FILENAME)
-
-            # Check if template names contain a keyword identifier
-            template_name_valid_flag = True
-            invalid_template_names = []
-            for row in template_csv_content:
-                # Determine user for the given template name (which was based on the AMI image ID)
-                match_found_flag = False
-                for key, value in USER_DICT.items():
-                    # Check if keyword is in template name
-                    if key in row[0].lower():
-                        # For the match, add the user value to the list (and store keyword), then stop looking because found match
-                        match_found_flag = True
-                        template_user_keyword.append(key)
-                        template_user_list.append(value)
-                        break
-                # Track bad template names
-                if not match_found_flag:
-                    template_name_valid_flag = False
-                    invalid_template_names.append(row[0])
-
-            # Output all invalid CSV filenames before leaving
-            if not template_name_valid_flag:
-                print(f"ERROR: Invalid template names were detected in '{CSV_TEMPLATE_FILENAME}' - {invalid_template_names}")
-                sys.exit("Error: Terminating program - not all given template names are valid.")
-        else:
-            sys.exit()
-    except Exception as e:
-        sys.exit(f"[ERROR] While loading deployment description files: {e}")
-    print("...Local CSV files validated and loaded successfully--")
-
-    # Display loaded CSV content from each file
-    for row in template_csv_content:
-        print(f"-template item: {row[0]}, {row[1]}, {row[2]}, {row[3]}, {row[4]}, {row[5]}")
-    #print(template_csv_content)
-    print(f"-respective users for each template item: {template_user_list}")
-    for row in instances_csv_content:
-        print(f"-instances item: {row[0]}, {row[1]}, {row[2]}, {row[3]}")
-    #print(instances_csv_content)
-    for row in container_csv_content:
-        print(f"-container item: {row[0]}, {row[1]}, {row[2]}, {row[3]}")
-    #print(container_csv_content)
+        manifest = load_manifest()
+    except ManifestError as e:
+        print(e)
+        sys.exit("Error: Terminating program - not all deployment description files and their contents are valid.")
+    print("...Local CSV files and local files referenced in CSVs validated and loaded successfully--")
+
+    # Display loaded manifest content
+    for template in manifest.templates.values():
+        print(f"-template item: {template.name}, {template.image_id}, {template.instance_type}, " \
+            f"{template.root_volume_size or 'default'}, {template.security_group}, {template.availability_zone}")
+    print(f"-respective users for each template item: {[template.user for template in manifest.templates.values()]}")
+    for instance_spec in manifest.instances:
+        print(f"-instances item: {instance_spec.template.name}, {instance_spec.name}, {instance_spec.pem_file}, {instance_spec.container_package}")
+    for package_containers in manifest.containers.values():
+        for container in package_containers:
+            print(f"-container item: {container.package}, {container.name}, {container.location}, {str_return_empty_for_none(container.start_script)}")
 
     ## Below covered by assumptions:
     ## Validate template name relates to at least 1 instance, and vice versa
@@ -650,105 +1219,282 @@ def validate_and_load_local_files():
     ## Validate instance template names are unique within template, and instance name unique within instances
     ## Maybe consider more validation for info from 'container.csv'
 
-    # Validate ssh key pair names exists and trim ".pem" extension (local dir) && that all start scripts exist on local dir
-    # Note: exit if any are invalid or do not exist
-    print("--Validating local files referenced in CSVs...")
-    if not validate_and_trim_ssh_pem_local() or not validate_start_scripts():
-        sys.exit()
-    print("...Local files referenced in CSVs validated successfully--")
+    return manifest
 
 # Helper function that verifies CSV content is valid in AWS EC2: AMIs, sec groups, key-pairs
-def verify_csv_content_in_aws():
-    # Verify AMIs exist
-    print("--Verifying AMI image IDs exist...")
+#   The 3 verifications run concurrently, and any whose (region, resource IDs) passed within the cache TTL is skipped entirely
+def verify_csv_content_in_aws(manifest):
+    # (description, cache kind, unique resource IDs, verify function, termination message) for each verification
+    verifications = [
+        ("AMI image IDs", "ami", list(dict.fromkeys(template.image_id for template in manifest.templates.values())), verify_amis_exist,
+            "not all given AMI Image IDs exist"),
+        ("security group names", "sec-group", list(dict.fromkeys(template.security_group for template in manifest.templates.values())), verify_sec_groups_exist,
+            "not all given security group names exist"),
+        ("ssh key-pair names", "key-pair", list(dict.fromkeys(instance_spec.key_name for instance_spec in manifest.instances)), verify_public_ssh_pem,
+            "not all given public ssh key-pair names exist on AWS EC2")
+    ]
+    region = ec2_client.meta.region_name
+    verification_cache = load_verification_cache()
+
+    # Skip what's cached (AMI entries also hold their root device names), verify the rest at the same time
+    print("--Verifying AMI image IDs, security group names, and public ssh key pair names exist on AWS EC2...")
+    futures = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(verifications)) as executor:
+        for descr, kind, resource_ids, verify_func, _ in verifications:
+            cache_entry = verification_cache.get(get_verification_cache_key(region, kind, resource_ids))
+            if cache_entry != None and time.time() - cache_entry['verified_at'] < VERIFICATION_CACHE_TTL_SECONDS:
+                root_device_names.update(cache_entry.get('root_device_names', {}))
+                print(f"-{descr} verified within the last {VERIFICATION_CACHE_TTL_SECONDS}s, skipping (cached)")
+            else:
+                futures[kind] = executor.submit(verify_func, resource_ids)
+
+    for descr, kind, resource_ids, _, termination_msg in verifications:
+        if kind not in futures:
+            continue
+        try:
+            verified_flag = futures[kind].result()
+        except Exception as e:
+            sys.exit(f"[ERROR] While verifying all {descr} exist: {e}")
+        if not verified_flag:
+            sys.exit(f"ERROR: Terminating program - {termination_msg}.")
+
+        cache_entry = {'verified_at': time.time()}
+        if kind == "ami":
+            cache_entry['root_device_names'] = {image_id: root_device_names.get(image_id) for image_id in resource_ids}
+        verification_cache[get_verification_cache_key(region, kind, resource_ids)] = cache_entry
+
+    if futures:
+        save_verification_cache(verification_cache)
+    print("...AMI image IDs, security group names, and public ssh key pair names verified successfully--")
+
+# Returns the verification cache key for a kind of resource IDs in a region (order of the IDs doesn't matter)
+def get_verification_cache_key(region, kind, resource_ids):
+    return f"{region}|{kind}|{','.join(sorted(resource_ids))}"
+
+# Returns the on-disk verification cache (empty if it doesn't exist or can't be read), without its expired entries
+def load_verification_cache():
     try:
-        if not verify_amis_exist():
-            sys.exit("ERROR: Terminating program - not all given AMI Image IDs exist.")
-    except Exception as e:
-        sys.exit(f"[ERROR] While verifying all AMI image IDs exist: {e}")
-    print("...AMI image IDs verified successfully--")
-
-    # Verify security group names exist
-    print("--Verifying security group names exist...")
+        with open(VERIFICATION_CACHE_FILENAME, "r") as cache_file:
+            verification_cache = json.load(cache_file)
+    except (OSError, ValueError):
+        return {}
+    return {key: entry for key, entry in verification_cache.items() if time.time() - entry.get('verified_at', 0) < VERIFICATION_CACHE_TTL_SECONDS}
+
+# Writes the verification cache to disk (a failure to write only costs the next launch its pre-flight API calls)
+def save_verification_cache(verification_cache):
     try:
-        if not verify_sec_groups_exist():
-            sys.exit("ERROR: Terminating program - not all given security group names exist.")
-    except Exception as e:
-        sys.exit(f"[ERROR] While verifying all security group names exist: {e}")
-    print("...Security group names verified successfully--")
-
-    # Verify ssh key pair (.pem) exists (on AWS EC2, note: exclude '.pem')
-    print("--Verifying public ssh key pair names exist on AWS EC2...")
+        temp_filename = f"{VERIFICATION_CACHE_FILENAME}.tmp"
+        with open(temp_filename, "w") as cache_file:
+            json.dump(verification_cache, cache_file)
+        os.replace(temp_filename, VERIFICATION_CACHE_FILENAME)
+    except OSError as e:
+        print(f"-could not write verification cache '{VERIFICATION_CACHE_FILENAME}': {e}")
+
+
+# Helper function that returns (instance, instance spec) pairs for the manifest's instances that already exist (pending/running),
+# ie. were created by the deployment being resumed: the instance IDs the journal has as created, then (for the rest) the instances
+# tagged with their InstanceName, as long as the TemplateName tag matches
+# NOTE: the journal's instance wins over tag matches, and covers instances that were interrupted before getting their InstanceName tag
+def adopt_existing_instances(manifest):
+    instance_specs_by_name = {instance_spec.name: instance_spec for instance_spec in manifest.instances}
+    adopted_instances = {}
+
+    # Instances journaled as created (right after their launch request, see launch_instance_groups())
+    journaled_names = {instance_id: instance_name for instance_name, instance_id in journal.get_created_instance_ids().items() if instance_name in instance_specs_by_name}
+    for inst in filter_live_instances('instance-id', list(journaled_names)):
+        instance_name = journaled_names[inst.id]
+        if get_tag_value(inst, 'TemplateName') == instance_specs_by_name[instance_name].template.name:
+            adopted_instances[instance_name] = inst
+
+    # Instances tagged with one of the remaining instance names (eg. the journal is missing entries)
+    remaining_names = [instance_name for instance_name in instance_specs_by_name if instance_name not in adopted_instances]
+    for inst in filter_live_instances('tag:InstanceName', remaining_names):
+        instance_name = get_tag_value(inst, 'InstanceName')
+        instance_spec = instance_specs_by_name.get(instance_name)
+        if instance_spec == None or instance_name in adopted_instances or get_tag_value(inst, 'TemplateName') != instance_spec.template.name:
+            continue
+        adopted_instances[instance_name] = inst
+    return [(adopted_instances[instance_spec.name], instance_spec) for instance_spec in manifest.instances if instance_spec.name in adopted_instances]
+
+# Returns the pending/running instances matching any of the values of the filter, with at most FILTER_VALUES_LIMIT values per request
+# NOTE: filtering by 'instance-id' (instead of InstanceIds) skips IDs that no longer exist instead of failing the whole request
+def filter_live_instances(filter_name, values):
+    instances = []
+    for start in range(0, len(values), FILTER_VALUES_LIMIT):
+        instances.extend(ec2_resource.instances.filter(
+            Filters=[
+                {
+                    'Name': filter_name,
+                    'Values': values[start:start+FILTER_VALUES_LIMIT]
+                },
+                {
+                    'Name': 'instance-state-name',
+                    'Values': ['pending', 'running']
+                }
+            ]
+        ))
+    return instances
+
+# Helper function that creates and returns a list of (instance, instance spec) pairs for tracking using the manifest
+#   Instance specs sharing a template and ssh key pair go out in one create_instances() request (MinCount=MaxCount=N),
+#   then each instance is mapped back to its spec via AmiLaunchIndex and given its InstanceName tag afterwards
+#   InstanceName tags are applied concurrently as each group is launched: in the background when given a tag executor
+#   (wait for it with its shutdown()), otherwise they're all applied before returning
+# NOTE: with user data, the container package is also part of the group since the whole request shares one user data script
+#   Templates with a cached golden AMI (see resolve_golden_amis()) launch from it instead, already tagged 'DockerInstalled=True'
+def create_instances_from_template(manifest, user_data_flag=False, golden_amis=None, tag_executor=None):
+    golden_image_ids = {template_name: golden_ami['image_id'] for template_name, golden_ami in (golden_amis or {}).items() if golden_ami['image_id'] != None}
+    launch_groups = {} #(template name, key pair name, container package or None) -> [instance spec, ...]
+    for instance_spec in manifest.instances:
+        # Log template name matches with image ID and instance name
+        print(f"--match '{instance_spec.template.name}': {instance_spec.template.image_id} - {instance_spec.name}")
+        group_key = (instance_spec.template.name, instance_spec.key_name, instance_spec.container_package if user_data_flag else None)
+        launch_groups.setdefault(group_key, []).append(instance_spec)
+
+    own_tag_executor_flag = tag_executor == None
+    if own_tag_executor_flag:
+        tag_executor = concurrent.futures.ThreadPoolExecutor(max_workers=TAG_WORKERS, thread_name_prefix="tag-worker")
     try:
-        if not verify_public_ssh_pem():
-            sys.exit("ERROR: Terminating program - not all given public ssh key-pair names exist on AWS EC2.")
-    except Exception as e:
-        sys.exit(f"[ERROR] While verifying all ssh key-pair names exist on AWS EC2: {e}")
-    print("...Public ssh key pair names verified successfully--")
-
-
-# Helper function that creates returns a list of instances for tracking using the info from template and instances CSVs
-def create_instances_from_template():
-    # Bring in globals to modify
-    global instance_user_keyword
-    global instance_user_list
-
-    new_instances = []
-    # Template Format: template name, ami image ID, instance type, root volume size (GiB), sec group name, (availability) zone
-    # Instance Format: template name, instance name, ssh key pair name (w/o .pem), container pack name
-    template_index = 0
-    for template_row in template_csv_content:
-        for instance_row in instances_csv_content:
-            # Check for matching template names
-            if template_row[0] == instance_row[0]:
-                # Log template name matches with image ID and instance name
-                print(f"--match '{template_row[0]}': {template_row[1]} - {instance_row[1]}")
-
-                # Track instance users and keywords
-                instance_user_keyword.append(template_user_keyword[template_index])
-                instance_user_list.append(template_user_list[template_index])
-
-                # Create an instance using instance info + template commmon info, and track it
-                #   -Determine BlockDeviceMappings via root volume size: do nothing if it says default, otherwise create proper structure for request
-                #   -Determine availability zone if an availability region was given
-                new_instances.append(ec2_resource.create_instances(
-                    BlockDeviceMappings=determine_block_device_mappings(template_row),
-                    ImageId=template_row[1],
-                    InstanceType=template_row[2],
-                    KeyName=instance_row[2],
-                    MaxCount=1,
-                    MinCount=1,
-                    Placement={
-                        'AvailabilityZone': determine_availability_zone(template_row[5])
+        launched = launch_instance_groups(launch_groups, user_data_flag, golden_image_ids, tag_executor)
+    finally:
+        if own_tag_executor_flag:
+            tag_executor.shutdown(wait=True)
+    return launched
+
+# Launches each group of instance specs in one create_instances() request (see create_instances_from_template()), journaling
+# each instance as created and submitting its InstanceName tag to the tag executor as soon as its group exists
+#   (journaled before tagging, so an interruption mid-tagging can still be resumed by instance ID)
+# Returns the list of (instance, instance spec) pairs
+def launch_instance_groups(launch_groups, user_data_flag, golden_image_ids, tag_executor):
+    launched = []
+    for (template_name, key_name, _), group_specs in launch_groups.items():
+        template = group_specs[0].template
+        image_id = golden_image_ids.get(template_name, template.image_id)
+        tags = [
+            {
+                'Key': 'TemplateName',
+                'Value': template_name
+            }
+        ]
+        if template_name in golden_image_ids:
+            tags.append({'Key': 'DockerInstalled', 'Value': 'True'})
+        if user_data_flag:
+            tags.append({'Key': USER_DATA_STATUS_TAG, 'Value': 'PENDING'})
+        # Create all instances of the group in one request (all-or-nothing so every spec gets an instance)
+        #   -Determine BlockDeviceMappings via root volume size: do nothing if it says default, otherwise create proper structure for request
+        #   -Availability zone was already resolved from the zone/region when loading the manifest
+        print(f"-launching {len(group_specs)} instance(s) of '{template_name}' with key pair '{key_name}' in one request...")
+        user_data_args = {'UserData': build_user_data(group_specs[0], template_name in golden_image_ids)} if user_data_flag else {}
+        with span("run-instances", template=template_name, count=len(group_specs)):
+            group_instances = ec2_resource.create_instances(
+                **user_data_args,
+                BlockDeviceMappings=determine_block_device_mappings(template, image_id),
+                ImageId=image_id,
+                InstanceType=template.instance_type,
+                KeyName=key_name,
+                MaxCount=len(group_specs),
+                MinCount=len(group_specs),
+                Placement={
+                    'AvailabilityZone': template.availability_zone
+                },
+                SecurityGroups=[
+                    template.security_group
+                ],
+                TagSpecifications=[
+                    {
+                        'ResourceType': 'instance',
+                        'Tags': tags
                     },
-                    SecurityGroups=[
-                        template_row[4]
-                    ],
-                    TagSpecifications=[
-                        {
-                            'ResourceType': 'instance',
-                            'Tags': [
-                                {
-                                    'Key': 'TemplateName',
-                                    'Value': template_row[0]
-                                },
-                                {
-                                    'Key': 'InstanceName',
-                                    'Value': instance_row[1]
-                                }
-                            ]
-                        },
-                    ]
-                )[0])
-        template_index += 1
-    return new_instances
+                ]
+            )
+
+        # AmiLaunchIndex is 0..N-1 within a single request, so it maps each instance back to its instance spec
+        group_launched = [(inst, group_specs[inst.ami_launch_index]) for inst in group_instances]
+        for inst, instance_spec in group_launched:
+            print(f"-{instance_spec.name} = {inst.id}")
+            journal.record(instance_spec.name, inst.id, 'created')
+
+        # Apply the per-instance InstanceName tags now that the whole group exists (while the next group launches)
+        for inst, instance_spec in group_launched:
+            tag_executor.submit(tag_instance_name, inst, instance_spec.name)
+        launched.extend(group_launched)
+
+    return launched
+
+# Returns the cloud-init user data script that provisions an instance during its first boot (as root):
+# installs Docker, then pulls each container's image and runs its start script (or 'docker run')
+#   Each step's '<name>=<exit code>' is appended to the steps file, which becomes the marker file once all steps ran,
+#   and its results are then written to the console on the marker line that 'launch.py' and 'monitor.py' read (see 'console_waiter.py')
+#   docker_installed_flag skips the Docker install (ie. launching from a golden AMI)
+# NOTE: scripts are embedded with quoted heredocs so nothing in them is expanded by this script
+def build_user_data(instance_spec, docker_installed_flag=False):
+    def embed_script(filename):
+        with open(filename, "r") as script_file:
+            return f"cat > {filename} << 'ONECLICK_SCRIPT_EOF'\n{script_file.read().rstrip()}\nONECLICK_SCRIPT_EOF"
+
+    # Determine related Docker install script using user template keyword (and validate file)
+    docker_install_script = DOCKER_INSTALL_SCRIPT_DICT.get(instance_spec.template.user_keyword)
+    if docker_install_script == None or not is_valid_bash_script(docker_install_script):
+        raise Exception(f"no valid docker install script for '{instance_spec.template.name}' to put in user data")
+
+    lines = [
+        "#!/bin/bash",
+        f"# One-click deployment user data: Docker + container package '{instance_spec.container_package}'",
+        f"mkdir -p {USER_DATA_DIR} && cd {USER_DATA_DIR}",
+        f"step() {{ name=\"$1\"; shift; \"$@\"; echo \"$name=$?\" >> {USER_DATA_STEPS_FILE}; }}"
+    ]
+    if not docker_installed_flag:
+        lines.append(embed_script(docker_install_script))
+        lines.append(f"step install-docker sh ./{docker_install_script}")
+    for container in instance_spec.containers:
+        lines.append(f"step pull-{container.name} {container.pull_command}")
+        if container.start_script != None:
+            lines.append(embed_script(container.start_script))
+            lines.append(f"step start-{container.name} sh ./{container.start_script}")
+        else:
+            lines.append(f"step run-{container.name} docker run {container.image}")
+    lines.append(f"mv {USER_DATA_STEPS_FILE} {USER_DATA_MARKER_FILE}")
+    lines.append(f"echo \"{USER_DATA_CONSOLE_MARKER} $(tr '\\n' ' ' < {USER_DATA_MARKER_FILE})\" > /dev/console")
+
+    user_data = "\n".join(lines) + "\n"
+    if len(user_data.encode('UTF-8')) > USER_DATA_MAX_BYTES:
+        raise Exception(f"user data for '{instance_spec.name}' is over the {USER_DATA_MAX_BYTES} byte limit")
+    return user_data
+
+# Tags the instance with its 'InstanceName' tag (CreateTags only applies one tag set per request, so it's one call per instance)
+# Returns true if it worked, a failure is only reported since deploying the instance doesn't depend on it
+# NOTE: freshly launched instance IDs can briefly be unknown to CreateTags, so retry a few times on 'InvalidInstanceID.NotFound'
+def tag_instance_name(inst, instance_name, retry_interval=1, retry_limit=5):
+    from botocore.exceptions import ClientError #deferred (see file header)
+    try:
+        with span("tag-instance", instance=instance_name):
+            for retries in range(retry_limit+1):
+                try:
+                    ec2_client.create_tags(
+                        Resources=[inst.id],
+                        Tags=[
+                            {
+                                'Key': 'InstanceName',
+                                'Value': instance_name
+                            }
+                        ]
+                    )
+                    return True
+                except ClientError as e:
+                    if e.response['Error']['Code'] != "InvalidInstanceID.NotFound" or retries == retry_limit:
+                        raise
+                    time.sleep(retry_interval)
+    except Exception as e:
+        log(f"Error: Failed to tag {inst.id} with 'InstanceName={instance_name}': {e}")
+        return False
 
 ###################################################################################################
 
 # main()
 
-try:
-    main()
-except Exception as e:
-    print("Error: error occurred, terminating program immediately as precaution.")
-    sys.exit(f"[ERROR] {e}")
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print("Error: error occurred, terminating program immediately as precaution.")
+        sys.exit(f"[ERROR] {e}")
@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+
+'''
+@author : Mitchell Van Braeckel
+@id : 1002297
+@date : 10/29/2020
+@version : python 3.8-32 / python 3.8.5
+@course : CIS*4010 Cloud Computing
+@brief : A2 Part 1: AWS EC2 - One-Click Deployment of VMs and Containers ; manifest.py
+
+@note :
+    Description: typed deployment manifest loaded from the 3 deployment description files (used by launch.py)
+        - each CSV row is validated and parsed once into a compact, immutable row type:
+          Template, InstanceSpec, ContainerSpec (frozen dataclasses with __slots__)
+        - load_manifest() returns a Manifest with everything already joined:
+          templates by name, containers by container package name, and instances in template>instance order
+          where each InstanceSpec carries its Template and ContainerSpecs directly
+
+        - all problems found while loading are collected and raised together as a ManifestError
+        - no module globals, so it can be used as a library (eg. 'manifest.load_manifest()')
+
+        CSV formats (header column row is ignored):
+        - template.csv: Template Name,Amazon Machine Image (AMI)/Azure Image Name,Instance Type / Azure Size,Root Volume Size (GiB),Security Group Name / Azure Inbound Ports,Zone / Region
+        - instances.csv: Template Name,Instance/VM Name,ssh key / Azure Key pair name,Container Package Name
+        - container.csv: Container Package Name,Container,Location,Start script
+'''
+
+############################################# IMPORTS #############################################
+
+# IMPORTS - 'pip install <import-package>'
+import csv
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+############################################ CONSTANTS ############################################
+
+CSV_TEMPLATE_FILENAME = "template.csv"
+CSV_INSTANCES_FILENAME = "instances.csv"
+CSV_CONTAINER_FILENAME = "container.csv"
+
+# Keyword identifier in the template name -> SSH user (checked in order, so 'amazonlinux2' has priority over 'amazonlinux')
+USER_DICT = {
+    "amazonlinux2": "ec2-user",
+    "amazonlinux": "ec2-user",
+    "centos": "centos",
+    "debian": "admin",
+    "fedora": "ec2-user",
+    "rhel": "ec2-user",
+    "suse": "ec2-user",
+    "ubuntu": "ubuntu",
+    "redhat": "ec2-user"
+}
+
+# Keyword identifier in the template name -> Docker install script (distros without one can't have Docker installed)
+DOCKER_INSTALL_SCRIPT_DICT = {
+    "amazonlinux2": "dockerInstall-amazonlinux2.sh",
+    "amazonlinux": "dockerInstall-amazonlinux.sh",
+    "ubuntu": "dockerInstall-ubuntu.sh",
+    "redhat": "dockerInstall-redhat.sh",
+    "suse": "dockerInstall-suse.sh"
+}
+
+############################################# CLASSES #############################################
+
+# Raised when the deployment description files are invalid (message lists every problem found)
+class ManifestError(ValueError):
+    pass
+
+# A template.csv row
+#   root_volume_size is None for 'default' (ie. no BlockDeviceMappings), availability_zone is resolved from a zone or region
+@dataclass(frozen=True)
+class Template:
+    __slots__ = ("name", "image_id", "instance_type", "root_volume_size", "security_group", "availability_zone", "user_keyword", "user")
+    name: str
+    image_id: str
+    instance_type: str
+    root_volume_size: Optional[int]
+    security_group: str
+    availability_zone: str
+    user_keyword: str
+    user: str
+
+    # Region of the template's availability zone (eg. 'us-east-1a' -> 'us-east-1')
+    @property
+    def region(self):
+        return self.availability_zone[:-1]
+
+# A container.csv row
+#   image is the resolved 'repo/containerName' (or just 'containerName'), start_script is None if not given
+@dataclass(frozen=True)
+class ContainerSpec:
+    __slots__ = ("package", "name", "location", "image", "start_script")
+    package: str
+    name: str
+    location: str
+    image: str
+    start_script: Optional[str]
+
+    # Command used to get the image from its docker location
+    @property
+    def pull_command(self):
+        return f"docker pull {self.image}"
+
+# An instances.csv row joined with its template and container package
+#   key_name is the AWS EC2 key pair name (ie. pem_file without '.pem')
+@dataclass(frozen=True)
+class InstanceSpec:
+    __slots__ = ("name", "template", "key_name", "pem_file", "container_package", "containers")
+    name: str
+    template: Template
+    key_name: str
+    pem_file: str
+    container_package: str
+    containers: Tuple[ContainerSpec, ...]
+
+# The whole deployment: templates by name, containers by container package name, instances in template>instance order
+@dataclass(frozen=True)
+class Manifest:
+    __slots__ = ("templates", "containers", "instances")
+    templates: Dict[str, Template]
+    containers: Dict[str, Tuple[ContainerSpec, ...]]
+    instances: Tuple[InstanceSpec, ...]
+
+############################################ FUNCTIONS ############################################
+
+# Loads, validates and joins the 3 deployment description files into a Manifest
+# NOTE: fixes permissions of PEM files to 'chmod 600' and SH files to 'chmod +x'
+def load_manifest(template_filename=CSV_TEMPLATE_FILENAME, instances_filename=CSV_INSTANCES_FILENAME, container_filename=CSV_CONTAINER_FILENAME):
+    # Check each CSV file exists before loading any of them
+    problems = [problem for problem in map(validate_csv_filename, (template_filename, instances_filename, container_filename)) if problem]
+    if problems:
+        raise ManifestError("\n".join(problems))
+
+    templates = {}
+    for row in load_csv_file(template_filename):
+        template = parse_row(parse_template, row, problems)
+        if template is not None:
+            templates[template.name] = template
+
+    containers = {}
+    for row in load_csv_file(container_filename):
+        container = parse_row(parse_container, row, problems)
+        if container is not None:
+            containers.setdefault(container.package, []).append(container)
+    containers = {package: tuple(package_containers) for package, package_containers in containers.items()}
+
+    # Group instance rows by template first, so instances come out in template>instance order
+    template_instances = {template_name: [] for template_name in templates}
+    for row in load_csv_file(instances_filename):
+        instance = parse_row(parse_instance, row, problems, templates, containers)
+        if instance is not None:
+            template_instances[instance.template.name].append(instance)
+
+    if problems:
+        raise ManifestError("\n".join(problems))
+
+    instances = tuple(instance for template_name in templates for instance in template_instances[template_name])
+    return Manifest(templates, containers, instances)
+
+# Returns the row parsed with the given parser (extra args passed along), or None after adding to 'problems'
+# instead of raising, so all bad rows are reported at once
+def parse_row(parser, row, problems, *args):
+    try:
+        return parser(row, *args)
+    except (IndexError, ValueError) as e:
+        problems.append(f"Error: Invalid row {row} - {e}")
+        return None
+
+# Returns a Template from a template.csv row
+def parse_template(row):
+    # Determine user for the given template name (which was based on the AMI image ID)
+    user_keyword = None
+    for key in USER_DICT:
+        if key in row[0].lower():
+            user_keyword = key
+            break
+    if user_keyword is None:
+        raise ManifestError(f"template name '{row[0]}' does not contain a keyword identifier from {list(USER_DICT)}")
+
+    # Root volume size is either 'default' or a number of GiB
+    if row[3].lower() == "default":
+        root_volume_size = None
+    elif row[3].isdigit():
+        root_volume_size = int(row[3])
+    else:
+        raise ManifestError(f"root volume size '{row[3]}' must be 'default' or an integer")
+
+    return Template(row[0], row[1], row[2], root_volume_size, row[4], determine_availability_zone(row[5]), user_keyword, USER_DICT[user_keyword])
+
+# Returns a ContainerSpec from a container.csv row
+def parse_container(row):
+    problem = validate_bash_script(row[3])
+    if problem:
+        raise ManifestError(problem)
+    return ContainerSpec(row[0], row[1], row[2], determine_image_name(row[1], row[2]), row[3] or None)
+
+# Returns an InstanceSpec from an instances.csv row, joined with its template and container package
+def parse_instance(row, templates, containers):
+    if row[0] not in templates:
+        raise ManifestError(f"template name '{row[0]}' not found in '{CSV_TEMPLATE_FILENAME}'")
+
+    # SSH key pair must exist locally with a '.pem' extension, the AWS EC2 key pair name is without it
+    if len(row[2]) <= 4 or not row[2].endswith(".pem"):
+        raise ManifestError(f"ssh key pair name '{row[2]}' - filename must end with '.pem'")
+    if not os.path.isfile(row[2]):
+        raise ManifestError(f"ssh key pair name '{row[2]}' - file does not exist locally")
+    os.chmod(row[2], 0o600) #perms for PEM file
+
+    return InstanceSpec(row[1], templates[row[0]], row[2][:-4], row[2], row[3], containers.get(row[3], ()))
+
+# Returns an availability zone if what's given is an availability region
+def determine_availability_zone(availability):
+    # Check the last letter of the availability: letter=zone, digit=region so get a zone (via adding 'a' on the end)
+    if availability and availability[-1].isalpha():
+        return availability
+    elif availability and availability[-1].isdigit():
+        return f"{availability}a"
+    else:
+        raise ManifestError(f"invalid availability zone/region '{availability}'")
+
+# Returns the image name (repo/containerName, or just containerName) from the docker location
+#   (Docker hub=containerName
+#   Docker hub/repo=repo/containerName)
+# NOTE: Dockerfile location not supported right now, would also need to check if said file exists
+def determine_image_name(container, location):
+    if location == None or location == "":
+        raise ManifestError(f"invalid docker image location for '{container}': '{location}'")
+
+    # Get everything after the first '/', as long as something exists after it (default to nothing)
+    location_type, _, repo = location.partition('/')
+    if location_type.lower() == "docker hub":
+        return f"{repo}/{container}" if repo else container
+    elif location_type.lower() == "dockerfile":
+        raise ManifestError(f"feature for dockerfile location not supported - invalid docker image location for '{container}': '{location}'")
+    else:
+        raise ManifestError(f"invalid docker image location for '{container}': '{location}'")
+
+############################################# HELPERS #############################################
+
+# Returns a problem message if the CSV filename is invalid or doesn't exist locally, otherwise None
+def validate_csv_filename(csv_filename):
+    # Each CSV filename must be at least 5 chars long and have a '.csv' extension
+    if len(csv_filename) <= 4 or not csv_filename.endswith(".csv"):
+        return f"Error: Invalid CSV file name '{csv_filename}' - filename must end with '.csv'."
+    if not os.path.isfile(csv_filename):
+        return f"Error: Invalid CSV file name '{csv_filename}' - file does not exist."
+    return None
+
+# Returns a problem message if the filename isn't a locally existing bash script, otherwise None (empty string is allowed)
+# NOTE: fixes permissions of SH files to 'chmod +x'
+def validate_bash_script(filename):
+    if filename == None or filename == "":
+        return None
+    # Must be at least 4 chars long and have a '.sh' extension
+    if len(filename) <= 3 or not filename.endswith(".sh"):
+        return f"Error: Invalid bash script '{filename}' - filename must end with '.sh'."
+    if not os.path.isfile(filename):
+        return f"Error: Invalid bash script '{filename}' - file does not exist locally."
+    os.chmod(filename, os.stat(filename).st_mode | 0o111) #perms for bash script file
+    return None
+
+# Loads CSV and returns the 2D array of its contents, skipping header column row
+def load_csv_file(csv_filename):
+    with open(csv_filename, "r", newline='') as csv_file:
+        csv_content = list(csv.reader(csv_file, delimiter=','))
+    return csv_content[1:]
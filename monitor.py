@@ -29,9 +29,42 @@
         - optional 'flush' argument "-f" or "-flush" or "flush"
         --> to use this argument, it must be used with the previous two optional arguments
         --> Before printing and displaying info, clear everything first (thus "flushing")
+          - after the first display, only the cells that changed are redrawn in place (full redraw when columns resize or instances come/go)
         --> After printing and displaying info, give a message to user saying they can stop and exit the program using 'Ctrl+c' (or 'Command+c' on Mac)
           - Notice this message is printed after the table output instead of before, in contrast to 'watch' flag
 
+        - optional '--adaptive' argument (can go anywhere, used with the watch argument)
+        --> instead of a fixed refresh rate, refreshes every 1 second while any instance is pending/stopping/shutting-down,
+            and doubles the wait (up to 60 seconds) while everything is steady
+        --> if AWS answers with 'RequestLimitExceeded', keeps the last display and backs off further (up to 300 seconds)
+        --> the current refresh rate is shown under the table
+
+        - optional '--regions REGION,...' argument (can go anywhere)
+        --> monitors instances in all of the given regions at once (merged into one table with an AVAILABILITY ZONE column)
+        --> by default, monitors every region in the Zone / Region column of 'template.csv' plus the default region
+
+        - optional '--state STATE,...' and '--template NAME,...' arguments (can go anywhere)
+        --> only show instances in the given states (eg. 'running,pending') and/or with the given TemplateName tags
+        - optional '--tag KEY=VALUE,...' argument (can go anywhere)
+        --> only show instances with the given tags (a bare 'KEY' means the tag is there with any value, '*' wildcards work in values)
+        --> values given for the same tag key match any of them, different tag keys must all match
+        --> these (and the state/template ones) are passed to AWS as server-side 'describe_instances()' Filters
+
+        - optional '--format table|json|ndjson|csv' argument (can go anywhere)
+        --> 'table' (default) is the padded text table, the others are machine-readable for piping into other tools
+        --> json: one array of instance objects (per refresh when watching, one line each)
+        --> ndjson: one instance object per line, streamed as each refresh arrives when watching (with a 'time' field, the refresh epoch seconds)
+        --> csv: a header row of the column names, then one row per instance (when watching, the header only comes first)
+        --> machine-readable watching prints no quit msg/footer on stdout, skips throttled refreshes and can't be flushed
+
+        - optional '--columns NAME,...' argument (can go anywhere)
+        --> only these fields (in this order) are gathered and output, out of:
+            template, zone, image_id, instance, instance_id, state, public_ip, type, sec_group
+        --> or the opt-in 'user_data' field: the user data provisioning status of instances from 'launch.py --user-data'
+            (PENDING, OK or FAILED, from the 'UserDataStatus' tag, and while it's PENDING on a running instance,
+            from the console output marker the user data script writes once it's done, see 'console_waiter.py')
+          - a pending instance costs one 'get_console_output()' call per refresh until it's done (then its status is remembered)
+
         - Using this script in its simplest form `py monitor.py` will output a table of display information related to monitoring VM instances
           - Simply run the script again whenever you want an update
           - Alternatively, turn on the 'watch' version and let it update automatically in a terminal
@@ -42,22 +75,99 @@
 ############################################# IMPORTS #############################################
 
 # IMPORTS - 'pip install <import-package>'
-import boto3
+import concurrent.futures
+from console_waiter import USER_DATA_STATUS_TAG, get_console_text, parse_user_data_results
 import csv
+from ec2_api import check_credentials, create_client, get_api_metrics
+import io
+import json
+from manifest import CSV_TEMPLATE_FILENAME, load_csv_file, parse_template
 import os
 import sys
 import time
 
 ############################################ CONSTANTS ############################################
 
-USAGE_STATEMENT = "Usage: py monitor.py <-w,-watch,watch|optional> <refresh_rate_seconds|optional,int> <-f,-flush-flush|optional>"
+USAGE_STATEMENT = "Usage: py monitor.py <-w,-watch,watch|optional> <refresh_rate_seconds|optional,int> <-f,-flush-flush|optional>" \
+    " <--state STATE,...|optional> <--template NAME,...|optional> <--tag KEY=VALUE,...|optional> <--adaptive|optional>" \
+    " <--regions REGION,...|optional> <--format table|json|ndjson|csv|optional> <--columns NAME,...|optional>"
+
+# Optional monitor arguments (can go anywhere after 'monitor.py'): option -> (monitor_args key, kind, default)
+#   kind 'list' takes a comma-separated list value after the option, 'value' takes a single value, 'flag' takes no value
+MONITOR_OPTIONS = {
+    "--state": ("states", "list", None), #only show instances in these states (server-side 'instance-state-name' filter)
+    "--template": ("templates", "list", None), #only show instances with these TemplateName tags (server-side 'tag:TemplateName' filter)
+    "--tag": ("tags", "list", None), #only show instances with these KEY=VALUE (or just KEY) tags (server-side 'tag:KEY'/'tag-key' filters)
+    "--adaptive": ("adaptive", "flag", False), #watch mode adapts the refresh rate to what the instances are doing
+    "--regions": ("regions", "list", None), #regions to monitor (default: regions in 'template.csv' plus the default region)
+    "--format": ("format", "value", "table"), #output format, one of OUTPUT_FORMATS
+    "--columns": ("columns", "list", None) #instance record fields to gather and output, in order (default: all TABLE_COLUMNS, see OPTIONAL_COLUMNS)
+}
+
+# Output formats: the padded text table, or machine-readable ones for piping into other tools
+OUTPUT_FORMATS = ["table", "json", "ndjson", "csv"]
+
+
+# Adaptive watch refresh rate (seconds): fast while any instance is transitioning, doubling up to the ceiling while steady,
+# and doubling further (up to the throttled ceiling) whenever AWS answers with 'RequestLimitExceeded'
+ADAPTIVE_MIN_SECONDS = 1
+ADAPTIVE_MAX_SECONDS = 60
+ADAPTIVE_THROTTLED_MAX_SECONDS = 300
+TRANSITIONAL_STATES = {"PENDING", "STOPPING", "SHUTTING-DOWN"}
+
+# Table columns in display order: (header, instance record key, minimum width)
+#   some we already know the max of, others are calculated from the content
+TABLE_COLUMNS = [
+    ("TEMPLATE NAME", "template", 0),
+    ("AVAILABILITY ZONE", "zone", 0),
+    ("IMAGE ID", "image_id", len("ami-0dba2cb6798deb6d8")), #21
+    ("INSTANCE NAME", "instance", 0),
+    ("INSTANCE ID", "instance_id", len("i-0d57e622c8f32a7ae")), #19
+    ("STATE", "state", len("SHUTTING-DOWN")), #13
+    ("PUBLIC IPV4", "public_ip", len("255.255.255.255")), #15
+    ("INSTANCE TYPE", "type", 0),
+    ("SECURITY GROUP", "sec_group", 0)
+]
+COLUMN_GAP = 3
+
+# Opt-in table columns (only gathered and output when given with '--columns')
+OPTIONAL_COLUMNS = [
+    ("USER DATA", "user_data", len("PENDING")) #7
+]
+
+# How to get each instance record field from a 'describe_instances()' instance (and its tags as a dict)
+RECORD_FIELDS = {
+    'template': lambda inst, tags: tags.get('TemplateName', "NULL"),
+    'zone': lambda inst, tags: inst.get('Placement', {}).get('AvailabilityZone'),
+    'image_id': lambda inst, tags: inst.get('ImageId'),
+    'instance': lambda inst, tags: tags.get('InstanceName', "NULL"),
+    'instance_id': lambda inst, tags: inst['InstanceId'],
+    'state': lambda inst, tags: inst['State']['Name'].upper(),
+    'public_ip': lambda inst, tags: inst.get('PublicIpAddress'),
+    'type': lambda inst, tags: inst.get('InstanceType'),
+    'sec_group': lambda inst, tags: ",".join(sec_group['GroupName'] for sec_group in inst.get('SecurityGroups', [])), #names as comma-separated list
+    'user_data': lambda inst, tags: tags.get(USER_DATA_STATUS_TAG) #PENDING is resolved from the console output (see get_region_instance_records())
+}
+
+QUIT_MESSAGE = "--Please use command keyboard interrupt 'Ctrl+c' or ('Command+c' for Mac) to stop monitoring and exit the program--"
+
+# ANSI escape codes: move cursor home and clear screen, clear current line
+ANSI_CLEAR_SCREEN = "\x1b[H\x1b[2J"
+ANSI_CLEAR_LINE = "\x1b[2K"
+
+# DescribeInstances page size (max allowed), so one refresh costs ceil(N/1000) calls
+DESCRIBE_INSTANCES_PAGE_SIZE = 1000
 
 ############################## STATE VARIABLES, INITIALIZATION, MAIN ##############################
 
+# Final user data statuses read from console output markers, by instance ID (see get_console_user_data_status())
+console_user_data_statuses = {}
+
 def main():
     #globals
     global ec2_client
-    global ec2_resource
+    global ec2_region_clients
+    global instance_filters
 
     # ========== ARGUMENTS ==========
 
@@ -66,47 +176,82 @@ def main():
     refresh_rate_seconds = 10
     flush_flag = False
 
-    # Collect command line arguments when executing this python script
-    argc = len(sys.argv)
-    bad_usage_flag = False
+    # Collect command line arguments when executing this python script (optional '--' arguments are taken out first)
+    argv, monitor_args, bad_usage_flag = parse_monitor_options(sys.argv)
+    argc = len(argv)
 
     # Check args
     if argc >= 2:
-        if sys.argv[1] == None or sys.argv[1] == "" or sys.argv[1] != "-w" and sys.argv[1] != "-watch" and sys.argv[1] != "watch":
+        if argv[1] == None or argv[1] == "" or argv[1] != "-w" and argv[1] != "-watch" and argv[1] != "watch":
             bad_usage_flag = True
-            print("Error: Given watch flag '" + sys.argv[1] + "' is invalid - must be set as '-w' or '-watch' or 'watch'.")
+            print("Error: Given watch flag '" + argv[1] + "' is invalid - must be set as '-w' or '-watch' or 'watch'.")
         else:
             watch_flag = True
     if argc >= 3:
-        if not sys.argv[2].isdigit():
+        if not argv[2].isdigit():
             bad_usage_flag = True
-            print("Error: Given refresh rate '" + sys.argv[2] + "' is not an integer.")
-        elif len(sys.argv[2]) < 1 or len(sys.argv[2]) > 10:
+            print("Error: Given refresh rate '" + argv[2] + "' is not an integer.")
+        elif len(argv[2]) < 1 or len(argv[2]) > 10:
             bad_usage_flag = True
             print("Error: Refresh rate must be between 1 and 10 seconds (inclusive)!")
         else:
-            refresh_rate_seconds = int(sys.argv[2])
+            refresh_rate_seconds = int(argv[2])
     if argc >= 4:
-        if sys.argv[3] == None or sys.argv[3] == "" or sys.argv[3] != "-f" and sys.argv[3] != "-flush" and sys.argv[3] != "flush":
+        if argv[3] == None or argv[3] == "" or argv[3] != "-f" and argv[3] != "-flush" and argv[3] != "flush":
             bad_usage_flag = True
-            print("Error: Given flush flag '" + sys.argv[3] + "' is invalid - must be set as '-w' or '-flush' or 'flush'.")
+            print("Error: Given flush flag '" + argv[3] + "' is invalid - must be set as '-w' or '-flush' or 'flush'.")
         else:
             flush_flag = True
     if argc > 4:
         bad_usage_flag = True
         print("Error: Too many arguments.")
+
+    # Check optional '--' args
+    output_format = monitor_args['format']
+    if output_format not in OUTPUT_FORMATS:
+        bad_usage_flag = True
+        print(f"Error: Given format '{output_format}' is invalid - must be one of: {', '.join(OUTPUT_FORMATS)}.")
+    elif flush_flag and output_format != "table":
+        bad_usage_flag = True
+        print("Error: Flush flag only works with the 'table' format.")
+    table_columns_by_key = {column[1]: column for column in TABLE_COLUMNS + OPTIONAL_COLUMNS}
+    for column_key in monitor_args['columns'] or []:
+        if column_key not in table_columns_by_key:
+            bad_usage_flag = True
+            print(f"Error: Given column '{column_key}' is invalid - must be one of: {', '.join(table_columns_by_key)}.")
+    for tag in monitor_args['tags'] or []:
+        if tag.startswith("="):
+            bad_usage_flag = True
+            print(f"Error: Given tag '{tag}' is invalid - must be set as 'KEY=VALUE' or 'KEY'.")
     
     # Exit with usage statement if flag has been triggered for any reason
     if bad_usage_flag:
         sys.exit(USAGE_STATEMENT)
 
+    # Server-side filters for every refresh
+    instance_filters = build_instance_filters(monitor_args)
+
+    # Output columns (in the order given), and the only record fields gathered for them (plus the state adaptive watching goes by)
+    if monitor_args['columns']:
+        output_columns = [table_columns_by_key[column_key] for column_key in dict.fromkeys(monitor_args['columns'])]
+    else:
+        output_columns = TABLE_COLUMNS
+    record_fields = [key for _, key, _ in output_columns]
+    if watch_flag and monitor_args['adaptive'] and 'state' not in record_fields:
+        record_fields.append('state')
+
     # ========== AWS EC2 ==========
-    ec2_client = boto3.client("ec2")
-    ec2_resource = boto3.resource("ec2")
+    # Every API call goes through the shared rate limiter (with retries of throttled calls, see 'ec2_api.py')
+    ec2_client = create_client()
 
-    # Validate AWS EC2 credentials (by testing if 'describe_instances()' works)
+    # One client per monitored region (made up front since creating clients isn't thread-safe, but using them is),
+    # all from one session so the EC2 service model is only loaded once
+    regions = monitor_args['regions'] or discover_regions(ec2_client.meta.region_name)
+    ec2_region_clients = {region: ec2_client if region == ec2_client.meta.region_name else create_client(region) for region in regions}
+
+    # Validate AWS EC2 credentials (by a 'describe_instances()' dry run, or a recent one that passed, see 'ec2_api.py')
     try:
-        ec2_client.describe_instances()
+        check_credentials(ec2_client)
     except Exception as e:
         print("Error: Invalid or expired credentials (or insufficient permissions to call 'describe_instances()')")
         sys.exit(f"[ERROR] {e}")
@@ -115,131 +260,318 @@ def main():
      
     # Infinitely display monitor info (clearing last display first), every N seconds (default 10), until user manually stops (with keyboard interrupt)
     if watch_flag:
+        from botocore.exceptions import ClientError #deferred until the clients exist (see 'ec2_api.py')
         try:
-            # Give user msg saying how to quit if flush flag is not set
-            if not flush_flag:
-                print("--Please use command keyboard interrupt 'Ctrl+c' or ('Command+c' for Mac) to stop monitoring and exit the program--\n")
+            # Give user msg saying how to quit if flush flag is not set (machine-readable formats keep it off stdout)
+            if output_format != "table":
+                print(QUIT_MESSAGE, file=sys.stderr)
+            elif not flush_flag:
+                print(f"{QUIT_MESSAGE}\n")
                 
+            previous_frame = None
+            csv_header_flag = True
+            records = []
+            interval_seconds = refresh_rate_seconds
             while True:
-                # Get monitor output table of display info
-                output = get_monitor_output_table()
-
-                # Flush existing stdout monitor display info (via 'clear') if flush flag is set, then print output table
+                # Get instance info (when adaptive, a throttled refresh keeps showing the last info and backs off instead of exiting)
+                throttled_flag = False
+                try:
+                    records = get_instance_records(instance_filters, record_fields)
+                except ClientError as e:
+                    if not monitor_args['adaptive'] or e.response['Error']['Code'] != "RequestLimitExceeded":
+                        sys.exit(f"[ERROR] While gathering info from VM instances: {e}")
+                    throttled_flag = True
+                except Exception as e:
+                    sys.exit(f"[ERROR] While gathering info from VM instances: {e}")
+
+                # Determine how long until the next refresh, shown in the footer
+                if monitor_args['adaptive']:
+                    interval_seconds = next_poll_interval(interval_seconds, records, throttled_flag)
+                footer = get_refresh_footer(interval_seconds, monitor_args['adaptive'], throttled_flag)
+
+                if output_format != "table":
+                    # Stream this refresh's records (a throttled refresh has nothing new, so nothing is written)
+                    if not throttled_flag:
+                        sys.stdout.write(format_records(records, output_columns, output_format, csv_header_flag, time.time()))
+                        sys.stdout.flush()
+                        csv_header_flag = False
+                    time.sleep(interval_seconds)
+                    continue
+
+                rows, widths = get_monitor_table(records, output_columns)
                 if flush_flag:
-                    os.system(f"clear")
-                print(output)
-                
-                # Give user msg saying how to quit if flush flag is set, then sleep N seconds before displaying monitor info again
-                if flush_flag:
-                    print("--Please use command keyboard interrupt 'Ctrl+c' or ('Command+c' for Mac) to stop monitoring and exit the program--\n")
-                time.sleep(refresh_rate_seconds)
+                    # Redraw only what changed since the last frame (full redraw via ANSI clear the first time or when columns resize),
+                    # with the msg saying how to quit and the refresh rate as the footer
+                    output, previous_frame = render_frame(rows, widths, f"{QUIT_MESSAGE}\n{footer}", previous_frame, output_columns)
+                    sys.stdout.write(output)
+                    sys.stdout.flush()
+                else:
+                    # Print monitor output table of display info
+                    print(format_table(rows, widths))
+                    print(f"{footer}\n")
+
+                # Sleep N seconds before displaying monitor info again
+                time.sleep(interval_seconds)
 
         except KeyboardInterrupt:
             # Catch user manual termination and give nice ALERT saying they closed it 
             sys.exit("ALERT: User manually stopped monitoring the VM instances, thus terminating the program.")
+        except BrokenPipeError:
+            # Whatever stdout was piped into stopped reading (eg. 'head'), so stop quietly (without another error flushing stdout at exit)
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            sys.exit(1)
     
     else:
-        # Get monitor output table of display info
-        output = get_monitor_output_table()
+        # Get monitor output table of display info (or the records in the machine-readable format)
+        output = get_monitor_output_table(output_columns, output_format)
         # try:
         #     output = get_monitor_output_table()
         # except Exception as e:
         #     sys.exit(f"[ERROR] While constructing monitor output table for display info of VM instances: {e}")
         
         # Print output table
-        print(output)
+        if output_format == "table":
+            print(output)
+        else:
+            sys.stdout.write(output)
 
 ############################################ FUNCTIONS ############################################
 
-# Returns the monitor output table of display info
-def get_monitor_output_table():
-    # Get all instances
-    instances = list(ec2_resource.instances.all())
-    length = len(instances)
-
-    # Col lists hold all column info individually
-    template_list = ["TEMPLATE NAME"]
-    instance_list = ["INSTANCE NAME"]
-    state_list = ["STATE"]
-    instance_id_list = ["INSTANCE ID"]
-    image_id_list = ["IMAGE ID"]
-    public_ip_list = ["PUBLIC IPV4"]
-    type_list = ["INSTANCE TYPE"]
-    sec_group_list = ["SECURITY GROUP"]
-
-    # Skip if no instances exist
-    if length > 0:
-        # Get necessary info from all instances, storing in its col list
+# Returns the info of every instance (matching the filters) in every monitored region, as one list of instance records (see below)
+# NOTE: regions are described concurrently, so a refresh takes about as long as the slowest region (not the sum of all of them)
+def get_instance_records(filters=None, fields=None):
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(ec2_region_clients)) as executor:
+        region_futures = [executor.submit(get_region_instance_records, client, filters, fields) for client in ec2_region_clients.values()]
+        return [record for future in region_futures for record in future.result()]
+
+# Returns the info of every instance (matching the filters) in the client's region, as a list of dicts with the given fields
+# (default: all of them, see RECORD_FIELDS): template, zone, image_id, instance, instance_id, state, public_ip, type, sec_group
+# NOTE: one paginated 'describe_instances()' pass (ceil(N/1000) calls) instead of listing then reloading every instance
+#   EC2 always answers with whole instances, so fields that weren't asked for are just never built
+#   A running instance whose 'user_data' is still PENDING also gets its console output read (see get_console_user_data_status())
+def get_region_instance_records(client, filters=None, fields=None):
+    field_getters = [(field, RECORD_FIELDS[field]) for field in (fields or RECORD_FIELDS)]
+    records = []
+    paginator = client.get_paginator("describe_instances")
+    for page in paginator.paginate(Filters=filters or [], PaginationConfig={'PageSize': DESCRIBE_INSTANCES_PAGE_SIZE}):
+        for reservation in page['Reservations']:
+            for inst in reservation['Instances']:
+                tags = {tag['Key']: tag['Value'] for tag in inst.get('Tags', [])}
+                record = {field: get_field(inst, tags) for field, get_field in field_getters}
+                if record.get('user_data') == "PENDING" and inst['State']['Name'] == "running":
+                    record['user_data'] = get_console_user_data_status(client, inst['InstanceId'])
+                records.append(record)
+    return records
+
+# Returns the user data provisioning status of the instance from its console output marker: OK or FAILED once it's there
+# (remembered, since it can't change after), otherwise PENDING
+#   The 'UserDataStatus' tag is only updated by the 'launch.py' run that launched it, so this still works after that run stopped
+#   A console read that fails (eg. throttled past the retries) just leaves it PENDING until the next refresh
+def get_console_user_data_status(client, instance_id):
+    if instance_id not in console_user_data_statuses:
         try:
-            for inst in instances:
-                # Reload each instance before getting info
-                inst.reload()
-
-                # Get template and instance name
-                template_name = "NULL"
-                instance_name = "NULL"
-                tags = inst.tags
-                for tag in tags:
-                    if tag['Key'] == 'TemplateName':
-                        template_name = tag['Value']
-                    elif tag['Key'] == 'InstanceName':
-                        instance_name = tag['Value']
-                template_list.append(str_return_empty_for_none(template_name))
-                instance_list.append(str_return_empty_for_none(instance_name))
-
-                # Get status state, instance ID, image ID, public ipv4 (already know max length)
-                state_list.append(str_return_empty_for_none(inst.state['Name'].upper()))
-                instance_id_list.append(str_return_empty_for_none(inst.id))
-                image_id_list.append(str_return_empty_for_none(inst.image_id))
-                public_ip_list.append(str_return_empty_for_none(inst.public_ip_address))
-
-                # Get instance type, security group name (turn it into comma-separated list, strip extra tailing comma)
-                type_list.append(str_return_empty_for_none(inst.instance_type))
-                sec_groups = ""
-                for sec_group in inst.security_groups:
-                    sec_groups += f"{sec_group['GroupName']},"
-                sec_group_list.append(str_return_empty_for_none(sec_groups.strip(',')))
-
-        except Exception as e:
-            sys.exit(f"[ERROR] While gathering info from VM instances: {e}")
-    
-    # Determine all col widths (include col header), some we already know max, others we calculate
-    template_max = 0
-    instance_max = 0
-    state_max = len("SHUTTING-DOWN") #13
-    instance_id_max = len("i-0d57e622c8f32a7ae") #19
-    image_id_max = len("ami-0dba2cb6798deb6d8") #21
-    public_ip_max = len("255.255.255.255") #15
-    type_max = 0
-    sec_group_max = 0
-
-    # Challenge max lengths (+1 for table headers)
-    for i in range(length+1):
-        template_max = max(template_max, len(template_list[i]))
-        instance_max = max(instance_max, len(instance_list[i]))
-        type_max = max(type_max, len(type_list[i]))
-        sec_group_max = max(sec_group_max, len(sec_group_list[i]))
-
-    # Construct monitor output table
-    ## old Table headers: TEMPLATE NAME, INSTANCE NAME, STATE, INSTANCE ID, IMAGE ID, PUBLIC IPV4, INSTANCE TYPE, SECURITY GROUP
-    # Table headers: TEMPLATE NAME, IMAGE ID, INSTANCE NAME, INSTANCE ID, STATE, PUBLIC IPV4, INSTANCE TYPE, SECURITY GROUP
-    output = ""
-    for i in range(length+1):
-        ## bad old table calculated version
-        ## output += f"{template_list[i].ljust(template_max)}   {instance_list[i].ljust(instance_max)}   {state_list[i].ljust(state_max)}   {instance_id_list[i].ljust(instance_id_max)}   "
-        ## output += f"{image_id_list[i].ljust(image_id_max)}   {public_ip_list[i].ljust(public_ip_max)}   {type_list[i].ljust(type_max)}   {sec_group_list[i].ljust(sec_group_max)}\n"
-        
-        # Hardcoded approximate version
-        # output += f"{template_list[i].ljust(25)}{image_id_list[i].ljust(25)}{instance_list[i].ljust(20)}{instance_id_list[i].ljust(25)}"
-        # output += f"{state_list[i].ljust(15)}{public_ip_list[i].ljust(18)}{type_list[i].ljust(15)}{sec_group_list[i].ljust(20)}\n"
+            step_results = parse_user_data_results(get_console_text(client, instance_id))
+        except Exception:
+            step_results = None
+        if step_results == None:
+            return "PENDING"
+        console_user_data_statuses[instance_id] = "OK" if all(exit_code == "0" for exit_code in step_results.values()) else "FAILED"
+    return console_user_data_statuses[instance_id]
+
+# Returns the monitor table of display info for the instance records as (rows of cell strings with the header row first, column widths)
+# Table headers: TEMPLATE NAME, AVAILABILITY ZONE, IMAGE ID, INSTANCE NAME, INSTANCE ID, STATE, PUBLIC IPV4, INSTANCE TYPE, SECURITY GROUP
+# (or just the given columns, see TABLE_COLUMNS)
+def get_monitor_table(records, columns=TABLE_COLUMNS):
+    # One row per instance (header included in width calculation)
+    rows = [[header for header, _, _ in columns]]
+    rows.extend([str_return_empty_for_none(record[key]) for _, key, _ in columns] for record in records)
+    widths = [max(minimum, max(len(row[col]) for row in rows)) for col, (_, _, minimum) in enumerate(columns)]
+    return rows, widths
+
+# Returns the monitor output table of display info (or the records in the given machine-readable format, see format_records())
+def get_monitor_output_table(columns=TABLE_COLUMNS, output_format="table"):
+    # Get all instances (matching the server-side filters), with only the fields the columns need
+    try:
+        records = get_instance_records(instance_filters, [key for _, key, _ in columns])
+    except Exception as e:
+        sys.exit(f"[ERROR] While gathering info from VM instances: {e}")
+
+    if output_format != "table":
+        return format_records(records, columns, output_format)
+    rows, widths = get_monitor_table(records, columns)
+    return format_table(rows, widths)
+
+# Returns the table as one string (each cell padded to its column width + gap), built in a single join pass
+def format_table(rows, widths):
+    return "".join("".join(cell.ljust(width + COLUMN_GAP) for cell, width in zip(row, widths)) + "\n" for row in rows)
+
+# Returns the instance records (only the columns' fields, keyed by record key) as machine-readable text, one of:
+#   json: one array of objects on one line, ndjson: one object per line (with a 'time' field when refresh_time is given),
+#   csv: a header row of record keys (if csv_header_flag is set) then one row per record (None as an empty cell)
+def format_records(records, columns, output_format, csv_header_flag=True, refresh_time=None):
+    keys = [key for _, key, _ in columns]
+    if output_format == "csv":
+        csv_buffer = io.StringIO()
+        csv_writer = csv.writer(csv_buffer, lineterminator="\n")
+        if csv_header_flag:
+            csv_writer.writerow(keys)
+        csv_writer.writerows([record[key] for key in keys] for record in records)
+        return csv_buffer.getvalue()
+
+    objects = [{key: record[key] for key in keys} for record in records]
+    if output_format == "json":
+        return json.dumps(objects, separators=(",", ":")) + "\n"
+    if refresh_time is not None:
+        for obj in objects:
+            obj['time'] = round(refresh_time, 3)
+    return "".join(json.dumps(obj, separators=(",", ":")) + "\n" for obj in objects)
+
+# Returns (output, frame) where output is what to write to the terminal to turn the previous frame into this one
+#   Rows are keyed by instance ID (by position when the columns don't include it), so only the cells that changed are rewritten (using ANSI cursor movement)
+#   Falls back to a full redraw (ANSI clear, no 'clear' process) for the first frame, resized columns or added/removed/reordered rows
+# NOTE: frame is {'widths', 'keys', 'rows': {key: row}, 'footer'}, pass it back in as 'previous_frame' next time
+def render_frame(rows, widths, footer, previous_frame=None, columns=TABLE_COLUMNS):
+    column_keys = [key for _, key, _ in columns]
+    if "instance_id" in column_keys:
+        instance_id_col = column_keys.index("instance_id")
+        keys = [None] + [row[instance_id_col] for row in rows[1:]] #header row has no instance ID
+    else:
+        keys = [None] + list(range(1, len(rows)))
+    frame = {
+        'widths': widths,
+        'keys': keys,
+        'rows': dict(zip(keys, rows)),
+        'footer': footer
+    }
+
+    # Layout: table rows on lines 1..len(rows), blank line, footer
+    footer_line = len(rows) + 2
+    if previous_frame is None or previous_frame['widths'] != widths or previous_frame['keys'] != keys:
+        return f"{ANSI_CLEAR_SCREEN}{format_table(rows, widths)}\n{footer}\n", frame
+
+    # 1-based terminal column where each table column starts
+    col_starts = [1]
+    for width in widths[:-1]:
+        col_starts.append(col_starts[-1] + width + COLUMN_GAP)
+
+    output = []
+    for line, (key, row) in enumerate(zip(keys, rows), start=1):
+        previous_row = previous_frame['rows'][key]
+        for col, cell in enumerate(row):
+            if cell != previous_row[col]:
+                output.append(f"\x1b[{line};{col_starts[col]}H{cell.ljust(widths[col] + COLUMN_GAP)}")
+    footer_lines = footer.split("\n")
+    previous_footer_lines = previous_frame['footer'].split("\n")
+    for i, footer_text in enumerate(footer_lines):
+        if i >= len(previous_footer_lines) or footer_text != previous_footer_lines[i]:
+            output.append(f"\x1b[{footer_line + i};1H{ANSI_CLEAR_LINE}{footer_text}")
+    # Erase the previous footer's lines past this one's (eg. the throttled line went away), so none are left on screen
+    for i in range(len(footer_lines), len(previous_footer_lines)):
+        output.append(f"\x1b[{footer_line + i};1H{ANSI_CLEAR_LINE}")
+
+    # Park the cursor below the footer again
+    output.append(f"\x1b[{footer_line + len(footer_lines)};1H")
+    return "".join(output), frame
+
+# Returns the adaptive watch refresh rate (seconds) to use after the current one
+#   Throttled: double it (up to the throttled ceiling), any instance transitioning: poll fast, otherwise: double it (up to the ceiling)
+def next_poll_interval(current_seconds, records, throttled_flag):
+    if throttled_flag:
+        return min(max(current_seconds, ADAPTIVE_MIN_SECONDS) * 2, ADAPTIVE_THROTTLED_MAX_SECONDS)
+    if any(record['state'] in TRANSITIONAL_STATES for record in records):
+        return ADAPTIVE_MIN_SECONDS
+    return min(current_seconds * 2, ADAPTIVE_MAX_SECONDS)
+
+# Returns the watch footer line showing the effective refresh rate
+def get_refresh_footer(interval_seconds, adaptive_flag, throttled_flag):
+    footer = f"--Refreshing every {interval_seconds}s"
+    if adaptive_flag:
+        footer += " (adaptive"
+        if throttled_flag:
+            footer += ", backing off: AWS request limit exceeded"
+        footer += ")"
+
+    # Throttled API calls are retried (see 'ec2_api.py'), but show how often it happened and how long it cost
+    api_metrics = get_api_metrics().values()
+    throttles = sum(metrics['throttles'] for metrics in api_metrics)
+    if throttles:
+        footer += f" (EC2 API: {throttles} throttled calls retried, {sum(metrics['wait_seconds'] for metrics in api_metrics):.1f}s waiting on rate limits)"
+    return footer + "--"
 
-        # Calculated version
-        output += f"{template_list[i].ljust(template_max+3)}{image_id_list[i].ljust(image_id_max+3)}{instance_list[i].ljust(instance_max+3)}{instance_id_list[i].ljust(instance_id_max+3)}"
-        output += f"{state_list[i].ljust(state_max+3)}{public_ip_list[i].ljust(public_ip_max+3)}{type_list[i].ljust(type_max+3)}{sec_group_list[i].ljust(sec_group_max+3)}\n"
+############################################# HELPERS #############################################
 
-    return output
+# Takes the optional '--' arguments (see MONITOR_OPTIONS) out of the command line
+# Returns (remaining positional argv, monitor_args, bad_usage_flag)
+def parse_monitor_options(argv):
+    monitor_args = {key: default for key, _, default in MONITOR_OPTIONS.values()}
+    positional_argv = []
+    bad_usage_flag = False
 
-############################################# HELPERS #############################################
+    i = 0
+    while i < len(argv):
+        if not argv[i].startswith("--"):
+            positional_argv.append(argv[i])
+            i += 1
+            continue
+        if argv[i] not in MONITOR_OPTIONS:
+            bad_usage_flag = True
+            print(f"Error: Given argument '{argv[i]}' is invalid.")
+            i += 1
+            continue
+        key, kind, _ = MONITOR_OPTIONS[argv[i]]
+        if kind == "flag":
+            monitor_args[key] = True
+            i += 1
+        elif kind == "value":
+            if i+1 >= len(argv) or argv[i+1] == "" or argv[i+1].startswith("--"):
+                bad_usage_flag = True
+                print(f"Error: Given '{argv[i]}' needs a value.")
+                i += 1
+                continue
+            monitor_args[key] = argv[i+1].strip()
+            i += 2
+        elif kind == "list":
+            if i+1 >= len(argv) or argv[i+1] == "" or argv[i+1].startswith("--"):
+                bad_usage_flag = True
+                print(f"Error: Given '{argv[i]}' needs a comma-separated list value.")
+                i += 1
+                continue
+            monitor_args[key] = [value.strip() for value in argv[i+1].split(',') if value.strip()]
+            i += 2
+
+    return positional_argv, monitor_args, bad_usage_flag
+
+# Returns the regions to monitor: the region of every template in the template CSV (if the file exists, see 'manifest.py'),
+# plus the default region
+#   (rows that can't be parsed are skipped, monitoring doesn't need the whole deployment description to be valid)
+def discover_regions(default_region):
+    regions = [default_region] if default_region else []
+    if os.path.isfile(CSV_TEMPLATE_FILENAME):
+        for row in load_csv_file(CSV_TEMPLATE_FILENAME):
+            try:
+                regions.append(parse_template(row).region)
+            except (IndexError, ValueError):
+                continue
+    if not regions:
+        sys.exit("Error: No region to monitor - give '--regions' or configure a default AWS region.")
+    return list(dict.fromkeys(regions))
+
+# Returns the 'describe_instances()' Filters for the given state/template name/tag monitor arguments (empty list means no filtering)
+#   values for the same filter name are merged into one filter (AWS matches any of them), different filters must all match
+def build_instance_filters(monitor_args):
+    filter_values = {}
+    if monitor_args['states']:
+        filter_values['instance-state-name'] = [state.lower() for state in monitor_args['states']]
+    if monitor_args['templates']:
+        filter_values['tag:TemplateName'] = list(monitor_args['templates'])
+    for tag in monitor_args['tags'] or []:
+        # 'KEY=VALUE' matches the tag's value, a bare 'KEY' matches any instance with the tag
+        tag_key, separator, tag_value = tag.partition("=")
+        if separator:
+            filter_values.setdefault(f"tag:{tag_key}", []).append(tag_value)
+        else:
+            filter_values.setdefault('tag-key', []).append(tag_key)
+    return [{'Name': name, 'Values': list(dict.fromkeys(values))} for name, values in filter_values.items()]
 
 # Returns an empty string if string given is None
 def str_return_empty_for_none(str_check):
@@ -250,4 +582,7 @@ def str_return_empty_for_none(str_check):
 
 ###################################################################################################
 
-main()
+# main()
+
+if __name__ == "__main__":
+    main()
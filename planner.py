@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+
+'''
+@author : Mitchell Van Braeckel
+@id : 1002297
+@date : 10/29/2020
+@version : python 3.8-32 / python 3.8.5
+@course : CIS*4010 Cloud Computing
+@brief : A2 Part 1: AWS EC2 - One-Click Deployment of VMs and Containers ; planner.py
+
+@note :
+    Description: deployment planner and step scheduler (used by 'launch.py', and by 'launch.py --plan' for a dry run)
+        - build_deployment_plan() compiles the instance specs into a DAG of steps:
+          create:<template> -> wait:<instance> -> connect:<instance> -> install-docker:<instance> -> pull:<instance>/<container> -> run:<instance>/<container>
+          (each container's pull only waits on Docker being installed, so one image can be pulled while another container starts)
+        - each step gets an estimated duration from historical timings, ie. the spans of the last 'launch.py --trace' run
+          (median per step type and container, falling back to the step type, then to DEFAULT_STEP_SECONDS)
+        - get_remaining_path_seconds() gives each step the estimated time from its start to the end of the deployment along
+          its longest chain of dependents, which is the priority steps are scheduled by (critical path first)
+
+        - PriorityExecutor is a thread pool that runs the highest priority queued task next (instead of first come, first served)
+        - run_step_graph() runs a set of steps respecting their dependencies and a limit of steps running at once,
+          skipping the dependents of any step that failed
+'''
+
+############################################# IMPORTS #############################################
+
+# IMPORTS - 'pip install <import-package>'
+import concurrent.futures
+import heapq
+import itertools
+import json
+import statistics
+from tables import format_columns
+import threading
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+############################################ CONSTANTS ############################################
+
+# Estimated seconds of each step type when there are no historical timings for it
+DEFAULT_STEP_SECONDS = {
+    'create': 5.0,
+    'wait': 40.0,
+    'connect': 15.0,
+    'install-docker': 60.0,
+    'pull': 20.0,
+    'run': 5.0
+}
+
+# Trace span name -> step type it times (spans of the same step type, instance and container add up, eg. port wait + SSH handshake)
+TRACE_SPAN_STEP_TYPES = {
+    'create-instances': 'create',
+    'wait-running': 'wait',
+    'wait-ssh-port': 'connect',
+    'ssh-connect': 'connect',
+    'sync-scripts': 'install-docker',
+    'docker-install': 'install-docker',
+    'pull': 'pull',
+    'start': 'run',
+    'run': 'run'
+}
+
+############################################# CLASSES #############################################
+
+# A step of the deployment plan (step_id is '<step type>:<template>', '<step type>:<instance>' or '<step type>:<instance>/<container>')
+@dataclass(frozen=True)
+class PlanStep:
+    __slots__ = ("step_id", "step_type", "instance", "container", "depends_on", "seconds")
+    step_id: str
+    step_type: str
+    instance: Optional[str]
+    container: Optional[str]
+    depends_on: Tuple[str, ...]
+    seconds: float
+
+# Thread pool running the queued task with the highest priority next (ties in submission order)
+#   submit() returns a concurrent.futures.Future, like ThreadPoolExecutor
+class PriorityExecutor:
+    def __init__(self, max_workers, thread_name_prefix="provision-worker"):
+        self.condition = threading.Condition()
+        self.queue = [] #heap of (-priority, submission number, future, func, args)
+        self.submission_numbers = itertools.count()
+        self.shutdown_flag = False
+        self.threads = [threading.Thread(target=self.work, name=f"{thread_name_prefix}-{i}", daemon=True) for i in range(max_workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+        return False
+
+    # Queues func(*args) to run once it's the highest priority task waiting for a worker
+    def submit(self, priority, func, *args):
+        future = concurrent.futures.Future()
+        with self.condition:
+            heapq.heappush(self.queue, (-priority, next(self.submission_numbers), future, func, args))
+            self.condition.notify()
+        return future
+
+    # Lets the workers finish the queued tasks, then waits for them to exit
+    def shutdown(self):
+        with self.condition:
+            self.shutdown_flag = True
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join()
+
+    # Worker loop: runs queued tasks until shut down with nothing left in the queue
+    def work(self):
+        while True:
+            with self.condition:
+                while not self.queue and not self.shutdown_flag:
+                    self.condition.wait()
+                if not self.queue:
+                    return
+                _, _, future, func, args = heapq.heappop(self.queue)
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+############################################ FUNCTIONS ############################################
+
+# Returns the deployment plan of the instance specs as step ID -> PlanStep (in dependency order), estimated from the step history
+def build_deployment_plan(instance_specs, step_history=None):
+    step_history = step_history or {}
+    steps = {}
+
+    def add_step(step_id, step_type, instance, container, depends_on):
+        steps[step_id] = PlanStep(step_id, step_type, instance, container, tuple(depends_on), get_step_seconds(step_history, step_type, container))
+
+    for instance_spec in instance_specs:
+        create_id = f"create:{instance_spec.template.name}"
+        if create_id not in steps:
+            add_step(create_id, 'create', None, None, [])
+        add_step(f"wait:{instance_spec.name}", 'wait', instance_spec.name, None, [create_id])
+        add_step(f"connect:{instance_spec.name}", 'connect', instance_spec.name, None, [f"wait:{instance_spec.name}"])
+        add_step(f"install-docker:{instance_spec.name}", 'install-docker', instance_spec.name, None, [f"connect:{instance_spec.name}"])
+        for container in instance_spec.containers:
+            pull_id = f"pull:{instance_spec.name}/{container.name}"
+            add_step(pull_id, 'pull', instance_spec.name, container.name, [f"install-docker:{instance_spec.name}"])
+            add_step(f"run:{instance_spec.name}/{container.name}", 'run', instance_spec.name, container.name, [pull_id])
+    return steps
+
+# Returns step ID -> estimated seconds from the step's start to the end of its longest chain of dependents (ie. its priority)
+def get_remaining_path_seconds(steps):
+    dependents = get_dependents(steps)
+    remaining_seconds = {}
+    for step_id in reversed(list(steps)): #dependency order reversed, so dependents are always done first
+        remaining_seconds[step_id] = steps[step_id].seconds + max((remaining_seconds[dependent_id] for dependent_id in dependents[step_id]), default=0.0)
+    return remaining_seconds
+
+# Returns the critical path (longest estimated chain of steps) as a list of step IDs, and its estimated seconds
+def get_critical_path(steps, remaining_seconds):
+    if not steps:
+        return [], 0.0
+    dependents = get_dependents(steps)
+    step_id = max((step_id for step_id, step in steps.items() if not step.depends_on), key=lambda step_id: remaining_seconds[step_id])
+    critical_path = [step_id]
+    while dependents[step_id]:
+        step_id = max(dependents[step_id], key=lambda dependent_id: remaining_seconds[dependent_id])
+        critical_path.append(step_id)
+    return critical_path, remaining_seconds[critical_path[0]]
+
+# Runs the steps (dependencies outside of them count as done), with at most max_running of them submitted at once,
+# always submitting the ready step with the highest priority next
+#   run_step(step) does the step's work, and the step succeeded if is_success(its result) is true
+#   submit(priority, func, *args) returns a Future, eg. PriorityExecutor.submit
+# Returns (step, result) pairs in the order steps finished, where result is None for steps skipped because a dependency failed
+def run_step_graph(steps, run_step, submit, max_running, priorities, is_success=bool):
+    step_ids = {step.step_id for step in steps}
+    dependents = {step.step_id: [] for step in steps}
+    waiting_counts = {}
+    for step in steps:
+        waiting_counts[step.step_id] = sum(1 for dependency_id in step.depends_on if dependency_id in step_ids)
+        for dependency_id in step.depends_on:
+            if dependency_id in step_ids:
+                dependents[dependency_id].append(step)
+
+    submission_numbers = itertools.count()
+    ready = [(-priorities.get(step.step_id, 0.0), next(submission_numbers), step) for step in steps if waiting_counts[step.step_id] == 0]
+    heapq.heapify(ready)
+    running = {}
+    finished = []
+    while ready or running:
+        while ready and len(running) < max_running:
+            priority, _, step = heapq.heappop(ready)
+            running[submit(-priority, run_step, step)] = step
+        done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            step = running.pop(future)
+            result = future.result()
+            finished.append((step, result))
+            if is_success(result):
+                for dependent in dependents[step.step_id]:
+                    waiting_counts[dependent.step_id] -= 1
+                    if waiting_counts[dependent.step_id] == 0:
+                        heapq.heappush(ready, (-priorities.get(dependent.step_id, 0.0), next(submission_numbers), dependent))
+            else:
+                finished.extend((skipped, None) for skipped in get_all_dependents(step, dependents))
+    return finished
+
+# Returns the historical step timings of the trace file (see 'tracing.py') as (step type, container or None) -> [seconds, ...]
+# (empty if there's no trace file), where (step type, None) has every timing of the step type
+def load_step_history(filename):
+    try:
+        with open(filename, "r") as trace_file:
+            events = json.load(trace_file).get('traceEvents', [])
+    except (FileNotFoundError, ValueError):
+        return {}
+
+    # Add up the spans of each (step type, instance, container) first, eg. waiting for port 22 + the SSH handshake
+    step_seconds = {}
+    for event in events:
+        step_type = TRACE_SPAN_STEP_TYPES.get(event.get('name'))
+        if event.get('ph') != 'X' or step_type is None:
+            continue
+        args = event.get('args', {})
+        step_key = (step_type, args.get('instance'), args.get('container'))
+        step_seconds[step_key] = step_seconds.get(step_key, 0.0) + event.get('dur', 0) / 1e6
+
+    step_history = {}
+    for (step_type, _, container), seconds in step_seconds.items():
+        step_history.setdefault((step_type, None), []).append(seconds)
+        if container is not None:
+            step_history.setdefault((step_type, container), []).append(seconds)
+    return step_history
+
+############################################# HELPERS #############################################
+
+# Returns the estimated seconds of a step: median of its history for the container, else for the step type, else the default
+def get_step_seconds(step_history, step_type, container=None):
+    timings = step_history.get((step_type, container)) or step_history.get((step_type, None))
+    if timings:
+        return statistics.median(timings)
+    return DEFAULT_STEP_SECONDS[step_type]
+
+# Returns step ID -> IDs of the steps that depend on it directly
+def get_dependents(steps):
+    dependents = {step_id: [] for step_id in steps}
+    for step in steps.values():
+        for dependency_id in step.depends_on:
+            dependents[dependency_id].append(step.step_id)
+    return dependents
+
+# Returns every step that (transitively) depends on the step, given step ID -> dependent steps
+def get_all_dependents(step, dependents):
+    all_dependents = []
+    pending = list(dependents[step.step_id])
+    while pending:
+        dependent = pending.pop()
+        if dependent not in all_dependents:
+            all_dependents.append(dependent)
+            pending.extend(dependents[dependent.step_id])
+    return all_dependents
+
+# Returns the plan as a table for display: each step with its dependencies, estimate, and remaining path ('*' marks the critical path)
+def get_plan_table(steps, remaining_seconds, critical_path):
+    critical_step_ids = set(critical_path)
+    rows = [["STEP", "DEPENDS ON", "EST (s)", "TO END (s)", "CRITICAL"]]
+    for step in steps.values():
+        rows.append([step.step_id, ", ".join(step.depends_on) or "-", f"{step.seconds:.1f}", f"{remaining_seconds[step.step_id]:.1f}", "*" if step.step_id in critical_step_ids else ""])
+    return format_columns(rows)
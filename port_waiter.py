@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+
+'''
+@author : Mitchell Van Braeckel
+@id : 1002297
+@date : 10/29/2020
+@version : python 3.8-32 / python 3.8.5
+@course : CIS*4010 Cloud Computing
+@brief : A2 Part 1: AWS EC2 - One-Click Deployment of VMs and Containers ; port_waiter.py
+
+@note :
+    Description: waits for the SSH port of every instance of a fleet from a single thread (used by 'launch.py')
+        - each waiting host gets a non-blocking connect, and one selector watches all of them (poll/epoll where available,
+          so it isn't limited to file descriptors below 1024 like select())
+        - a host whose probe fails (or isn't answered within the poll interval) is probed again on the next poll interval,
+          until its port accepts a connection or its timeout passes
+        - at most PORT_WAITER_MAX_PROBES probes are open at once, so threads and sockets don't grow with the fleet size
+        - once a host is done, its callback is called from the waiter's thread (so it should only hand the host over, eg. submit it)
+'''
+
+############################################# IMPORTS #############################################
+
+# IMPORTS - 'pip install <import-package>'
+import errno
+import selectors
+import socket
+import threading
+import time
+
+############################################ CONSTANTS ############################################
+
+# Probes (ie. sockets) open at once, and how often the waiter checks for new hosts, answers and timeouts (seconds)
+PORT_WAITER_MAX_PROBES = 256
+PORT_WAITER_TICK_SECONDS = 0.05
+
+############################################# CLASSES #############################################
+
+# A host being waited on, with its probe socket while one is open
+class WaitingHost:
+    __slots__ = ("address", "port", "deadline", "on_done", "probe_socket", "probe_deadline", "next_probe_time")
+
+    def __init__(self, address, port, deadline, on_done):
+        self.address = address
+        self.port = port
+        self.deadline = deadline
+        self.on_done = on_done
+        self.probe_socket = None
+        self.probe_deadline = 0.0
+        self.next_probe_time = 0.0
+
+# Waits for hosts' TCP ports to accept connections from one thread (see file header)
+#   add(address, port, on_done) starts waiting on a host, on_done(open_flag) is called with true once its port accepts
+#   a connection, or false once the timeout passes (a missing or malformed address just never opens)
+#   close() lets every host already added finish first (on leaving a 'with' block too)
+class PortWaiter:
+    def __init__(self, timeout=120, poll_interval=1, max_probes=PORT_WAITER_MAX_PROBES):
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.max_probes = max_probes
+        self.lock = threading.Lock()
+        self.added_hosts = [] #hosts added since the waiter thread last picked them up
+        self.close_flag = False
+        self.thread = threading.Thread(target=self.work, name="port-waiter", daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    # Starts waiting on the host's port
+    def add(self, address, port, on_done):
+        with self.lock:
+            self.added_hosts.append(WaitingHost(address, port, time.monotonic() + self.timeout, on_done))
+
+    # Waits until every host added so far is done, then stops the waiter thread
+    def close(self):
+        with self.lock:
+            self.close_flag = True
+        self.thread.join()
+
+    # Waiter loop: probes waiting hosts (up to max_probes at once), then handles answered, timed out and expired probes
+    def work(self):
+        waiting_hosts = []
+        with selectors.DefaultSelector() as selector:
+            while True:
+                with self.lock:
+                    waiting_hosts.extend(self.added_hosts)
+                    self.added_hosts = []
+                    if not waiting_hosts and self.close_flag:
+                        return
+
+                now = time.monotonic()
+                open_probes = len(selector.get_map())
+                for host in waiting_hosts:
+                    if open_probes >= self.max_probes:
+                        break
+                    if host.probe_socket == None and host.next_probe_time <= now:
+                        open_probes += self.start_probe(host, selector, now)
+
+                # Windows' select() can't wait on nothing, so just sleep the tick while no probe is open
+                if selector.get_map():
+                    ready = selector.select(PORT_WAITER_TICK_SECONDS)
+                else:
+                    ready = []
+                    time.sleep(PORT_WAITER_TICK_SECONDS)
+
+                now = time.monotonic()
+                for key, _ in ready:
+                    host = key.data
+                    connected_flag = self.end_probe(host, selector) == 0
+                    if connected_flag:
+                        self.finish(host, True)
+                    else:
+                        host.next_probe_time = host.probe_deadline
+                for host in waiting_hosts:
+                    if host.on_done == None:
+                        continue
+                    if host.probe_socket != None and now >= host.probe_deadline:
+                        self.end_probe(host, selector)
+                        host.next_probe_time = now
+                    if now >= host.deadline:
+                        if host.probe_socket != None:
+                            self.end_probe(host, selector)
+                        self.finish(host, False)
+                waiting_hosts = [host for host in waiting_hosts if host.on_done != None]
+
+    # Starts a non-blocking connect to the host's port, returns 1 if a probe socket is now open for it (otherwise 0)
+    # NOTE: a connect that fails right away (eg. bad address) is probed again on the next poll interval
+    def start_probe(self, host, selector, now):
+        probe_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            probe_socket.setblocking(False)
+            result = probe_socket.connect_ex((host.address, host.port))
+        except (OSError, TypeError, ValueError):
+            result = None
+        if result == 0:
+            probe_socket.close()
+            self.finish(host, True)
+            return 0
+        if result not in (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN):
+            probe_socket.close()
+            host.next_probe_time = now + self.poll_interval
+            return 0
+        selector.register(probe_socket, selectors.EVENT_WRITE, host)
+        host.probe_socket = probe_socket
+        host.probe_deadline = now + self.poll_interval
+        return 1
+
+    # Closes the host's probe, returns its socket error (0 if it connected)
+    def end_probe(self, host, selector):
+        probe_socket = host.probe_socket
+        host.probe_socket = None
+        selector.unregister(probe_socket)
+        try:
+            return probe_socket.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        except OSError as e:
+            return e.errno or -1
+        finally:
+            probe_socket.close()
+
+    # Hands the host over to its callback (once), and drops it from the waiting hosts
+    def finish(self, host, open_flag):
+        on_done = host.on_done
+        host.on_done = None
+        on_done(open_flag)
@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+
+'''
+@author : Mitchell Van Braeckel
+@id : 1002297
+@date : 10/29/2020
+@version : python 3.8-32 / python 3.8.5
+@course : CIS*4010 Cloud Computing
+@brief : A2 Part 1: AWS EC2 - One-Click Deployment of VMs and Containers ; tables.py
+
+@note :
+    Description: plain text tables for the summaries the scripts print (stage timings, API calls, trace, plan, benchmark results, ...)
+        - format_columns() lines rows of cell strings up into left-aligned columns, each as wide as its widest cell plus a gap
+'''
+
+############################################ CONSTANTS ############################################
+
+# Spaces between columns (after the widest cell of each one)
+COLUMN_GAP = 3
+
+############################################ FUNCTIONS ############################################
+
+# Returns the rows (lists of cell strings, header row first) as one string of left-aligned columns, one line per row
+def format_columns(rows, gap=COLUMN_GAP):
+    widths = [max(len(row[col]) for row in rows) + gap for col in range(len(rows[0]))]
+    return "\n".join("".join(cell.ljust(width) for cell, width in zip(row, widths)) for row in rows)
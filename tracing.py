@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+
+'''
+@author : Mitchell Van Braeckel
+@id : 1002297
+@date : 10/29/2020
+@version : python 3.8-32 / python 3.8.5
+@course : CIS*4010 Cloud Computing
+@brief : A2 Part 1: AWS EC2 - One-Click Deployment of VMs and Containers ; tracing.py
+
+@note :
+    Description: lightweight tracing of where deployment time goes (used by 'launch.py --trace')
+        - 'with span("pull", instance="AL2-1"):' times a block as a span, spans inside it on the same thread nest under it
+        - spans of an instance (ie. with an 'instance' arg, or inside one of its spans on the same thread) go on that instance's
+          own track, whichever worker thread ran them, so each instance's commands nest under its 'provision-instance' span
+          (steps of one instance that run at the same time, ie. '--per-host' above 1, overlap on its track instead of nesting)
+        - record_span() adds a span after the fact from start/end times that were already measured (eg. stage timings)
+        - export_chrome_trace() writes the spans as Chrome trace JSON (open it in chrome://tracing or https://ui.perfetto.dev)
+        - get_summary_table() gives count/p50/p95/max/total seconds per span name (ie. step type) across all instances
+
+        - tracing is off until enable_tracing() is called, and while off span() just returns a shared no-op context manager
+          (so instrumented code costs one flag check per span)
+'''
+
+############################################# IMPORTS #############################################
+
+# IMPORTS - 'pip install <import-package>'
+import json
+import os
+from tables import format_columns
+import threading
+import time
+
+############################################ CONSTANTS ############################################
+
+TRACE_FILENAME = "launch_trace.json"
+
+# Instance tracks are listed under their own (made up) process in the trace, so their IDs never clash with real thread IDs
+INSTANCE_TRACKS_PID = 0
+
+############################## STATE VARIABLES, INITIALIZATION, MAIN ##############################
+
+# Finished spans as Chrome trace 'complete' events, plus thread names and instance tracks for labelling them
+trace_lock = threading.Lock()
+trace_events = []
+trace_thread_names = {}
+trace_instance_tracks = {} #instance name -> its track ID (under INSTANCE_TRACKS_PID)
+trace_state = {'enabled': False}
+
+# Instance whose track the current thread's spans go on while inside one of its spans (see Span)
+trace_local = threading.local()
+
+############################################# CLASSES #############################################
+
+# A span being timed (see span())
+class Span:
+    __slots__ = ("name", "args", "start_time", "outer_instance")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.start_time = None
+        self.outer_instance = None
+
+    def __enter__(self):
+        self.outer_instance = getattr(trace_local, 'instance', None)
+        if 'instance' in self.args:
+            trace_local.instance = self.args['instance']
+        self.start_time = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.args['error'] = f"{exc_type.__name__}: {exc_value}"
+        record_span(self.name, self.start_time, time.time(), **self.args)
+        trace_local.instance = self.outer_instance
+        return False
+
+# What span() returns while tracing is off
+class NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+NULL_SPAN = NullSpan()
+
+############################################ FUNCTIONS ############################################
+
+# Turns tracing on (spans before this aren't recorded)
+def enable_tracing():
+    trace_state['enabled'] = True
+
+# Returns a context manager that times its block as a span with the given name and args (eg. instance name, command)
+def span(name, **args):
+    if not trace_state['enabled']:
+        return NULL_SPAN
+    return Span(name, args)
+
+# Records a span from already measured start/end times (seconds since the epoch, ie. time.time()), on its instance's track
+# (its 'instance' arg, or the instance of the span the current thread is in) or otherwise on the current thread
+def record_span(name, start_time, end_time, **args):
+    if not trace_state['enabled']:
+        return
+    instance = args.get('instance', getattr(trace_local, 'instance', None))
+    thread = threading.current_thread()
+    event = {
+        'name': name,
+        'ph': 'X',
+        'ts': start_time * 1e6,
+        'dur': max(end_time - start_time, 0) * 1e6,
+        'pid': os.getpid(),
+        'tid': thread.ident,
+        'args': args
+    }
+    with trace_lock:
+        if instance is not None:
+            event['pid'] = INSTANCE_TRACKS_PID
+            event['tid'] = trace_instance_tracks.setdefault(instance, len(trace_instance_tracks) + 1)
+        else:
+            trace_thread_names[thread.ident] = thread.name
+        trace_events.append(event)
+
+# Writes every recorded span to the file as Chrome trace JSON (with process/thread name metadata so each instance's track
+# and each thread's row is labelled)
+def export_chrome_trace(filename=TRACE_FILENAME):
+    with trace_lock:
+        events = list(trace_events)
+        thread_names = dict(trace_thread_names)
+        instance_tracks = dict(trace_instance_tracks)
+    metadata_events = [
+        {'name': 'process_name', 'ph': 'M', 'pid': INSTANCE_TRACKS_PID, 'args': {'name': "instances"}},
+        {'name': 'process_name', 'ph': 'M', 'pid': os.getpid(), 'args': {'name': "launch.py threads"}}
+    ]
+    metadata_events += [{'name': 'thread_name', 'ph': 'M', 'pid': INSTANCE_TRACKS_PID, 'tid': tid, 'args': {'name': instance}} for instance, tid in instance_tracks.items()]
+    metadata_events += [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': name}} for tid, name in thread_names.items()]
+    with open(filename, "w") as trace_file:
+        json.dump({'traceEvents': metadata_events + events, 'displayTimeUnit': 'ms'}, trace_file)
+
+# Returns the summary table of recorded spans by name: count, p50, p95, max and total seconds (slowest total first)
+def get_summary_table():
+    with trace_lock:
+        durations = {}
+        for event in trace_events:
+            durations.setdefault(event['name'], []).append(event['dur'] / 1e6)
+
+    rows = [["STEP", "COUNT", "P50", "P95", "MAX", "TOTAL"]]
+    for name, seconds in sorted(durations.items(), key=lambda item: sum(item[1]), reverse=True):
+        seconds.sort()
+        rows.append([name, str(len(seconds)), f"{percentile(seconds, 50):.2f}", f"{percentile(seconds, 95):.2f}", f"{seconds[-1]:.2f}", f"{sum(seconds):.2f}"])
+
+    return "--Trace summary (seconds):\n" + format_columns(rows)
+
+############################################# HELPERS #############################################
+
+# Returns the nearest-rank percentile of the sorted values
+def percentile(sorted_values, percent):
+    rank = max(-(-len(sorted_values) * percent // 100), 1) #ceil, at least the first value
+    return sorted_values[int(rank) - 1]